@@ -6,6 +6,27 @@ REPO_URL = "https://github.com/CreepNT/RivetDB" #URL to the GitHub/yoursite repo
 
 REMOTE_ERRORS_DATABASE_PATH = "rivetdb.json"    #Path to the errors database file on the remote repository.
 LOCAL_ERRORS_DATABASE_PATH = "errorsdb.json"    #Path where the errors database file will be stored locally.
+LOCAL_ERRORS_SNAPSHOT_PATH = ""    #Path where the binary snapshot of the errors database will be stored locally (i.e. "errorsdb.rvdb"). Makes loading near-instant - "" disables snapshots.
+ERRORS_MAX_RESIDENT_FACILITIES = 0              #Maximum number of facilities of the errors database kept in memory : the others are only loaded when looked up. Set to 0 to load the whole database.
+LOCAL_ERRORS_INDEX_PATH = "errorsdb.idx"        #Path where the offset index of the errors database file will be stored locally. Only used if facilities are loaded lazily and snapshots are disabled.
+REMOTE_ERRORS_SHARDS_PATH = None                #Folder of the remote repository holding the errors database as shards ("" for its root) - see shardedDatabase.py. Set to None to use the monolithic database.
+LOCAL_ERRORS_SHARDS_PATH = "errorsdb_shards"    #Folder where the shards of the errors database will be stored locally, when the remote is sharded.
 
 REMOTE_SHORT_CODES_DATABASE_PATH = "short_codes.json"   #Path to the short codes database file on the remote repository.
-LOCAL_SHORT_CODES_DATABASE_PATH = "short_codes.json"    #Path where the short codes database file will be stored locally.
\ No newline at end of file
+LOCAL_SHORT_CODES_DATABASE_PATH = "short_codes.json"    #Path where the short codes database file will be stored locally.
+
+HTTP_TIMEOUT = 30  #Timeout of HTTP requests made to the remote repository, in seconds.
+
+MERGE_SOURCES_PATH = ""  #Folder merge_err_db may read local databases from - they must be given relative to it. Set to "" to only merge from URLs.
+
+AUTO_REFRESH_INTERVAL = 0           #Delay between two automatic checks of the remote repository for new databases, in seconds (i.e. 3600). 0 disables it.
+AUTO_REFRESH_JITTER = 0.1           #Random fraction of the delay added to each check.
+AUTO_REFRESH_MAX_BACKOFF = 86400    #The delay doubles after each failed check (i.e. rate limited), up to this value, in seconds.
+
+RESPONSE_CACHE_SIZE = 256    #Maximum number of error_code responses kept in cache. Set to 0 to disable the cache.
+
+METRICS_PORT = 0              #Port of the local HTTP listener serving metrics (Prometheus text format) at /metrics. Set to 0 to disable metrics.
+METRICS_HOST = "127.0.0.1"    #Address the metrics listener binds to - keep it local unless the port is firewalled.
+
+LOOKUP_API_PORT = 0             #Port of the HTTP JSON API serving lookups to other tools (see lookupApi.py). Set to 0 to disable the API.
+LOOKUP_API_HOST = "127.0.0.1"   #Address the lookup API binds to - it has no authentication, so keep it local unless the port is firewalled.
\ No newline at end of file
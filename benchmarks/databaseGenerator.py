@@ -0,0 +1,151 @@
+import sys
+import json
+import random
+import argparse
+
+#Seeded generator of synthetic errors and short codes databases, for benchmarks.
+#The same (errors count, seed) always yields the same databases.
+#
+#Generated databases try to look like real ones :
+# - facility numbers stay in the valid range (<= 0x100), and facilities hold very different numbers of errors
+# - error numbers are mostly clustered at the start of the facility, with a few scattered ones
+# - descriptions are drawn from a limited set of sentences, with a skewed distribution : a few boilerplate descriptions are
+#   repeated very often, and many errors have none at all
+# - some facilities have a few blacklisted ranges, which never overlap their errors
+# - short codes map to a fraction of the errors
+
+MAX_FACILITY_NUM = 0x100
+
+WORDS = ["memory", "card", "network", "connection", "server", "timeout", "invalid", "argument", "not", "found", "permission",
+    "denied", "device", "busy", "file", "system", "corrupted", "data", "sign", "in", "PSN", "account", "update", "required",
+    "storage", "full", "application", "could", "be", "started", "license", "expired", "content", "unavailable", "region",
+    "restricted", "battery", "low", "cable", "disconnected", "failed", "to", "read", "write", "the", "a", "is", "was"]
+
+def _generateSentence(rng : random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 12))).capitalize() + "."
+
+#Returns a JSON-ready errors database (see errorsDatabase.py for the format)
+def generateErrorsDatabase(errorsCount : int, seed : int = 0) -> dict:
+    rng = random.Random(seed)
+    facilitiesCount = max(1, min(MAX_FACILITY_NUM + 1, errorsCount // 200))
+    facilityNums = sorted(rng.sample(range(MAX_FACILITY_NUM + 1), facilitiesCount))
+
+    #Skewed facility sizes, normalized to the requested number of errors (each facility holds at most 0x10000 errors)
+    weights = [rng.paretovariate(1.2) for _ in facilityNums]
+    totalWeight = sum(weights)
+    sizes = [min(0x10000, int(errorsCount * weight / totalWeight)) for weight in weights]
+    missing = min(errorsCount, 0x10000 * len(sizes)) - sum(sizes) #Lost to rounding and capping
+    for idx in range(len(sizes)):
+        added = min(missing, 0x10000 - sizes[idx])
+        sizes[idx] += added
+        missing -= added
+
+    descriptions = [_generateSentence(rng) for _ in range(max(16, errorsCount // 20))]
+    db = dict()
+    for facilityNum, size in zip(facilityNums, sizes):
+        facilityName = f"SCE_{rng.choice(WORDS).upper()}_{facilityNum:03X}"
+        facility = {"name" : facilityName + "_FACILITY", "errors" : {}}
+        if rng.random() < 0.5:
+            facility["description"] = _generateSentence(rng)
+
+        #Mostly contiguous error numbers, plus scattered ones
+        contiguous = int(size * 0.8)
+        errorNums = set(range(1, contiguous + 1))
+        while len(errorNums) < size:
+            errorNums.add(rng.randrange(0x10000))
+
+        for errorNum in sorted(errorNums):
+            error = {"name" : f"{facilityName}_ERROR_{errorNum:04X}"}
+            if rng.random() < 0.7:
+                #Pareto-distributed index : low indices (boilerplate descriptions) are much more likely
+                error["description"] = descriptions[min(len(descriptions) - 1, int(rng.paretovariate(1.0)) - 1)]
+            facility["errors"][f"0x{errorNum:04X}"] = error
+
+        #Blacklist some of the free ranges
+        if rng.random() < 0.3:
+            blacklist = list()
+            for _ in range(rng.randint(1, 4)):
+                blMin = rng.randrange(0x10000)
+                blMax = min(0xFFFF, blMin + rng.randrange(0x400))
+                if not any(blMin <= errorNum <= blMax for errorNum in errorNums):
+                    blacklist.append({"min" : f"0x{blMin:04X}", "max" : f"0x{blMax:04X}"})
+            if len(blacklist) != 0:
+                facility["blacklist"] = blacklist
+
+        db[f"0x{facilityNum:03X}"] = facility
+    return db
+
+#Returns a short codes database mapping short codes to about ratio of the errors of errorsDb
+def generateShortCodesDatabase(errorsDb : dict, ratio : float = 0.1, seed : int = 0) -> dict:
+    rng = random.Random(seed)
+    prefixes = ["C1", "C2", "C3", "NP", "NW", "WC", "E1", "SU"]
+    db = dict()
+    for facilityStr, facility in errorsDb.items():
+        for errorStr in facility["errors"].keys():
+            if rng.random() < ratio:
+                code = 0x80000000 | (int(facilityStr, 16) << 16) | int(errorStr, 16)
+                shortCode = f"{rng.choice(prefixes)}-{rng.randint(1000, 99999)}-{rng.randint(0, 9)}"
+                db[shortCode] = f"0x{code:08X}"
+    return db
+
+#Returns a database meant to be merged into errorsDb, with about errorsCount errors : like real updates, it mostly touches
+#existing facilities, with new descriptions for known errors and new errors, and sometimes adds a facility
+def generateAppendedDatabase(errorsDb : dict, errorsCount : int, seed : int = 0) -> dict:
+    rng = random.Random(seed)
+    db = dict()
+    facilityStrs = list(errorsDb.keys())
+    for _ in range(errorsCount):
+        facilityStr = rng.choice(facilityStrs)
+        facility = errorsDb[facilityStr]
+        appendedFacility = db.setdefault(facilityStr, {"name" : facility["name"], "errors" : {}})
+        if rng.random() < 0.5:
+            errorStr = rng.choice(list(facility["errors"].keys()))
+            appendedFacility["errors"][errorStr] = {"name" : facility["errors"][errorStr]["name"], "description" : _generateSentence(rng)}
+        else:
+            errorNum = rng.randrange(0x10000)
+            appendedFacility["errors"][f"0x{errorNum:04X}"] = {"name" : f"{facility['name']}_NEW_ERROR_{errorNum:04X}"}
+
+    freeFacilityNums = sorted(set(range(MAX_FACILITY_NUM + 1)) - {int(facilityStr, 16) for facilityStr in facilityStrs})
+    if len(freeFacilityNums) != 0:
+        facilityNum = rng.choice(freeFacilityNums)
+        db[f"0x{facilityNum:03X}"] = {"name" : f"SCE_NEW_{facilityNum:03X}_FACILITY", "description" : _generateSentence(rng),
+            "errors" : {f"0x{errorNum:04X}" : {"name" : f"SCE_NEW_{facilityNum:03X}_ERROR_{errorNum:04X}"} for errorNum in range(1, 17)}}
+    return db
+
+#Returns codes to look up : known errors, unknown errors of known facilities, blacklisted, unknown facilities and non-error values
+def generateLookupCodes(errorsDb : dict, count : int, seed : int = 0) -> list:
+    rng = random.Random(seed)
+    knownCodes = [0x80000000 | (int(facilityStr, 16) << 16) | int(errorStr, 16)
+        for facilityStr, facility in errorsDb.items() for errorStr in facility["errors"].keys()]
+    facilityNums = [int(facilityStr, 16) for facilityStr in errorsDb.keys()]
+    codes = list()
+    for _ in range(count):
+        kind = rng.random()
+        if kind < 0.6 or len(facilityNums) == 0:
+            code = rng.choice(knownCodes) if len(knownCodes) != 0 else 0x80000000
+        elif kind < 0.8:
+            code = 0x80000000 | (rng.choice(facilityNums) << 16) | rng.randrange(0x10000)
+        elif kind < 0.9:
+            code = 0x80000000 | (rng.randrange(0x101, 0x1000) << 16) | rng.randrange(0x10000)
+        else:
+            code = rng.getrandbits(32)
+        if rng.random() < 0.2:
+            code |= 0x40000000 #Fatal
+        codes.append(code)
+    return codes
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generates synthetic errors and short codes databases")
+    parser.add_argument("errorsCount", type=int)
+    parser.add_argument("errorsDbPath")
+    parser.add_argument("--short-codes", dest="shortCodesDbPath", help="Also write a short codes database to this path")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    errorsDb = generateErrorsDatabase(args.errorsCount, args.seed)
+    with open(args.errorsDbPath, "w", encoding="utf-8") as fh:
+        json.dump(errorsDb, fh, indent=4)
+    if args.shortCodesDbPath:
+        with open(args.shortCodesDbPath, "w", encoding="utf-8") as fh:
+            json.dump(generateShortCodesDatabase(errorsDb, seed=args.seed), fh, indent=4)
+    sys.exit(0)
@@ -0,0 +1,96 @@
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+
+import aiohttp
+
+#Load test of the lookup API (see lookupApi.py), run against a live bot with LOOKUP_API_PORT set.
+#
+#Every connection is a client sending requests back to back on a kept-alive connection, for --duration seconds.
+#Lookups are drawn from a pool of --distinct random codes (within known facilities, so that most are resolved or unknown errors),
+#and a fraction of the requests (--revalidate) send back the ETag they got, as caching clients would.
+#The bot keeps serving Discord meanwhile, so run a few commands during the test to see how both get along.
+#
+#Usage :
+#   python benchmarks/loadTestApi.py http://127.0.0.1:8081 --connections 32 --duration 10
+#   python benchmarks/loadTestApi.py http://127.0.0.1:8081 --batch 100
+
+DEFAULT_CONNECTIONS = 16
+DEFAULT_DURATION = 10.0
+DEFAULT_DISTINCT_CODES = 10000
+
+def getCodes(count : int, seed : int) -> list:
+    rng = random.Random(seed)
+    return [0x80000000 | (rng.randrange(0x100) << 16) | rng.randrange(0x100) for _ in range(count)]
+
+def _percentile(sortedValues : list, fraction : float) -> float:
+    return sortedValues[min(int(len(sortedValues) * fraction), len(sortedValues) - 1)] if len(sortedValues) != 0 else 0.0
+
+#Sends requests until deadline (a time.perf_counter() value). Latencies are appended to latencies, status codes counted in statuses.
+async def runClient(session : aiohttp.ClientSession, baseUrl : str, codes : list, args, rng : random.Random, deadline : float,
+    latencies : list, statuses : dict) -> None:
+    etags = dict()
+    while time.perf_counter() < deadline:
+        if args.batch > 0:
+            body = json.dumps({"codes" : [f"0x{code:08X}" for code in rng.sample(codes, args.batch)]})
+            request = session.post(f"{baseUrl}/batch", data=body, headers={"Content-Type" : "application/json"})
+        else:
+            path = f"/code/0x{rng.choice(codes):08X}"
+            headers = {"If-None-Match" : etags[path]} if (path in etags and rng.random() < args.revalidate) else {}
+            request = session.get(baseUrl + path, headers=headers)
+
+        start = time.perf_counter()
+        try:
+            async with request as response:
+                await response.read()
+                if args.batch == 0 and "ETag" in response.headers:
+                    etags[path] = response.headers["ETag"]
+                status = response.status
+        except aiohttp.ClientError as e:
+            status = e.__class__.__name__
+        latencies.append(time.perf_counter() - start)
+        statuses[status] = statuses.get(status, 0) + 1
+
+async def runLoadTest(args) -> int:
+    baseUrl = args.url.rstrip("/")
+    codes = getCodes(args.distinct, args.seed)
+    latencies = list()
+    statuses = dict()
+    #One connection per client : the connector never opens more, and connections are reused between requests
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=args.connections)) as session:
+        try:
+            async with session.get(f"{baseUrl}/status") as response:
+                print(f"Databases : {await response.text()}")
+        except aiohttp.ClientError as e:
+            print(f"Failed to reach the lookup API at {baseUrl} ({e}).")
+            return 1
+
+        start = time.perf_counter()
+        deadline = start + args.duration
+        await asyncio.gather(*[runClient(session, baseUrl, codes, args, random.Random(args.seed + i), deadline, latencies, statuses)
+            for i in range(args.connections)])
+        duration = time.perf_counter() - start
+
+    latencies.sort()
+    lookups = len(latencies) * max(args.batch, 1)
+    print(f"{len(latencies)} requests in {duration:.2f}s over {args.connections} connections : {len(latencies) / duration:.0f} requests/s"
+        + (f", {lookups / duration:.0f} codes/s" if args.batch > 0 else ""))
+    print(f"Latency : p50 {_percentile(latencies, 0.5) * 1000:.2f}ms, p99 {_percentile(latencies, 0.99) * 1000:.2f}ms, "
+        f"max {(latencies[-1] if len(latencies) != 0 else 0.0) * 1000:.2f}ms")
+    print("Statuses : " + ", ".join(f"{status} : {count}" for status, count in sorted(statuses.items(), key=lambda entry: str(entry[0]))))
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test of the lookup API of a running bot")
+    parser.add_argument("url", help="Base URL of the API, i.e. http://127.0.0.1:8081")
+    parser.add_argument("--connections", type=int, default=DEFAULT_CONNECTIONS, help="Number of concurrent clients, each with its own connection")
+    parser.add_argument("--duration", type=float, default=DEFAULT_DURATION, help="Duration of the test, in seconds")
+    parser.add_argument("--distinct", type=int, default=DEFAULT_DISTINCT_CODES, help="Number of distinct codes looked up")
+    parser.add_argument("--revalidate", type=float, default=0.0, help="Fraction of the lookups sent with the ETag of a previous response")
+    parser.add_argument("--batch", type=int, default=0, help="Send POST /batch requests of this many codes instead of single lookups")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    sys.exit(asyncio.run(runLoadTest(args)))
@@ -0,0 +1,297 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import tracemalloc
+
+#The benchmarks import the bot's modules from the parent directory - none of them depend on Discord
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import errorsDatabase
+import lazyDatabase
+import merkleTree
+from shortCodesDatabase import SCDatabase, normalizeShortCode
+try: #Only needed by the bulk classification benchmarks
+    import numpy as np
+    from bulkClassifier import BulkClassifier
+except ImportError:
+    np = None
+from databaseGenerator import generateErrorsDatabase, generateAppendedDatabase, generateShortCodesDatabase, generateLookupCodes
+
+#Offline microbenchmarks of the databases, over synthetic databases generated from a seed.
+#
+#Every benchmark is timed call by call until it ran for at least --min-time seconds, which gives ops/s and the p50/p99 latency.
+#Peak memory is measured by a separate call under tracemalloc, since tracing slows down allocations a lot.
+#Results are saved as JSON, and can be compared against a baseline : anything slower or bigger than the threshold is reported
+#as a regression, and the exit code is 1.
+#
+#Usage :
+#   python benchmarks/runBenchmarks.py --sizes 1000 100000 --output baseline.json
+#   python benchmarks/runBenchmarks.py --sizes 1000 100000 --output results.json --baseline baseline.json
+#   python benchmarks/runBenchmarks.py --compare baseline.json results.json
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+LOOKUPS_COUNT = 10000 #Number of distinct inputs of the lookup benchmarks, used in a loop
+MAX_RESIDENT_FACILITIES = 8 #Resident facilities of the lazily loaded databases
+MERGE_SOURCES_COUNT = 4 #Number of databases of the multi-source merge benchmarks
+MERKLE_UPDATED_FACILITIES = 4 #Facilities changed by the merge the Merkle tree benchmarks hash and diff
+MAX_ITERATIONS = 1000000
+MEMORY_NOISE_FLOOR = 64 * 1024 #Peak memory differences below this are never reported as regressions
+
+#Everything the benchmarks of one database size work on, generated once
+class BenchmarkData:
+    __slots__ = ["errorsCount", "jsonStr", "db", "compiledDb", "appendedDb", "appendedDbs", "lookupCodes", "jsonPath", "indexPath", "lazyDb", "shortCodesPath", "scDb",
+        "shortCodeQueries"]
+
+    def __init__(self, errorsCount : int, seed : int, tempDir : str) -> None:
+        jsonDb = generateErrorsDatabase(errorsCount, seed)
+        self.errorsCount : int = errorsCount
+        self.jsonStr : str = json.dumps(jsonDb, indent=4)
+        self.db : errorsDatabase.Database = errorsDatabase.getDatabaseFromJSONString(self.jsonStr)
+        self.compiledDb : errorsDatabase.CompiledDatabase = errorsDatabase.CompiledDatabase(self.db)
+        self.appendedDb : errorsDatabase.Database = errorsDatabase.getDatabaseFromJSONString(json.dumps(generateAppendedDatabase(jsonDb, max(1, errorsCount // 10), seed + 1)))
+        self.appendedDbs : list = [self.appendedDb] + [errorsDatabase.getDatabaseFromJSONString(json.dumps(generateAppendedDatabase(jsonDb, max(1, errorsCount // 10), seed + i)))
+            for i in range(2, MERGE_SOURCES_COUNT + 1)]
+        self.lookupCodes : list = generateLookupCodes(jsonDb, LOOKUPS_COUNT, seed)
+
+        self.jsonPath : str = os.path.join(tempDir, f"errors_{errorsCount}.json")
+        with open(self.jsonPath, "w", encoding="utf-8") as fh:
+            fh.write(self.jsonStr)
+        self.indexPath : str = os.path.join(tempDir, f"errors_{errorsCount}.idx")
+        self.lazyDb : lazyDatabase.LazyDatabase = lazyDatabase.openLazyDatabase(self.jsonPath, self.indexPath, MAX_RESIDENT_FACILITIES)
+
+        shortCodes = generateShortCodesDatabase(jsonDb, seed=seed)
+        self.shortCodesPath : str = os.path.join(tempDir, f"short_codes_{errorsCount}.json")
+        with open(self.shortCodesPath, "w", encoding="utf-8") as fh:
+            json.dump(shortCodes, fh, indent=4)
+        self.scDb : SCDatabase = SCDatabase()
+        self.scDb.LoadFromFile(self.shortCodesPath)
+
+        #Short codes as users type them : as written, lowercase, without separators, and unknown ones
+        self.shortCodeQueries : list = list()
+        knownShortCodes = list(shortCodes.keys())
+        for i in range(LOOKUPS_COUNT):
+            if len(knownShortCodes) == 0 or i % 4 == 3:
+                self.shortCodeQueries.append(f"ZZ-{i:05d}-0")
+                continue
+            shortCode = knownShortCodes[(i * 7919) % len(knownShortCodes)]
+            if i % 4 == 1:
+                shortCode = shortCode.lower()
+            elif i % 4 == 2:
+                shortCode = normalizeShortCode(shortCode)
+            self.shortCodeQueries.append(shortCode)
+
+#Benchmarks : each one returns the operation to time, which is called with the iteration number
+def benchGetDecoratedErrorCodeInfo(data : BenchmarkData):
+    db, codes = data.db, data.lookupCodes
+    return lambda i: errorsDatabase.getDecoratedErrorCodeInfo(db, codes[i % LOOKUPS_COUNT])
+
+def benchCompiledGetDecoratedErrorCodeInfo(data : BenchmarkData):
+    compiledDb, codes = data.compiledDb, data.lookupCodes
+    return lambda i: compiledDb.getDecoratedErrorCodeInfo(codes[i % LOOKUPS_COUNT])
+
+def benchLazyGetDecoratedErrorCodeInfo(data : BenchmarkData):
+    lazyDb, codes = data.lazyDb, data.lookupCodes
+    return lambda i: errorsDatabase.getDecoratedErrorCodeInfo(lazyDb, codes[i % LOOKUPS_COUNT])
+
+def benchOpenLazyDatabase(data : BenchmarkData):
+    return lambda i: lazyDatabase.openLazyDatabase(data.jsonPath, data.indexPath, MAX_RESIDENT_FACILITIES)
+
+#Bulk classification : a whole array of LOOKUPS_COUNT codes per call, against the same loop over classifyErrorCode()
+def benchClassifyErrorCodeLoop(data : BenchmarkData):
+    db, codes = data.db, data.lookupCodes
+    return lambda i: [errorsDatabase.classifyErrorCode(db, code) for code in codes]
+
+def benchBulkClassify(data : BenchmarkData):
+    classifier, codes = BulkClassifier(data.db), np.array(data.lookupCodes, dtype=np.uint32)
+    return lambda i: classifier.classify(codes)
+
+def benchGetDatabaseFromJSONString(data : BenchmarkData):
+    return lambda i: errorsDatabase.getDatabaseFromJSONString(data.jsonStr)
+
+def benchGetJSONStringFromDatabase(data : BenchmarkData):
+    return lambda i: errorsDatabase.getJSONStringFromDatabase(data.db)
+
+def benchGetMergedDatabases(data : BenchmarkData):
+    return lambda i: errorsDatabase.getMergedDatabases(data.db, data.appendedDb)
+
+#Merging MERGE_SOURCES_COUNT databases, one after the other then all at once
+def benchGetMergedDatabasesSequential(data : BenchmarkData):
+    def merge(i):
+        db = data.db
+        for appendedDb in data.appendedDbs:
+            db = errorsDatabase.getMergedDatabases(db, appendedDb)
+        return db
+    return merge
+
+def benchGetMultiMergedDatabases(data : BenchmarkData):
+    return lambda i: errorsDatabase.getMultiMergedDatabases(data.db, data.appendedDbs)
+
+def benchBuildMerkleTree(data : BenchmarkData):
+    return lambda i: merkleTree.buildMerkleTree(data.db)
+
+#What an update of MERKLE_UPDATED_FACILITIES facilities costs : only the facilities the merge created are hashed again, then diffed
+def _getMergedDbAndTrees(data : BenchmarkData) -> tuple:
+    tree = merkleTree.buildMerkleTree(data.db)
+    appendedDb = {facilityNum : data.appendedDb[facilityNum] for facilityNum in sorted(data.appendedDb.keys())[:MERKLE_UPDATED_FACILITIES]}
+    mergedDb = errorsDatabase.getMergedDatabases(data.db, appendedDb)
+    return (tree, mergedDb, merkleTree.buildMerkleTree(mergedDb, tree))
+
+def benchBuildMerkleTreeAfterMerge(data : BenchmarkData):
+    tree, mergedDb, _ = _getMergedDbAndTrees(data)
+    return lambda i: merkleTree.buildMerkleTree(mergedDb, tree)
+
+def benchGetDatabaseDiffAfterMerge(data : BenchmarkData):
+    tree, mergedDb, mergedTree = _getMergedDbAndTrees(data)
+    return lambda i: merkleTree.getDatabaseDiff(data.db, tree, mergedDb, mergedTree)
+
+def benchSCDatabaseLoadFromFile(data : BenchmarkData):
+    return lambda i: SCDatabase().LoadFromFile(data.shortCodesPath)
+
+def benchResolveShortCode(data : BenchmarkData):
+    scDb, queries = data.scDb, data.shortCodeQueries
+    return lambda i: scDb.ResolveShortCode(queries[i % LOOKUPS_COUNT])
+
+BENCHMARKS = {
+    "getDecoratedErrorCodeInfo" : benchGetDecoratedErrorCodeInfo,
+    "CompiledDatabase.getDecoratedErrorCodeInfo" : benchCompiledGetDecoratedErrorCodeInfo,
+    "LazyDatabase.getDecoratedErrorCodeInfo" : benchLazyGetDecoratedErrorCodeInfo,
+    "openLazyDatabase" : benchOpenLazyDatabase,
+    "classifyErrorCode (loop)" : benchClassifyErrorCodeLoop,
+    "getDatabaseFromJSONString" : benchGetDatabaseFromJSONString,
+    "getJSONStringFromDatabase" : benchGetJSONStringFromDatabase,
+    "getMergedDatabases" : benchGetMergedDatabases,
+    f"getMergedDatabases ({MERGE_SOURCES_COUNT} sources, one by one)" : benchGetMergedDatabasesSequential,
+    f"getMultiMergedDatabases ({MERGE_SOURCES_COUNT} sources)" : benchGetMultiMergedDatabases,
+    "buildMerkleTree" : benchBuildMerkleTree,
+    f"buildMerkleTree (after merging {MERKLE_UPDATED_FACILITIES} facilities)" : benchBuildMerkleTreeAfterMerge,
+    f"getDatabaseDiff (after merging {MERKLE_UPDATED_FACILITIES} facilities)" : benchGetDatabaseDiffAfterMerge,
+    "SCDatabase.LoadFromFile" : benchSCDatabaseLoadFromFile,
+    "SCDatabase.ResolveShortCode" : benchResolveShortCode,
+}
+if np != None:
+    BENCHMARKS["BulkClassifier.classify"] = benchBulkClassify
+
+#Returns the value below which ratio of the sorted samples are
+def getPercentile(sortedSamples : list, ratio : float) -> float:
+    return sortedSamples[min(len(sortedSamples) - 1, int(len(sortedSamples) * ratio))]
+
+#Times op until it ran for minTime seconds, then measures its peak memory
+def runBenchmark(op, minTime : float) -> dict:
+    op(0) #Warm up
+    samples = list()
+    clock = time.perf_counter_ns
+    deadline = clock() + int(minTime * 1e9)
+    i = 0
+    while i < MAX_ITERATIONS:
+        start = clock()
+        op(i)
+        end = clock()
+        samples.append(end - start)
+        i += 1
+        if end >= deadline:
+            break
+
+    tracemalloc.start()
+    op(0)
+    peakMemory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    samples.sort()
+    return {
+        "iterations" : len(samples),
+        "opsPerSec" : len(samples) * 1e9 / sum(samples),
+        "p50Us" : getPercentile(samples, 0.50) / 1000,
+        "p99Us" : getPercentile(samples, 0.99) / 1000,
+        "peakMemoryBytes" : peakMemory,
+    }
+
+def runBenchmarks(sizes : list, seed : int, minTime : float, nameFilter : str) -> dict:
+    results = dict()
+    with tempfile.TemporaryDirectory() as tempDir:
+        for errorsCount in sizes:
+            print(f"Generating a database of {errorsCount} errors...")
+            data = BenchmarkData(errorsCount, seed, tempDir)
+            for name, bench in BENCHMARKS.items():
+                if nameFilter and nameFilter.lower() not in name.lower():
+                    continue
+                result = runBenchmark(bench(data), minTime)
+                result["benchmark"] = name
+                result["errorsCount"] = errorsCount
+                results[f"{name}/{errorsCount}"] = result
+                print(f"  {name:<45} {result['opsPerSec']:>12.1f} ops/s  p50 {result['p50Us']:>11.1f} us  p99 {result['p99Us']:>11.1f} us  "
+                    f"peak {result['peakMemoryBytes'] / (1 << 20):>8.2f} MiB  ({result['iterations']} iterations)")
+            del data
+    return {
+        "meta" : {
+            "python" : platform.python_version(),
+            "platform" : platform.platform(),
+            "seed" : seed,
+            "minTime" : minTime,
+            "date" : time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results" : results,
+    }
+
+#Prints the differences between two result sets, and returns the number of regressions beyond threshold (a ratio)
+def compareResults(baseline : dict, current : dict, threshold : float) -> int:
+    regressions = 0
+    for key, cur in current["results"].items():
+        base = baseline["results"].get(key)
+        if base == None:
+            print(f"  {key:<55} (not in baseline)")
+            continue
+
+        speedChange = cur["opsPerSec"] / base["opsPerSec"] - 1.0
+        p99Change = (cur["p99Us"] / base["p99Us"] - 1.0) if base["p99Us"] > 0 else 0.0
+        memoryDelta = cur["peakMemoryBytes"] - base["peakMemoryBytes"]
+        problems = list()
+        if speedChange < -threshold:
+            problems.append("ops/s")
+        if p99Change > threshold:
+            problems.append("p99")
+        if memoryDelta > MEMORY_NOISE_FLOOR and memoryDelta > base["peakMemoryBytes"] * threshold:
+            problems.append("memory")
+        regressions += len(problems) != 0
+        print(f"  {key:<55} ops/s {speedChange:>+7.1%}  p99 {p99Change:>+7.1%}  peak {memoryDelta / (1 << 20):>+8.2f} MiB"
+            + (f"  REGRESSION ({', '.join(problems)})" if len(problems) != 0 else ""))
+
+    for key in baseline["results"].keys():
+        if key not in current["results"]:
+            print(f"  {key:<55} (missing from results)")
+    return regressions
+
+def loadResults(path : str) -> dict:
+    with open(path, "r", encoding="utf-8") as fh:
+        return json.load(fh)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Runs the databases microbenchmarks")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Numbers of errors of the generated databases")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--min-time", dest="minTime", type=float, default=1.0, help="Minimum time spent on each benchmark, in seconds")
+    parser.add_argument("--filter", dest="nameFilter", help="Only run the benchmarks whose name contains this")
+    parser.add_argument("--output", help="Save the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare the results to the ones saved in this JSON file")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "RESULTS"), help="Only compare two saved result files")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Relative change reported as a regression (default : 0.2)")
+    args = parser.parse_args()
+
+    if args.compare:
+        baseline, current = loadResults(args.compare[0]), loadResults(args.compare[1])
+    else:
+        current = runBenchmarks(args.sizes, args.seed, args.minTime, args.nameFilter)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as fh:
+                json.dump(current, fh, indent=4)
+        baseline = loadResults(args.baseline) if args.baseline else None
+
+    if baseline != None:
+        print(f"Comparison with the baseline (threshold {args.threshold:.0%}) :")
+        regressions = compareResults(baseline, current, args.threshold)
+        print(f"{regressions} regression(s).")
+        sys.exit(1 if regressions != 0 else 0)
+    sys.exit(0)
@@ -0,0 +1,287 @@
+import os
+import sys
+import mmap
+import struct
+from bisect import bisect_left
+from collections.abc import Mapping
+
+import errorsDatabase
+from errorsDatabase import Database, Facility, Error, BlacklistEntry
+from lazyDatabase import ResidentFacilities
+from merkleTree import getFacilityHash
+
+#Binary snapshot format :
+# Snapshots are a compact, memory-mappable representation of an errors database, compiled from its JSON form.
+# Opening one only reads the header and the facility table : everything else is decoded lazily, straight from the mapping.
+# All integers are little-endian uint32 unless noted otherwise, and every section is 4-byte aligned.
+#
+# - Header (see HEADER_FORMAT)
+#   - magic, version
+#   - number of facilities, errors and blacklist ranges, size of the string table
+#   - size, modification time (in ns), SHA-1 and Git blob SHA-1 of the JSON file the snapshot was compiled from
+# - Facility table : one FACILITY_RECORD_FORMAT record per facility, sorted by facility number
+#   - facility number, name and description offsets, index/count of its errors, index/count of its blacklist ranges
+# - Error codes : one (facility << 16) | errorNum code per error, sorted - the errors of a facility are contiguous
+# - Error strings : one (name offset, description offset) pair per error, in the same order as the error codes
+# - Blacklists : one (min, max) pair per blacklist range, in normalized form (see errorsDatabase.getNormalizedBlacklist()) and grouped by facility
+# - Facility hashes : the 20-byte hash of every facility (see merkleTree.py), in the same order as the facility table
+# - String table : deduplicated UTF-8 strings, each one prefixed by its length
+#
+# String offsets are relative to the start of the string table. NO_STRING is used for absent descriptions.
+#
+
+SNAPSHOT_MAGIC = b"RVDB"
+SNAPSHOT_VERSION = 3 #Bumped whenever the facility hashes change encoding (see merkleTree.py), so that stale snapshots are compiled again
+
+HEADER_FORMAT = "<4sIIIIIQQ20s20s"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+FACILITY_HASH_SIZE = 20
+FACILITY_RECORD_FORMAT = "<IIIIIII"
+FACILITY_RECORD_SIZE = struct.calcsize(FACILITY_RECORD_FORMAT)
+
+NO_STRING = 0xFFFFFFFF
+
+#Errors of a facility, read from a snapshot. Behaves like the Dict[int, Error] of a regular Facility.
+class MappedErrors(Mapping):
+    __slots__ = ["snapshot", "facilityBase", "start", "end"]
+
+    def __init__(self, snapshot, facilityNum : int, start : int, count : int) -> None:
+        self.snapshot : MappedDatabase = snapshot
+        self.facilityBase : int = facilityNum << 16
+        self.start : int = start
+        self.end : int = start + count
+
+    #Returns the index of an error in the snapshot's arrays, or -1 if it doesn't exist
+    def __find(self, errorNum : int) -> int:
+        code = self.facilityBase | errorNum
+        idx = bisect_left(self.snapshot.errorCodes, code, self.start, self.end)
+        if idx < self.end and self.snapshot.errorCodes[idx] == code:
+            return idx
+        return -1
+
+    def get(self, errorNum : int, default = None) -> Error:
+        idx = self.__find(errorNum)
+        if idx == -1:
+            return default
+        return self.snapshot.getError(idx)
+
+    def __getitem__(self, errorNum : int) -> Error:
+        idx = self.__find(errorNum)
+        if idx == -1:
+            raise KeyError(errorNum)
+        return self.snapshot.getError(idx)
+
+    def __contains__(self, errorNum) -> bool:
+        return self.__find(errorNum) != -1
+
+    def __iter__(self):
+        for idx in range(self.start, self.end):
+            yield self.snapshot.errorCodes[idx] & errorsDatabase.ERROR_NUM_MASK
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
+    def items(self):
+        for idx in range(self.start, self.end):
+            yield (self.snapshot.errorCodes[idx] & errorsDatabase.ERROR_NUM_MASK, self.snapshot.getError(idx))
+
+#Errors database read from a memory-mapped snapshot. Behaves like a regular (read-only) Database.
+#Facility objects are only built when first accessed. If maxResidentFacilities isn't 0, only that many are kept, like in a lazyDatabase.LazyDatabase.
+class MappedDatabase(Mapping):
+    __slots__ = ["fileMapping", "header", "facilityRecords", "errorCodes", "errorStrings", "blacklists", "facilityHashes", "stringsOffset", "facilities", "resident"]
+
+    #May raise IOError, or ValueError if the file isn't a valid snapshot
+    def __init__(self, snapshotPath : str, maxResidentFacilities : int = 0) -> None:
+        if sys.byteorder != "little":
+            raise ValueError("Snapshots can only be mapped on little-endian machines.")
+
+        with open(snapshotPath, "rb") as fh:
+            self.fileMapping : mmap.mmap = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self.fileMapping) < HEADER_SIZE:
+            raise ValueError(f"'{snapshotPath}' is too small to be a snapshot.")
+        self.header : tuple = struct.unpack_from(HEADER_FORMAT, self.fileMapping, 0)
+        magic, version, facilityCount, errorCount, blacklistCount, stringsSize = self.header[:6]
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            raise ValueError(f"'{snapshotPath}' isn't a version {SNAPSHOT_VERSION} snapshot.")
+
+        view = memoryview(self.fileMapping)
+        offset = HEADER_SIZE
+        self.facilityRecords = view[offset : offset + facilityCount * FACILITY_RECORD_SIZE].cast("I")
+        offset += facilityCount * FACILITY_RECORD_SIZE
+        self.errorCodes = view[offset : offset + errorCount * 4].cast("I")
+        offset += errorCount * 4
+        self.errorStrings = view[offset : offset + errorCount * 8].cast("I")
+        offset += errorCount * 8
+        self.blacklists = view[offset : offset + blacklistCount * 8].cast("I")
+        offset += blacklistCount * 8
+        self.facilityHashes = view[offset : offset + facilityCount * FACILITY_HASH_SIZE]
+        offset += facilityCount * FACILITY_HASH_SIZE
+        self.stringsOffset : int = offset
+        if offset + stringsSize > len(self.fileMapping):
+            raise ValueError(f"'{snapshotPath}' is truncated.")
+
+        #Facility number -> index in the facility table, then -> Facility once accessed
+        recordLength = FACILITY_RECORD_SIZE // 4
+        self.facilities : dict = {self.facilityRecords[i * recordLength] : i for i in range(facilityCount)}
+        self.resident : ResidentFacilities = ResidentFacilities(maxResidentFacilities) if maxResidentFacilities > 0 else None
+
+    def getSourceInfo(self) -> tuple:
+        return self.header[6:] #size, mtime_ns, SHA-1, Git blob SHA-1
+
+    def getErrorsCount(self) -> int:
+        return self.header[3]
+
+    #Returns the hash of every facility, by facility number - see merkleTree.getMerkleTreeFromHashes()
+    def getFacilityHashes(self) -> dict:
+        recordLength = FACILITY_RECORD_SIZE // 4
+        return {self.facilityRecords[i * recordLength] : bytes(self.facilityHashes[i * FACILITY_HASH_SIZE : (i + 1) * FACILITY_HASH_SIZE])
+            for i in range(len(self.facilities))}
+
+    #Returns the string at the given offset of the string table, or None for NO_STRING
+    def getString(self, offset : int) -> str:
+        if offset == NO_STRING:
+            return None
+        offset += self.stringsOffset
+        (length,) = struct.unpack_from("<I", self.fileMapping, offset)
+        return self.fileMapping[offset + 4 : offset + 4 + length].decode("utf-8")
+
+    def getError(self, idx : int) -> Error:
+        return Error(name = self.getString(self.errorStrings[2 * idx]), description = self.getString(self.errorStrings[2 * idx + 1]))
+
+    def __buildFacility(self, recordIdx : int) -> Facility:
+        recordLength = FACILITY_RECORD_SIZE // 4
+        facilityNum, nameOff, descOff, errorsStart, errorsCount, blacklistStart, blacklistCount = \
+            self.facilityRecords[recordIdx * recordLength : (recordIdx + 1) * recordLength]
+        blacklist = [BlacklistEntry(min = self.blacklists[2 * i], max = self.blacklists[2 * i + 1]) for i in range(blacklistStart, blacklistStart + blacklistCount)]
+        return Facility(name = self.getString(nameOff), description = self.getString(descOff),
+            blacklist = blacklist, errors = MappedErrors(self, facilityNum, errorsStart, errorsCount))
+
+    def get(self, facilityNum : int, default = None) -> Facility:
+        facility = self.facilities.get(facilityNum)
+        if facility == None:
+            return default
+        if not isinstance(facility, Facility):
+            if self.resident != None: #Facility table entries are left as-is, since facilities may be evicted
+                recordIdx = facility
+                return self.resident.get(facilityNum, lambda _: self.__buildFacility(recordIdx))
+            facility = self.__buildFacility(facility)
+            self.facilities[facilityNum] = facility
+        return facility
+
+    def __getitem__(self, facilityNum : int) -> Facility:
+        facility = self.get(facilityNum)
+        if facility == None:
+            raise KeyError(facilityNum)
+        return facility
+
+    def __contains__(self, facilityNum) -> bool:
+        return facilityNum in self.facilities
+
+    def __iter__(self):
+        return iter(list(self.facilities.keys()))
+
+    def __len__(self) -> int:
+        return len(self.facilities)
+
+#Serializes a Database to the snapshot format. sourceInfo is the (size, mtime_ns, SHA-1, Git blob SHA-1) of the JSON file the Database was loaded from.
+#facilityHashes maps facility numbers to their hashes (see merkleTree.MerkleTree) if they are already known - the missing ones are computed.
+def getSnapshotFromDatabase(db : Database, sourceInfo : tuple, facilityHashes : dict = None) -> bytes:
+    strings = dict() #Deduplicates strings : str -> offset in the string table
+    stringTable = bytearray()
+    def addString(s : str) -> int:
+        if s == None:
+            return NO_STRING
+        offset = strings.get(s)
+        if offset == None:
+            encoded = s.encode("utf-8")
+            offset = len(stringTable)
+            stringTable.extend(struct.pack("<I", len(encoded)))
+            stringTable.extend(encoded)
+            strings[s] = offset
+        return offset
+
+    facilityRecords = bytearray()
+    errorCodes = bytearray()
+    errorStrings = bytearray()
+    blacklists = bytearray()
+    hashes = bytearray()
+    errorCount = 0
+    blacklistCount = 0
+    for facilityNum in sorted(db.keys()):
+        facilityObj = db[facilityNum]
+        blacklist = errorsDatabase.getNormalizedBlacklist(facilityObj.blacklist)
+        facilityRecords.extend(struct.pack(FACILITY_RECORD_FORMAT, facilityNum, addString(facilityObj.name), addString(facilityObj.description),
+            errorCount, len(facilityObj.errors), blacklistCount, len(blacklist)))
+
+        for errorNum in sorted(facilityObj.errors.keys()):
+            errorObj = facilityObj.errors[errorNum]
+            errorCodes.extend(struct.pack("<I", (facilityNum << 16) | errorNum))
+            errorStrings.extend(struct.pack("<II", addString(errorObj.name), addString(errorObj.description)))
+        errorCount += len(facilityObj.errors)
+
+        for blacklistRange in blacklist:
+            blacklists.extend(struct.pack("<II", blacklistRange.min, blacklistRange.max))
+        blacklistCount += len(blacklist)
+
+        facilityHash = facilityHashes.get(facilityNum) if facilityHashes != None else None
+        hashes.extend(facilityHash if facilityHash != None else getFacilityHash(facilityNum, facilityObj))
+
+    sourceSize, sourceMtimeNs, sourceSha1, sourceGitBlobSha = sourceInfo
+    header = struct.pack(HEADER_FORMAT, SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(db), errorCount, blacklistCount, len(stringTable),
+        sourceSize, sourceMtimeNs, bytes.fromhex(sourceSha1), bytes.fromhex(sourceGitBlobSha))
+    return header + bytes(facilityRecords) + bytes(errorCodes) + bytes(errorStrings) + bytes(blacklists) + bytes(hashes) + bytes(stringTable)
+
+#Returns the source info of a JSON file, to be stored in a snapshot - sha1 and gitBlobSha are hex strings
+def getSourceInfoOfFile(jsonPath : str, sha1 : str, gitBlobSha : str) -> tuple:
+    st = os.stat(jsonPath)
+    return (st.st_size, st.st_mtime_ns, sha1, gitBlobSha)
+
+#Writes a snapshot next to its final location, then moves it in place, so a snapshot which is currently mapped is never modified.
+#Returns True on success, False otherwise.
+def writeSnapshotFile(db : Database, sourceInfo : tuple, snapshotPath : str, facilityHashes : dict = None) -> bool:
+    tmpPath = snapshotPath + ".tmp"
+    try:
+        data = getSnapshotFromDatabase(db, sourceInfo, facilityHashes)
+    except struct.error as e: #Facility numbers or blacklist ranges which don't fit the format (i.e. facility 0x10000) - the JSON database still loads
+        print(f"Failed to compile snapshot '{snapshotPath}' ({e}).")
+        return False
+    try:
+        with open(tmpPath, "wb") as fh:
+            fh.write(data)
+        os.replace(tmpPath, snapshotPath)
+        return True
+    except OSError as e:
+        print(f"Failed to write snapshot '{snapshotPath}' ({e.__class__.__name__}).")
+        return False
+
+#Returns the MappedDatabase of a snapshot if it was compiled from the JSON file at jsonPath as it is now, None otherwise.
+#Only the size and modification time of the JSON file are checked, so this doesn't need to read it.
+def openSnapshotIfUpToDate(snapshotPath : str, jsonPath : str, maxResidentFacilities : int = 0) -> MappedDatabase:
+    try:
+        snapshot = MappedDatabase(snapshotPath, maxResidentFacilities)
+        st = os.stat(jsonPath)
+    except (OSError, ValueError):
+        return None
+    sourceSize, sourceMtimeNs = snapshot.getSourceInfo()[:2]
+    if sourceSize != st.st_size or sourceMtimeNs != st.st_mtime_ns:
+        return None
+    return snapshot
+
+#Usage : python binaryDatabase.py <errors database JSON> <output snapshot>
+if __name__ == "__main__":
+    from hashlib import sha1
+    if len(sys.argv) != 3:
+        print(f"Usage : {sys.argv[0]} <errors database JSON> <output snapshot>")
+        sys.exit(1)
+
+    with open(sys.argv[1], "rb") as fh:
+        data = fh.read()
+    db = errorsDatabase.getDatabaseFromJSONString(data.decode("utf-8"))
+    if db == None:
+        sys.exit(1)
+
+    sha1Hex = sha1(data).hexdigest()
+    gitBlobShaHex = sha1(b"blob %d\0" % len(data) + data).hexdigest()
+    if not writeSnapshotFile(db, getSourceInfoOfFile(sys.argv[1], sha1Hex, gitBlobShaHex), sys.argv[2]):
+        sys.exit(1)
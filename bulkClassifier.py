@@ -0,0 +1,86 @@
+import numpy as np
+
+import errorsDatabase
+from errorsDatabase import Database
+
+#Vectorized classification of arrays of error codes (i.e. collected from telemetry), with NumPy.
+#NumPy is only needed by this module : nothing else in the bot imports it.
+#
+#Every code gets the class errorsDatabase.classifyErrorCode() would give it : the checks are the same masks, applied to the whole
+#array at once, and np.select() picks the first matching class in the same order as getDecoratedErrorCodeInfo() :
+#taiHEN, SceUID / not an error, reserved bits, blacklisted, pointer (facility > 0x100), then known or unknown error.
+#
+#Blacklists and known errors are compiled into sorted arrays of (facility << 16) | errorNum keys, which are bisected for all codes at once.
+
+#Bits of a code which identify an error, i.e. everything but the error and fatal bits
+_KEY_MASK = errorsDatabase.RESERVED_MASK | errorsDatabase.FACILITY_MASK | errorsDatabase.ERROR_NUM_MASK
+_MAX_FACILITY_NUM = errorsDatabase.FACILITY_MASK >> 16
+
+class BulkClassifier:
+    __slots__ = ["knownKeys", "names", "blacklistStarts", "blacklistEnds"]
+
+    def __init__(self, db : Database) -> None:
+        known = list()
+        blacklists = list()
+        for facilityNum, facilityObj in db.items():
+            #The parser accepts any facility number, but only those of the facility bits can match a code
+            if not (0 <= facilityNum <= _MAX_FACILITY_NUM):
+                continue
+            facilityBase = facilityNum << 16
+            known += [(facilityBase | errorNum, errorObj.name) for errorNum, errorObj in facilityObj.errors.items()]
+            #Blacklists are normalized, so ranges are disjoint - those of different facilities can't overlap either.
+            #Ranges are clipped to the error numbers a code can hold, like isInBlacklist() only ever tests those.
+            blacklists += [(facilityBase | max(blacklistRange.min, 0), facilityBase | min(blacklistRange.max, errorsDatabase.ERROR_NUM_MASK))
+                for blacklistRange in facilityObj.blacklist if blacklistRange.min <= errorsDatabase.ERROR_NUM_MASK and blacklistRange.max >= 0]
+        known.sort()
+        blacklists.sort()
+
+        self.knownKeys : np.ndarray = np.array([entry[0] for entry in known], dtype=np.uint32)
+        self.names : list = [entry[1] for entry in known] #Names table : the indices returned by classify() point into it
+        self.blacklistStarts : np.ndarray = np.array([entry[0] for entry in blacklists], dtype=np.uint32)
+        self.blacklistEnds : np.ndarray = np.array([entry[1] for entry in blacklists], dtype=np.uint32)
+
+    #Returns a boolean array, True where key (a code without its error and fatal bits) is in one of the ranges [starts[i], ends[i]]
+    @staticmethod
+    def __isInRanges(keys : np.ndarray, starts : np.ndarray, ends : np.ndarray) -> np.ndarray:
+        if len(starts) == 0:
+            return np.zeros(keys.shape, dtype=bool)
+        idx = np.searchsorted(starts, keys, side="right") - 1
+        return (idx >= 0) & (keys <= ends[np.maximum(idx, 0)])
+
+    #Classifies an array of codes. Returns (classes, indices) :
+    # - classes : uint8 array of errorsDatabase.CODE_CLASS_* values
+    # - indices : int64 array of indices into self.names for CODE_CLASS_RESOLVED codes, -1 for the others
+    def classify(self, codes) -> tuple:
+        codes = np.asarray(codes, dtype=np.uint32)
+        keys = codes & np.uint32(_KEY_MASK)
+        facilities = (codes & np.uint32(errorsDatabase.FACILITY_MASK)) >> np.uint32(16)
+
+        isTaiHEN = (codes >= np.uint32(0x90010000)) & (codes <= np.uint32(0x9001000D))
+        isError = (codes & np.uint32(errorsDatabase.IS_ERROR_MASK)) != 0
+        canBeSceUID = ((codes & np.uint32(0xF0000000)) == np.uint32(0x40000000)) & ((codes & np.uint32(0xF0000)) != 0) & ((codes & np.uint32(1)) == 1)
+        isReserved = (codes & np.uint32(errorsDatabase.RESERVED_MASK)) != 0
+        isBlacklisted = BulkClassifier.__isInRanges(keys, self.blacklistStarts, self.blacklistEnds)
+        isPointer = facilities > np.uint32(0x100)
+
+        if len(self.knownKeys) != 0:
+            knownIdx = np.minimum(np.searchsorted(self.knownKeys, keys), len(self.knownKeys) - 1)
+            isKnown = self.knownKeys[knownIdx] == keys
+        else:
+            knownIdx = np.zeros(codes.shape, dtype=np.int64)
+            isKnown = np.zeros(codes.shape, dtype=bool)
+
+        #np.select() takes the first condition which holds : this is the decision order of getDecoratedErrorCodeInfo()
+        classes = np.select(
+            [isTaiHEN, ~isError & canBeSceUID, ~isError, isReserved, isBlacklisted, isPointer, isKnown],
+            [errorsDatabase.CODE_CLASS_TAIHEN, errorsDatabase.CODE_CLASS_SCEUID, errorsDatabase.CODE_CLASS_NOT_ERROR, errorsDatabase.CODE_CLASS_RESERVED,
+                errorsDatabase.CODE_CLASS_BLACKLISTED, errorsDatabase.CODE_CLASS_POINTER, errorsDatabase.CODE_CLASS_RESOLVED],
+            default=errorsDatabase.CODE_CLASS_UNKNOWN).astype(np.uint8)
+        indices = np.where(classes == errorsDatabase.CODE_CLASS_RESOLVED, knownIdx, -1).astype(np.int64)
+        return (classes, indices)
+
+    #Returns the number of codes of each class, by class name
+    @staticmethod
+    def getClassCounts(classes : np.ndarray) -> dict:
+        counts = np.bincount(classes, minlength=len(errorsDatabase.CODE_CLASS_NAMES))
+        return {name : int(count) for name, count in zip(errorsDatabase.CODE_CLASS_NAMES, counts)}
@@ -0,0 +1,260 @@
+import re
+
+import errorsDatabase
+from nameIndex import NameIndex
+from searchIndex import SearchIndex
+from shortCodesDatabase import SCDatabase
+
+#Resolution of error codes and short codes into the replies the bot sends.
+#Nothing here depends on Discord, so the same code can serve other frontends.
+
+#Candidates for error codes in free-form text (i.e. crash logs), in a single pass :
+# - 'hex' : 0x8XXXXXXX-0xFXXXXXXX, optionally sign-extended to 64-bit (0xFFFFFFFF8XXXXXXX)
+# - 'neghex' : negative hexadecimal value (-0x7FFDFFFD)
+# - 'negdec' : negative decimal value, as printed by "%d" (-2147352573)
+# - 'short' : short code (C1-2345-6)
+CANDIDATES_REGEX = re.compile(r"""(?<![\w-])(?:
+    0x(?:F{8})?(?P<hex>[89A-F][0-9A-F]{7})
+    |-0x(?P<neghex>[0-9A-F]{1,8})
+    |-(?P<negdec>[12][0-9]{9})
+    |(?P<short>[A-Z][A-Z0-9]-[0-9]{4,5}-[0-9])
+)(?!\w)""", re.IGNORECASE | re.VERBOSE)
+
+#Longest text CANDIDATES_REGEX can match, plus the character its lookahead inspects
+MAX_CANDIDATE_LENGTH = len("0xFFFFFFFF80000000") + 1
+
+#Maximum number of distinct candidates a CodeScanner keeps - scanning stops once it is reached
+MAX_BATCH_CODES = 500
+
+#Returns the code (int) or short code (str) a match of CANDIDATES_REGEX stands for, or None if it doesn't fit in 32 bits
+def getCandidateKey(match):
+    if match.group("hex") != None:
+        return int(match.group("hex"), 16)
+    elif match.group("neghex") != None:
+        return -int(match.group("neghex"), 16) & 0xFFFFFFFF
+    elif match.group("negdec") != None:
+        value = int(match.group("negdec"))
+        return (-value & 0xFFFFFFFF) if value <= 0x80000000 else None
+    else:
+        return match.group("short").upper()
+
+#Returns the line listing the short codes of an error code, or an empty string if it has none
+def _getShortCodesLine(scDb : SCDatabase, code : int) -> str:
+    if (scDb == None) or not scDb.IsValidDatabaseLoaded():
+        return ""
+    shortCodes = scDb.GetShortCodesOfErrorCode(code)
+    if len(shortCodes) == 0:
+        return ""
+    return ("\nShort code : " if len(shortCodes) == 1 else "\nShort codes : ") + ", ".join(shortCodes)
+
+#Parses a single error code or short code, as typed by an user
+#Returns (kind of input, code, failure) : the input is "hex" or "short_code", and code is None if the input couldn't be resolved,
+#failure being the reason why - "no_database" (no short codes database loaded), "unknown_short_code" or "too_long"
+def parseErrorCodeInput(scDb : SCDatabase, input_str : str) -> tuple:
+    scDbLoaded = (scDb != None) and scDb.IsValidDatabaseLoaded()
+    try:
+        errcode = int(input_str, 16)
+    except ValueError: #Not an integer - try as short code (string)
+        errcode = None
+
+    #Short codes written without separators (i.e. C123456) are valid hexadecimal numbers too : known short codes take precedence
+    if errcode == None or (scDbLoaded and input_str[0] != '-' and not input_str.upper().startswith("0X") and scDb.ResolveShortCode(input_str) != 0):
+        if not scDbLoaded:
+            return ("short_code", None, "no_database")
+        errcode = scDb.ResolveShortCode(input_str) #Short codes are normalized (case, separators) by the database
+        if errcode == 0:
+            return ("short_code", None, "unknown_short_code")
+        return ("short_code", errcode, None)
+
+    if input_str[0] == '-': #Negative error codes get sign-extended to 64-bit - clamp to 32-bit
+        errcode &= 0xFFFFFFFF
+    if (errcode & 0xFFFFFFFF) != errcode:
+        return ("hex", None, "too_long")
+    return ("hex", errcode, None)
+
+#Returns the reply for a single error code or short code, as typed by an user
+#compiledDb may be None if no valid errors database is loaded
+def getErrorCodeResponse(compiledDb : errorsDatabase.CompiledDatabase, scDb : SCDatabase, input_str : str) -> str:
+    inputKind, errcode, failure = parseErrorCodeInput(scDb, input_str)
+    if failure == "no_database":
+        return "No valid short error codes database is currently loaded : cannot try to resolve."
+    elif failure == "unknown_short_code":
+        return f"`{input_str}` is an unknown short code or an invalid input."
+    elif failure == "too_long":
+        return "Input too long - error codes are only 4 bytes wide."
+
+    printStr = "```\n"
+    if inputKind == "short_code": #Print which hex code this short code maps to
+        printStr += f"Short code {scDb.GetCanonicalShortCode(input_str)} -> 0x{errcode:08X}\n"
+    elif input_str[0] == '-': #Print the value the negative input was clamped from
+        printStr += f"-0x{-int(input_str, 16):07X} -> 0x{errcode:08X}\n"
+
+    if (compiledDb == None):
+        return "No valid errors database is currently loaded."
+    else:
+        shortCodesLine = _getShortCodesLine(scDb, errcode) if inputKind != "short_code" else ""
+        return printStr + compiledDb.getDecoratedErrorCodeInfo(errcode) + shortCodesLine + "\n```"
+
+#Returns the (kind of input, outcome) of an error_code lookup, for metrics
+#The input is "hex" or "short_code", the outcome one of errorsDatabase.CODE_CLASS_NAMES or a reason the input couldn't be resolved
+def getErrorCodeOutcome(db : errorsDatabase.Database, scDb : SCDatabase, input_str : str) -> tuple:
+    inputKind, errcode, failure = parseErrorCodeInput(scDb, input_str)
+    if failure != None:
+        return (inputKind, failure)
+    if db == None:
+        return (inputKind, "no_database")
+    return (inputKind, errorsDatabase.CODE_CLASS_NAMES[errorsDatabase.classifyErrorCode(db, errcode)])
+
+#Returns what is known about an error code as a JSON-serializable dict, for frontends which want data rather than text (i.e. the HTTP API)
+#"facility" and "error" are only set for codes which designate an error of a facility, and are None if it isn't in the database
+def getErrorCodeDict(compiledDb : errorsDatabase.CompiledDatabase, scDb : SCDatabase, code : int) -> dict:
+    db = compiledDb.databaseObject
+    codeClass = errorsDatabase.classifyErrorCode(db, code)
+    ret = {"code" : f"0x{code:08X}", "class" : errorsDatabase.CODE_CLASS_NAMES[codeClass], "info" : compiledDb.getDecoratedErrorCodeInfo(code)}
+    if codeClass in (errorsDatabase.CODE_CLASS_RESOLVED, errorsDatabase.CODE_CLASS_UNKNOWN):
+        facilityNum = (code & errorsDatabase.FACILITY_MASK) >> 16
+        errorNum = code & errorsDatabase.ERROR_NUM_MASK
+        facility = db.get(facilityNum)
+        error = facility.errors.get(errorNum) if facility != None else None
+        ret["fatal"] = (code & errorsDatabase.IS_FATAL_MASK) != 0
+        ret["facility"] = {"number" : f"0x{facilityNum:03X}", "name" : facility.name, "description" : facility.description} if facility != None else None
+        ret["error"] = {"number" : f"0x{errorNum:04X}", "name" : error.name, "description" : error.description} if error != None else None
+    scDbLoaded = (scDb != None) and scDb.IsValidDatabaseLoaded()
+    ret["short_codes"] = list(scDb.GetShortCodesOfErrorCode(code)) if scDbLoaded else []
+    return ret
+
+#Extracts the distinct error code candidates of a text, which is fed in chunks (i.e. as a log is downloaded).
+#Candidates are deduplicated by the 32-bit code they stand for (or the short code itself), and kept in order of first appearance.
+class CodeScanner:
+    __slots__ = ["tail", "candidates", "truncated"]
+
+    def __init__(self) -> None:
+        self.tail : str = "\n" #End of the text fed so far which may still be part of a candidate - starts as a separator for the lookbehind
+        self.candidates : dict = dict() #Maps a code (int) or short code (str) to the text it was first seen as
+        self.truncated : bool = False #Set if the text holds more than MAX_BATCH_CODES distinct candidates
+
+    def __add(self, match) -> None:
+        key = getCandidateKey(match)
+        if key == None or key in self.candidates:
+            return
+        if len(self.candidates) >= MAX_BATCH_CODES:
+            self.truncated = True
+            return
+        self.candidates[key] = match.group(0)
+
+    #Scans text[1:] - text[0] is the last character of the previous chunk, only kept for the lookbehind of the regex.
+    #Matches which could still be extended by the next chunk are left in the tail, unless final is set.
+    def __scan(self, text : str, final : bool) -> None:
+        safeEnd = len(text) if final else len(text) - MAX_CANDIDATE_LENGTH
+        resumePos = max(safeEnd, 1)
+        for match in CANDIDATES_REGEX.finditer(text, 1):
+            if match.start() >= safeEnd or self.truncated:
+                break
+            self.__add(match)
+            resumePos = max(resumePos, match.end())
+        self.tail = text[resumePos - 1:]
+
+    #Returns False once the rest of the text doesn't need to be fed anymore
+    def feed(self, chunk : str) -> bool:
+        if not self.truncated:
+            self.__scan(self.tail + chunk, False)
+        return not self.truncated
+
+    #Scans what remains of the text - candidates are in self.candidates afterwards
+    def close(self) -> None:
+        if not self.truncated:
+            self.__scan(self.tail, True)
+        self.tail = ""
+
+    #Convenience function for texts which are already in memory
+    @staticmethod
+    def scanText(text : str):
+        scanner = CodeScanner()
+        scanner.feed(text)
+        scanner.close()
+        return scanner
+
+#Resolves a candidate found by CANDIDATES_REGEX, whose key is getCandidateKey() of the match and text the match itself.
+#Returns (code, header, info) : code is None if the candidate couldn't be resolved, in which case info says why.
+#Otherwise, info is the decorated info of the code (without its short codes).
+def resolveCandidate(compiledDb : errorsDatabase.CompiledDatabase, scDb : SCDatabase, key, text : str) -> tuple:
+    if isinstance(key, str): #Short code
+        if (scDb == None) or not scDb.IsValidDatabaseLoaded():
+            return (None, key, "no valid short error codes database is currently loaded.")
+        code = scDb.ResolveShortCode(key)
+        if code == 0:
+            return (None, key, "unknown short code.")
+        header = f"{scDb.GetCanonicalShortCode(key)} -> 0x{code:08X}"
+    else:
+        code = key
+        header = f"0x{code:08X}" if text.upper() == f"0X{code:08X}" else f"{text} -> 0x{code:08X}"
+
+    if compiledDb == None:
+        return (None, header, "no valid errors database is currently loaded.")
+    return (code, header, compiledDb.getDecoratedErrorCodeInfo(code))
+
+#Returns the combined reply for all candidates found by a scanner (without code block markers, so that it can be sent as a file)
+def getBatchResponse(compiledDb : errorsDatabase.CompiledDatabase, scDb : SCDatabase, scanner : CodeScanner) -> str:
+    entries = list()
+    for key, text in scanner.candidates.items():
+        code, header, info = resolveCandidate(compiledDb, scDb, key, text)
+        if code == None:
+            entries.append(f"{header} : {info}")
+        else: #Short codes are only listed for hexadecimal inputs
+            entries.append(header + "\n" + info + (_getShortCodesLine(scDb, code) if not isinstance(key, str) else ""))
+
+    if scanner.truncated:
+        entries.append(f"Only the first {MAX_BATCH_CODES} distinct codes were resolved - the rest of the input was ignored.")
+    return "\n\n".join(entries)
+
+#Maximum number of names listed when a name lookup has no exact match, and maximum length of the list
+MAX_NAME_COMPLETIONS = 25
+MAX_NAME_RESPONSE_LENGTH = 2000
+
+#Returns the reply for a name lookup : the codes of the errors and facilities named name, or the names starting with it
+def getNameResponse(db : errorsDatabase.Database, index : NameIndex, name : str) -> str:
+    if db == None or index == None:
+        return "No valid errors database is currently loaded."
+
+    lines = list()
+    for facilityNum in index.getFacilitiesOfName(name):
+        lines.append(f"Facility {errorsDatabase.getFacilityName(db, facilityNum)} : 0x{facilityNum:03X}")
+    for code in index.getCodesOfErrorName(name):
+        lines.append(f"{errorsDatabase.getErrorNameFromErrorCode(db, code)} : 0x{code:08X} ({errorsDatabase.getFacilityNameFromErrorCode(db, code)})")
+    if len(lines) != 0:
+        return "```\n" + "\n".join(lines) + "\n```"
+
+    for key, facilityNum in index.completeFacilityName(name, MAX_NAME_COMPLETIONS):
+        lines.append(f"Facility {errorsDatabase.getFacilityName(db, facilityNum)} : 0x{facilityNum:03X}")
+    for key, code in index.completeErrorName(name, MAX_NAME_COMPLETIONS - len(lines)):
+        lines.append(f"{errorsDatabase.getErrorNameFromErrorCode(db, code)} : 0x{code:08X}")
+    if len(lines) == 0:
+        return f"No error or facility name starts with `{name}`."
+
+    header = f"No exact match for `{name}` - names starting with it :\n```\n"
+    while len(lines) > 1 and len(header) + sum(len(line) + 1 for line in lines) + len("```") > MAX_NAME_RESPONSE_LENGTH:
+        lines.pop()
+    return header + "\n".join(lines) + "\n```"
+
+#Maximum number of results of a search, and maximum length of the reply
+MAX_SEARCH_RESULTS = 10
+MAX_SEARCH_RESPONSE_LENGTH = 2000
+
+#Returns the reply for a full-text search over the descriptions of the errors database
+def getSearchResponse(db : errorsDatabase.Database, index : SearchIndex, query : str) -> str:
+    if db == None or index == None:
+        return "No valid errors database is currently loaded."
+
+    entries = list()
+    for rank, (target, text) in enumerate(index.search(query, MAX_SEARCH_RESULTS), 1):
+        if target & errorsDatabase.IS_ERROR_MASK:
+            title = f"0x{target:08X} {errorsDatabase.getErrorNameFromErrorCode(db, target)} ({errorsDatabase.getFacilityNameFromErrorCode(db, target)})"
+        else:
+            title = f"Facility 0x{target:03X} {errorsDatabase.getFacilityName(db, target)}"
+        entries.append(f"{rank}. {title}\n   {SearchIndex.getSnippet(text, query)}")
+    if len(entries) == 0:
+        return f"No description matches `{query}`."
+
+    while len(entries) > 1 and sum(len(entry) + 1 for entry in entries) + len("```\n```") > MAX_SEARCH_RESPONSE_LENGTH:
+        entries.pop()
+    return "```\n" + "\n".join(entries) + "\n```"
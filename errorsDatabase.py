@@ -1,6 +1,10 @@
-import gc
 import json
+import heapq
+from array import array
+from bisect import bisect_left, bisect_right
 from hashlib import sha1
+from collections.abc import Mapping
+from itertools import groupby
 from dataclasses import dataclass
 from typing import NewType, Dict, List
 
@@ -23,6 +27,12 @@ from typing import NewType, Dict, List
 #   - a mandatory 'name' key (str)
 #   - an optional 'description' key (str)
 #
+# Databases are immutable once built : functions which "modify" a Database (i.e. getMergedDatabases()) return a new one instead.
+# Facility and Error objects which aren't modified are shared between the old and new Database, so a Database can be
+# swapped for a new one at any time, without readers of the old one ever seeing a partially modified state.
+# The dataclasses below are frozen to enforce this - the containers they hold must not be modified either.
+# In memory, the errors of a Facility are a CompactErrors rather than a dict (see below) : it behaves like a read-only dict.
+#
 # This format was chosen to mimic a JSON structure.
 # Note that in JSON, keys CANNOT be intergers, so a JSON->db parsing is required first.
 # See createDbFromJSON() for more info.
@@ -44,25 +54,132 @@ FACILITY_MASK       = 0x0FFF0000 #Facility identifier
 ERROR_NUM_MASK     = 0x0000FFFF #Error code identifier from facility
 
 
-@dataclass
+#The classes below are slotted, so their instances don't carry a __dict__
+@dataclass(frozen=True)
 class Error:
+    __slots__ = ["name", "description"]
     name : str
     description : str
 
-@dataclass
+@dataclass(frozen=True, order=True) #Ordered by (min, max), so that sorted blacklists can be searched with bisect
 class BlacklistEntry:
+    __slots__ = ["min", "max"]
     min : int
     max : int
 
-@dataclass
+@dataclass(frozen=True)
 class Facility:
+    __slots__ = ["name", "description", "blacklist", "errors"]
     name : str
     description : str
     blacklist : List[BlacklistEntry]
-    errors : Dict[int, Error]
+    errors : Dict[int, Error] #CompactErrors for databases built by this module, but any mapping (i.e. a dict) is accepted
 
 Database = NewType('Database', Dict[int, Facility])
 
+NO_STRING = 0xFFFFFFFF #Index of None in a StringPool
+
+#Pool of strings, stored as a single UTF-8 buffer - strings are referred to by their index in the pool.
+#Databases repeat the same descriptions many times : interned strings are only stored once.
+#Strings can only be added until the pool is sealed ; afterwards it is immutable, like the databases referring to it.
+class StringPool:
+    __slots__ = ["data", "offsets", "indices"]
+
+    def __init__(self) -> None:
+        self.data : bytearray = bytearray()
+        self.offsets : array = array("I", [0]) #String i is data[offsets[i]:offsets[i + 1]]
+        self.indices : dict = dict() #Maps a string to its index - dropped when the pool is sealed
+
+    #Adds a string to the pool without looking for a copy of it, and returns its index - for strings which are (nearly) always unique, like error names.
+    #None is stored as NO_STRING.
+    def Add(self, s : str) -> int:
+        if s == None:
+            return NO_STRING
+        self.data += s.encode("utf-8")
+        self.offsets.append(len(self.data))
+        return len(self.offsets) - 2
+
+    #Returns the index of a string in the pool, adding it if it isn't there yet. None is stored as NO_STRING.
+    def Intern(self, s : str) -> int:
+        if s == None:
+            return NO_STRING
+        idx = self.indices.get(s)
+        if idx == None:
+            idx = self.Add(s)
+            self.indices[s] = idx
+        return idx
+
+    def Get(self, idx : int) -> str:
+        if idx == NO_STRING:
+            return None
+        return self.data[self.offsets[idx]:self.offsets[idx + 1]].decode("utf-8")
+
+    #Frees the memory only needed to add strings to the pool
+    def Seal(self) -> None:
+        self.indices = None
+
+    def GetSize(self) -> int:
+        return len(self.data) + self.offsets.itemsize * len(self.offsets)
+
+#Errors of a facility, stored as parallel arrays : sorted error numbers, and indices of their name and description in a StringPool.
+#Behaves like a read-only Dict[int, Error] - Error objects are built when accessed.
+class CompactErrors(Mapping):
+    __slots__ = ["pool", "errorNums", "names", "descriptions"]
+
+    def __init__(self, pool : StringPool, errorNums : array, names : array, descriptions : array) -> None:
+        self.pool : StringPool = pool
+        self.errorNums : array = errorNums
+        self.names : array = names
+        self.descriptions : array = descriptions
+
+    #Builds a CompactErrors from (error number, Error) pairs - the strings are added to pool
+    @staticmethod
+    def FromItems(items, pool : StringPool):
+        errorNums, names, descriptions = array("H"), array("I"), array("I")
+        for errorNum, errorObj in sorted(items, key = lambda item: item[0]):
+            errorNums.append(errorNum)
+            names.append(pool.Add(errorObj.name))
+            descriptions.append(pool.Intern(errorObj.description))
+        return CompactErrors(pool, errorNums, names, descriptions)
+
+    #Returns the index of an error in the arrays, or -1 if it doesn't exist
+    def __find(self, errorNum : int) -> int:
+        idx = bisect_left(self.errorNums, errorNum)
+        if idx < len(self.errorNums) and self.errorNums[idx] == errorNum:
+            return idx
+        return -1
+
+    def __getError(self, idx : int) -> Error:
+        return Error(name = self.pool.Get(self.names[idx]), description = self.pool.Get(self.descriptions[idx]))
+
+    def get(self, errorNum : int, default = None) -> Error:
+        idx = self.__find(errorNum)
+        if idx == -1:
+            return default
+        return self.__getError(idx)
+
+    def __getitem__(self, errorNum : int) -> Error:
+        idx = self.__find(errorNum)
+        if idx == -1:
+            raise KeyError(errorNum)
+        return self.__getError(idx)
+
+    def __contains__(self, errorNum) -> bool:
+        return self.__find(errorNum) != -1
+
+    def __iter__(self):
+        return iter(self.errorNums)
+
+    def __len__(self) -> int:
+        return len(self.errorNums)
+
+    def items(self):
+        for idx in range(len(self.errorNums)):
+            yield (self.errorNums[idx], self.__getError(idx))
+
+    def __repr__(self) -> str:
+        return f"CompactErrors({dict(self.items())!r})"
+
 
 #Can this be a taiHEN error code ?
 #Code by Princess of Sleeping
@@ -105,13 +222,34 @@ def getFacilityDescription(db : Database, facilityNum : int) -> str:
     else:
         return None
 
+#Returns a sorted copy of a blacklist, where overlapping and adjacent ranges have been merged together - O(n log n)
+#Facility.blacklist is always kept in this form, which allows isErrorBlacklisted() to bisect it.
+def getNormalizedBlacklist(blacklist : List[BlacklistEntry]) -> List[BlacklistEntry]:
+    ret = list()
+    for blacklistRange in sorted(blacklist):
+        if len(ret) != 0 and blacklistRange.min <= ret[-1].max + 1:
+            if blacklistRange.max > ret[-1].max:
+                ret[-1] = BlacklistEntry(min = ret[-1].min, max = blacklistRange.max)
+        else:
+            ret.append(BlacklistEntry(min = blacklistRange.min, max = blacklistRange.max))
+    return ret
+
+#Returns the union of two blacklists, in normalized form
+def getMergedBlacklists(blacklistA : List[BlacklistEntry], blacklistB : List[BlacklistEntry]) -> List[BlacklistEntry]:
+    return getNormalizedBlacklist(blacklistA + blacklistB)
+
+#Returns true if the error number is in the (normalized) blacklist, false otherwise - O(log n)
+def isInBlacklist(blacklist : List[BlacklistEntry], errorNum : int) -> bool:
+    #Find the last range whose min is <= errorNum - since ranges are disjoint, it is the only one which can contain errorNum.
+    #The probe sorts after every range starting at errorNum, whatever its max (the parser accepts ranges going past ERROR_NUM_MASK).
+    idx = bisect_right(blacklist, BlacklistEntry(min = errorNum, max = float("inf"))) - 1
+    return idx >= 0 and errorNum <= blacklist[idx].max
+
 #Returns true if the error number is in the facility's blacklist, false otherwise.
 def isErrorBlacklisted(db: Database, facilityNum : int, errorNum : int) -> bool:
     facility = db.get(facilityNum)
     if (facility != None):
-        for blacklistRange in facility.blacklist:
-            if blacklistRange.min <= errorNum <= blacklistRange.max:
-                return True
+        return isInBlacklist(facility.blacklist, errorNum)
     return False
 
 #Returns the name of an error given the facility it belongs to and its number, or a placeholder string if either facility or error is unknown, or None if the error is blacklisted
@@ -212,6 +350,117 @@ def getDecoratedErrorCodeInfo(db : Database, error_code : int) -> str:
         ret += "Fatal : No"
     return ret
 
+#Classes of error codes, i.e. which branch of getDecoratedErrorCodeInfo() a code ends up in
+CODE_CLASS_TAIHEN = 0
+CODE_CLASS_SCEUID = 1
+CODE_CLASS_NOT_ERROR = 2
+CODE_CLASS_RESERVED = 3
+CODE_CLASS_BLACKLISTED = 4
+CODE_CLASS_POINTER = 5
+CODE_CLASS_UNKNOWN = 6 #Unknown facility, or unknown error of a known facility
+CODE_CLASS_RESOLVED = 7
+CODE_CLASS_NAMES = ("taihen", "sceuid", "not_error", "reserved", "blacklisted", "pointer", "unknown", "resolved")
+
+#Returns the class of an error code - the checks are made in the same order as getDecoratedErrorCodeInfo()
+def classifyErrorCode(db : Database, error_code : int) -> int:
+    if isTaiHENErrorCode(error_code):
+        return CODE_CLASS_TAIHEN
+    if not (error_code & IS_ERROR_MASK):
+        return CODE_CLASS_SCEUID if canBeSceUID(error_code) else CODE_CLASS_NOT_ERROR
+    if (error_code & RESERVED_MASK) != 0:
+        return CODE_CLASS_RESERVED
+    if isErrorCodeBlacklisted(db, error_code):
+        return CODE_CLASS_BLACKLISTED
+
+    facilityNum = (error_code & FACILITY_MASK) >> 16
+    if facilityNum > 0x100:
+        return CODE_CLASS_POINTER
+    facility = db.get(facilityNum)
+    if facility == None or facility.errors.get(error_code & ERROR_NUM_MASK) == None:
+        return CODE_CLASS_UNKNOWN
+    return CODE_CLASS_RESOLVED
+
+#Returns the body getDecoratedErrorCodeInfo() renders for a known error (everything but the "Fatal" line)
+def _getErrorBody(facilityObj : Facility, errorObj : Error) -> str:
+    if facilityObj.description != None:
+        body = f"Facility : {facilityObj.name} ({facilityObj.description})\n"
+    else:
+        body = f"Facility : {facilityObj.name}\n"
+
+    body += f"Error code : {errorObj.name}\n"
+    if errorObj.description != None:
+        body += f"Error description : {errorObj.description}\n"
+    return body
+
+#Read-only "compiled" view of a Database, meant to be built once when the database is loaded.
+#It maps the masked (facility << 16) | errorNum key of every known, non-blacklisted error straight to its pre-rendered body
+#(everything getDecoratedErrorCodeInfo() returns except the "Fatal" line), so resolving a known error code costs a single hash probe.
+#Anything not in the table (taiHEN, non-error, unknown or blacklisted codes...) falls back to getDecoratedErrorCodeInfo(), so the output is always identical.
+#In lazy mode, the table starts empty and bodies are added as errors get looked up : this is meant for databases which are
+#themselves loaded lazily (i.e. binaryDatabase.MappedDatabase), for which building the whole table would defeat the purpose.
+#If db was derived from the database of a previous CompiledDatabase (i.e. merged from it), the bodies of the facilities both
+#databases share are reused : only the facilities which changed are compiled again.
+class CompiledDatabase:
+    __slots__ = ["databaseObject", "table", "lazy"]
+
+    def __init__(self, db : Database, lazy : bool = False, previous = None) -> None:
+        self.databaseObject : Database = db
+        self.table : Dict[int, str] = dict()
+        self.lazy : bool = lazy
+        if db == None or lazy:
+            return
+
+        previousDb = previous.databaseObject if (previous != None and not previous.lazy) else None
+        if previousDb != None:
+            self.table = dict(previous.table)
+            for facilityNum, facilityObj in previousDb.items():
+                if db.get(facilityNum) is not facilityObj:
+                    for errorNum in facilityObj.errors.keys():
+                        self.table.pop((facilityNum << 16) | errorNum, None)
+
+        for facilityNum, facilityObj in db.items():
+            if facilityNum > 0x100: #Rejected as a pointer by getDecoratedErrorCodeInfo()
+                continue
+            if previousDb != None and previousDb.get(facilityNum) is facilityObj: #Already compiled
+                continue
+
+            for errorNum, errorObj in facilityObj.errors.items():
+                if isInBlacklist(facilityObj.blacklist, errorNum):
+                    continue
+                self.table[(facilityNum << 16) | errorNum] = _getErrorBody(facilityObj, errorObj)
+
+    #Returns the body of an error which isn't in the table yet, or None if it isn't a known, non-blacklisted error
+    def __getMissingBody(self, key : int) -> str:
+        facilityNum = key >> 16
+        facilityObj = self.databaseObject.get(facilityNum)
+        if facilityObj == None or facilityNum > 0x100:
+            return None
+
+        errorNum = key & ERROR_NUM_MASK
+        errorObj = facilityObj.errors.get(errorNum)
+        if errorObj == None or isInBlacklist(facilityObj.blacklist, errorNum):
+            return None
+
+        body = _getErrorBody(facilityObj, errorObj)
+        self.table[key] = body
+        return body
+
+    #Same as errorsDatabase.getDecoratedErrorCodeInfo(), using the compiled table whenever possible
+    def getDecoratedErrorCodeInfo(self, error_code : int) -> str:
+        #taiHEN error codes have reserved bits set, so they can never take the fast path
+        if (error_code & (IS_ERROR_MASK | RESERVED_MASK)) == IS_ERROR_MASK:
+            key = error_code & (FACILITY_MASK | ERROR_NUM_MASK)
+            body = self.table.get(key)
+            if body == None and self.lazy:
+                body = self.__getMissingBody(key)
+
+            if body != None:
+                if error_code & IS_FATAL_MASK:
+                    return body + "Fatal : Yes"
+                else:
+                    return body + "Fatal : No"
+        return getDecoratedErrorCodeInfo(self.databaseObject, error_code)
+
 #Print the content of a Database to stdout
 def dumpDatabase(db : Database) -> str:
     ret = f"Number of facilities : {len(db)}\n"
@@ -233,7 +482,10 @@ def dumpDatabase(db : Database) -> str:
 def getJSONReadyDictFromDatabase(db : Database) -> dict:
     tmpDb = {}
     for facilityNum, facilityObj in db.items():
-        facilityJSON = {NAME_KEY : facilityObj.name, ERRORS_KEY : {}}
+        facilityJSON = {NAME_KEY : facilityObj.name}
+        if facilityObj.description != None:
+            facilityJSON[DESCRIPTION_KEY] = facilityObj.description
+        facilityJSON[ERRORS_KEY] = {}
 
         if len(facilityObj.blacklist) != 0:
             blacklist = []
@@ -259,138 +511,440 @@ def getJSONStringFromDatabase(db : Database) -> str:
         print(f"Exception {e.__class__.__name__} raised while json.dumps()'ing.")
         return None
 
-#Parses a JSON database into a Database object. Returns None on failure.
-def getDatabaseFromJSONString(s : str) -> Database:
+#Builds a Facility from its decoded JSON object - may raise if the object is malformed
+#The strings of the facility are added to pool
+def _getFacilityFromJSONObject(facility_obj : dict, pool : StringPool) -> Facility:
+    #Build errors
+    errorEntries = list()
+    for error_code_str, error_obj in facility_obj[ERRORS_KEY].items():
+        errorCode = int(error_code_str, BASE_HEX) #convert str->int
+        errorDescription = error_obj.get(DESCRIPTION_KEY) #None if there is no desription
+        errorEntries.append((errorCode, pool.Add(error_obj[NAME_KEY]), pool.Intern(errorDescription)))
+    errorEntries.sort()
+    #Raises OverflowError if an error number doesn't fit in 16 bits
+    facilityErrors = CompactErrors(pool, array("H", [entry[0] for entry in errorEntries]),
+        array("I", [entry[1] for entry in errorEntries]), array("I", [entry[2] for entry in errorEntries]))
+
+    #Build blacklist
+    facilityBlacklist = list()
+    facility_obj_blacklist = facility_obj.get(BLACKLIST_KEY)
+    if facility_obj_blacklist != None:
+        for blacklistRange in facility_obj_blacklist:
+            blMin = int(blacklistRange[MIN_KEY], BASE_HEX)
+            blMax = int(blacklistRange[MAX_KEY], BASE_HEX)
+            facilityBlacklist.append(BlacklistEntry(min = blMin, max = blMax))
+    facilityBlacklist = getNormalizedBlacklist(facilityBlacklist)
+
+    facilityDescription = facility_obj.get(DESCRIPTION_KEY) #None if there is no description
+
+    #Build Facility object
+    return Facility(name = facility_obj[NAME_KEY], description = facilityDescription,
+        blacklist = facilityBlacklist, errors = facilityErrors)
+
+#Builds a Facility from the JSON text of a single facility object (i.e. a slice of a database file). Returns None on failure.
+def getFacilityFromJSONData(data : bytes) -> Facility:
+    pool = StringPool()
     try:
-        initDict = json.loads(s)
-    except json.JSONDecodeError:
-        print("Exception raised while decoding JSON object.")
+        facility = _getFacilityFromJSONObject(json.loads(data), pool)
+    except Exception as e:
+        print(f"Exception {e.__class__.__name__} raised while decoding facility.")
         return None
-    
-    db = dict()
+    pool.Seal()
+    return facility
+
+#Incremental JSON database parser : the document is fed in chunks (i.e. as they are read from a file or received over HTTP),
+#and every facility is turned into a Facility as soon as it has been received entirely.
+#Only the decoded JSON object of a single facility exists at any time, instead of the parse tree of the whole document.
+#feed() returns False once the document is known to be invalid ; close() returns the Database, or None on failure.
+class DatabaseStreamParser:
+    __slots__ = ["decoder", "buffer", "pos", "pendingChunks", "pendingLength", "state", "facilityCodeStr", "db", "pool", "failed", "nextAttemptLength"]
+
+    STATE_START = 0         #Expecting the opening brace of the document
+    STATE_FIRST_KEY = 1     #Expecting a facility code or the closing brace (empty document)
+    STATE_KEY = 2           #Expecting a facility code
+    STATE_COLON = 3
+    STATE_VALUE = 4         #Expecting a facility object
+    STATE_NEXT = 5          #Expecting a comma or the closing brace
+    STATE_END = 6           #Only whitespace may follow
+
+    def __init__(self) -> None:
+        self.decoder : json.JSONDecoder = json.JSONDecoder()
+        self.buffer : str = ""
+        self.pos : int = 0
+        #Chunks received since the last decoding attempt - they are only appended to the buffer when a token is retried,
+        #so that the pending part of a token isn't copied again on every feed.
+        self.pendingChunks : list = list()
+        self.pendingLength : int = 0
+        self.state : int = DatabaseStreamParser.STATE_START
+        self.facilityCodeStr : str = None
+        self.db : dict = dict()
+        self.pool : StringPool = StringPool() #Shared by all facilities of the database
+        self.failed : bool = False
+        #A token which couldn't be decoded yet is only retried once the buffer has doubled in length,
+        #so that a facility spanning many chunks is decoded in linear time instead of once per chunk.
+        self.nextAttemptLength : int = 0
+
+    def __fail(self, reason : str) -> bool:
+        print(f"Exception raised while decoding JSON object ({reason}).")
+        self.failed = True
+        self.buffer = ""
+        self.pendingChunks.clear()
+        self.db = None
+        return False
 
-    try:
-        for facility_code_str, facility_obj in initDict.items():
-            #Build errors
-            facilityErrors = dict()
-            for error_code_str, error_obj in facility_obj[ERRORS_KEY].items():
-               errorCode = int(error_code_str, BASE_HEX) #convert str->int
-               errorDescription = error_obj.get(DESCRIPTION_KEY) #None if there is no desription
-               facilityErrors[errorCode] = Error(name = error_obj[NAME_KEY], description = errorDescription)
-
-            #Build blacklist
-            facilityBlacklist = list()
-            facility_obj_blacklist = facility_obj.get(BLACKLIST_KEY)
-            if facility_obj_blacklist != None:
-                for blacklistRange in facility_obj_blacklist:
-                    blMin = int(blacklistRange[MIN_KEY], BASE_HEX)
-                    blMax = int(blacklistRange[MAX_KEY], BASE_HEX)
-                    facilityBlacklist.append(BlacklistEntry(min = blMin, max = blMax))
-
-            facilityDescription = facility_obj.get(DESCRIPTION_KEY) #None if there is no description
-            facilityCode = int(facility_code_str, BASE_HEX) #convert str->int
-
-            #Build Facility object
-            db[facilityCode] = Facility(name = facility_obj[NAME_KEY], description = facilityDescription, 
-                blacklist = facilityBlacklist, errors = facilityErrors)
-        
-        ret = Database(db)
+    #Appends the pending chunks to the buffer, dropping what has already been consumed
+    def __joinPendingChunks(self) -> None:
+        if len(self.pendingChunks) == 0:
+            return
+        self.buffer = "".join([self.buffer[self.pos:]] + self.pendingChunks)
+        self.pos = 0
+        self.pendingChunks.clear()
+        self.pendingLength = 0
+
+    #Returns the position of the first non-whitespace character, or None if the buffer ends before one
+    def __skipWhitespace(self) -> int:
+        pos = json.decoder.WHITESPACE.match(self.buffer, self.pos).end()
+        return pos if pos < len(self.buffer) else None
+
+    #Consumes as much of the buffer as possible. finalChunk is True if no more data will be fed.
+    def __parse(self, finalChunk : bool) -> bool:
+        self.__joinPendingChunks()
+        self.nextAttemptLength = 0
+
+        while True:
+            pos = self.__skipWhitespace()
+            if pos == None:
+                self.pos = len(self.buffer)
+                return True
+            char = self.buffer[pos]
+
+            if self.state == DatabaseStreamParser.STATE_START:
+                if char != '{':
+                    return self.__fail("database is not a JSON object")
+                self.pos = pos + 1
+                self.state = DatabaseStreamParser.STATE_FIRST_KEY
+
+            elif self.state == DatabaseStreamParser.STATE_FIRST_KEY and char == '}':
+                self.pos = pos + 1
+                self.state = DatabaseStreamParser.STATE_END
+
+            elif self.state in (DatabaseStreamParser.STATE_FIRST_KEY, DatabaseStreamParser.STATE_KEY):
+                if char != '"':
+                    return self.__fail(f"expected facility code at character {pos}")
+                try:
+                    self.facilityCodeStr, self.pos = json.decoder.scanstring(self.buffer, pos + 1)
+                except json.JSONDecodeError:
+                    if finalChunk:
+                        return self.__fail("unterminated facility code")
+                    break #Incomplete - wait for more data
+                self.state = DatabaseStreamParser.STATE_COLON
+
+            elif self.state == DatabaseStreamParser.STATE_COLON:
+                if char != ':':
+                    return self.__fail(f"expected ':' at character {pos}")
+                self.pos = pos + 1
+                self.state = DatabaseStreamParser.STATE_VALUE
+
+            elif self.state == DatabaseStreamParser.STATE_VALUE:
+                try:
+                    facility_obj, self.pos = self.decoder.raw_decode(self.buffer, pos)
+                except json.JSONDecodeError:
+                    if finalChunk:
+                        return self.__fail("truncated or malformed facility")
+                    self.pos = pos
+                    break #Incomplete - wait for more data
+
+                try:
+                    facility = _getFacilityFromJSONObject(facility_obj, self.pool)
+                    facilityCode = int(self.facilityCodeStr, BASE_HEX) #convert str->int
+                except Exception as e:
+                    return self.__fail(f"{e.__class__.__name__} caught while building Database object")
+                self.db[facilityCode] = facility
+                self.state = DatabaseStreamParser.STATE_NEXT
+
+            elif self.state == DatabaseStreamParser.STATE_NEXT:
+                if char == ',':
+                    self.state = DatabaseStreamParser.STATE_KEY
+                elif char == '}':
+                    self.state = DatabaseStreamParser.STATE_END
+                else:
+                    return self.__fail(f"expected ',' or '}}' at character {pos}")
+                self.pos = pos + 1
+
+            else: #STATE_END
+                return self.__fail(f"extra data at character {pos}")
+
+        self.nextAttemptLength = 2 * (len(self.buffer) - self.pos)
+        return True
 
-    except Exception as e:
-        print(f"OUCH !\nException {e.__class__.__name__} caught while building Database object.")
-        exit(0)
-        ret = None
+    #Feeds the next chunk of the document. Returns False if the document is invalid, True otherwise.
+    def feed(self, chunk : str) -> bool:
+        if self.failed:
+            return False
+        self.pendingChunks.append(chunk)
+        self.pendingLength += len(chunk)
+        if len(self.buffer) - self.pos + self.pendingLength < self.nextAttemptLength:
+            return True
+        return self.__parse(False)
+
+    #Signals the end of the document. Returns the Database on success, None otherwise.
+    def close(self) -> Database:
+        if self.failed or not self.__parse(True):
+            return None
+        if self.state != DatabaseStreamParser.STATE_END:
+            self.__fail("truncated database")
+            return None
+        self.buffer = ""
+        self.pool.Seal()
+        return Database(self.db)
 
-    finally:
-        del initDict
-        gc.collect() #Free initDict (and ret if it was discarded)
-        return ret
+#Parses a JSON database into a Database object. Returns None on failure.
+def getDatabaseFromJSONString(s : str) -> Database:
+    parser = DatabaseStreamParser()
+    parser.feed(s)
+    return parser.close()
+
+#Returns an Error combining the fields of both errors - destError itself is returned if this doesn't change anything.
+def getMergedErrors(destError : Error, appendedError : Error, overwrite : bool = False) -> Error:
+    name = appendedError.name if overwrite else destError.name
+
+    description = destError.description
+    if (description == None or overwrite) and appendedError.description != None:
+        description = appendedError.description
+
+    if name == destError.name and description == destError.description:
+        return destError
+    return Error(name = name, description = description)
+
+#Returns a Facility combining the fields of both facilities - destFacility itself is returned if this doesn't change anything.
+#If errors are added or modified, the strings of the new errors are added to pool (a new pool is used if None).
+def getMergedFacilities(destFacility : Facility, appendedFacility : Facility, overwrite : bool = False, pool : StringPool = None) -> Facility:
+    #Merge names
+    name = appendedFacility.name if overwrite else destFacility.name
+
+    #Merge descriptions
+    description = destFacility.description
+    if (description == None or overwrite) and appendedFacility.description != None:
+        description = appendedFacility.description
+
+    #Merge blacklists
+    if not overwrite: #Overwrite-less, we take the union of both blacklists
+        blacklist = getMergedBlacklists(destFacility.blacklist, appendedFacility.blacklist)
+    else: #Overwrite old blacklist - technically not a merge, but it *should* be fine
+        blacklist = getNormalizedBlacklist(appendedFacility.blacklist)
+
+    #Merge errors - the errors are only copied if an error is added or modified
+    errors = destFacility.errors
+    for appendedErrorNum, appendedErrorObj in appendedFacility.errors.items():
+        destErrorObj = destFacility.errors.get(appendedErrorNum)
+        if destErrorObj == None: #Error doesn't exist
+            mergedErrorObj = appendedErrorObj
+        else:
+            mergedErrorObj = getMergedErrors(destErrorObj, appendedErrorObj, overwrite)
+            if mergedErrorObj is destErrorObj:
+                continue
+
+        if errors is destFacility.errors:
+            errors = dict(destFacility.errors)
+        errors[appendedErrorNum] = mergedErrorObj
+
+    if errors is not destFacility.errors:
+        errors = CompactErrors.FromItems(errors.items(), pool if pool != None else StringPool())
+
+    if name == destFacility.name and description == destFacility.description and blacklist == destFacility.blacklist and errors is destFacility.errors:
+        return destFacility
+    return Facility(name = name, description = description, blacklist = blacklist, errors = errors)
 
 #Returns merged database on success, None otherwise. Set overwrite to True if fields from appendedDb should overwrite those already present in dstDb.
+#destDb is left untouched : the returned Database shares every Facility the merge doesn't modify with it.
 def getMergedDatabases(destDb : Database, appendedDb : Database, overwrite : bool = False) -> Database:
     if appendedDb == None or destDb == None:
         return None
     else:
+        ret = dict(destDb)
+        pool = StringPool() #Holds the strings of the facilities modified by the merge
         for curFacilityNum, appendedDbFacility in appendedDb.items():
-            if destDb.get(curFacilityNum) != None: #Facility exists in DB we append to - merge fields
-                #Merge names
-                if overwrite:
-                    destDb[curFacilityNum].name = appendedDbFacility.name
-
-                #Merge descriptions
-                if (destDb[curFacilityNum].description == None or overwrite) and appendedDbFacility.description != None:
-                    destDb[curFacilityNum].description = appendedDbFacility.description
-
-                #Merge blacklists
-                if not overwrite: #Overwrite-less, we make existing ranges bigger
-                    for appendedBlacklistRange in appendedDbFacility.blacklist: #Yes, this is probably O(n^2). Deal with it.
-                        i = 0
-                        for dstBlacklistRange in destDb[curFacilityNum].blacklist:
-                            if (appendedBlacklistRange.min < dstBlacklistRange.min) and (appendedBlacklistRange.max > dstBlacklistRange.max):
-                                destDb[curFacilityNum].blacklist[i].min = appendedBlacklistRange.min
-                                destDb[curFacilityNum].blacklist[i].max = appendedBlacklistRange.max
-                else: #Overwrite old blacklist - technically not a merge, but it *should* be fine
-                    destDb[curFacilityNum].blacklist = appendedDbFacility.blacklist
-
-                #Merge errors
-                for appendedErrorNum, appendedErrorObj in appendedDbFacility.errors.items():
-                    if destDb[curFacilityNum].errors.get(appendedErrorNum) == None: #Error doesn't exist
-                        destDb[curFacilityNum].errors[appendedErrorNum] = appendedErrorObj
-                        continue
-
-                    elif overwrite: #Else, if we overwrite, then copy name field
-                        destDb[curFacilityNum].errors[appendedErrorNum].name = appendedErrorObj.name
-
-                    #Then copy description, if it exists and we need to
-                    if (destDb[curFacilityNum].errors[appendedErrorNum].description == None or overwrite) and appendedErrorObj.description != None: 
-                        destDb[curFacilityNum].errors[appendedErrorNum].description = appendedErrorObj.description
-
+            destDbFacility = destDb.get(curFacilityNum)
+            if destDbFacility != None: #Facility exists in DB we append to - merge fields
+                ret[curFacilityNum] = getMergedFacilities(destDbFacility, appendedDbFacility, overwrite, pool)
             else: #Facility doesn't exist, just add it
-                destDb[curFacilityNum] = appendedDbFacility
+                ret[curFacilityNum] = appendedDbFacility
+
+        pool.Seal()
+        return Database(ret)
+
+#A field the sources of a multi-source merge disagree on
+@dataclass(frozen=True)
+class MergeConflict:
+    __slots__ = ["facilityNum", "errorNum", "field", "values"]
+    facilityNum : int
+    errorNum : int  #None for a field of the facility itself
+    field : str     #NAME_KEY, DESCRIPTION_KEY or BLACKLIST_KEY
+    values : tuple  #(source index, value) of every source which has the field, in order of precedence - the first value was kept
+
+#Returns the value of a field from the source with the highest precedence which has it, and records a conflict if the sources disagree
+#values are (source index, value) pairs, in order of precedence - None values are skipped
+def _getMergedField(facilityNum : int, errorNum : int, field : str, values : list, conflicts : list):
+    values = [(sourceIdx, value) for sourceIdx, value in values if value != None]
+    if len(values) == 0:
+        return None
+    if any(value != values[0][1] for _, value in values):
+        conflicts.append(MergeConflict(facilityNum = facilityNum, errorNum = errorNum, field = field, values = tuple(values)))
+    return values[0][1]
+
+#Returns the merge of the (source index, Facility) of every source which has a facility, in order of precedence.
+#The errors are merged in one pass over all the sources : they are k-way merged by error number, the sources being sorted by error number already.
+def _getMultiMergedFacility(facilityNum : int, facilities : list, overwrite : bool, pool : StringPool, conflicts : list) -> Facility:
+    if len(facilities) == 1:
+        return facilities[0][1]
+
+    name = _getMergedField(facilityNum, None, NAME_KEY, [(sourceIdx, facilityObj.name) for sourceIdx, facilityObj in facilities], conflicts)
+    description = _getMergedField(facilityNum, None, DESCRIPTION_KEY, [(sourceIdx, facilityObj.description) for sourceIdx, facilityObj in facilities], conflicts)
+    if not overwrite: #Union of all blacklists
+        blacklist = getNormalizedBlacklist([entry for _, facilityObj in facilities for entry in facilityObj.blacklist])
+    else: #Blacklist of the source with the highest precedence
+        blacklist = _getMergedField(facilityNum, None, BLACKLIST_KEY,
+            [(sourceIdx, getNormalizedBlacklist(facilityObj.blacklist)) for sourceIdx, facilityObj in facilities], conflicts)
+
+    #Entries are (error number, rank of the source, Error) : the errors of a number come out together, in order of precedence
+    streams = [[(errorNum, rank, errorObj) for errorNum, errorObj in sorted(facilityObj.errors.items(), key = lambda item: item[0])]
+        for rank, (_, facilityObj) in enumerate(facilities)]
+    errors = list()
+    modified = all(sourceIdx != 0 for sourceIdx, _ in facilities) #Source 0 is the destination database
+    for errorNum, group in groupby(heapq.merge(*streams, key = lambda entry: entry[:2]), key = lambda entry: entry[0]):
+        sources = [(facilities[rank][0], errorObj) for _, rank, errorObj in group]
+        if len(sources) == 1: #Most errors are only known to one source : nothing to merge
+            modified = modified or sources[0][0] != 0
+            errors.append((errorNum, sources[0][1]))
+            continue
+        errorName = _getMergedField(facilityNum, errorNum, NAME_KEY, [(sourceIdx, errorObj.name) for sourceIdx, errorObj in sources], conflicts)
+        errorDescription = _getMergedField(facilityNum, errorNum, DESCRIPTION_KEY, [(sourceIdx, errorObj.description) for sourceIdx, errorObj in sources], conflicts)
+        mergedErrorObj = Error(name = errorName, description = errorDescription)
+        destErrorObj = next((errorObj for sourceIdx, errorObj in sources if sourceIdx == 0), None)
+        modified = modified or destErrorObj != mergedErrorObj
+        errors.append((errorNum, mergedErrorObj))
+
+    if not modified:
+        destFacility = next(facilityObj for sourceIdx, facilityObj in facilities if sourceIdx == 0)
+        if name == destFacility.name and description == destFacility.description and blacklist == destFacility.blacklist:
+            return destFacility
+    return Facility(name = name, description = description, blacklist = blacklist, errors = CompactErrors.FromItems(errors, pool))
+
+#Database made of the facilities of a base database, some of which are replaced (or added) by those of facilities.
+#Merges into databases which are loaded lazily (i.e. lazyDatabase.LazyDatabase) return one, so that the facilities they don't modify are never decoded.
+#Behaves like a regular (read-only) Database.
+class OverlayDatabase(Mapping):
+    __slots__ = ["base", "facilities"]
+
+    def __init__(self, base : Database, facilities : Dict[int, Facility]) -> None:
+        #Overlays are flattened, so that lookups never go through more than one of them
+        if isinstance(base, OverlayDatabase):
+            facilities = {**base.facilities, **facilities}
+            base = base.base
+        self.base : Database = base
+        self.facilities : Dict[int, Facility] = facilities
+
+    #Only the errors of the replaced facilities of the base are counted again
+    def getErrorsCount(self) -> int:
+        count = self.base.getErrorsCount() if hasattr(self.base, "getErrorsCount") else sum(len(facilityObj.errors) for facilityObj in self.base.values())
+        for facilityNum, facilityObj in self.facilities.items():
+            baseFacility = self.base.get(facilityNum)
+            count += len(facilityObj.errors) - (len(baseFacility.errors) if baseFacility != None else 0)
+        return count
+
+    def get(self, facilityNum : int, default = None) -> Facility:
+        facility = self.facilities.get(facilityNum)
+        if facility != None:
+            return facility
+        return self.base.get(facilityNum, default)
+
+    def __getitem__(self, facilityNum : int) -> Facility:
+        facility = self.get(facilityNum)
+        if facility == None:
+            raise KeyError(facilityNum)
+        return facility
+
+    def __contains__(self, facilityNum) -> bool:
+        return facilityNum in self.facilities or facilityNum in self.base
+
+    def __iter__(self):
+        return iter(list(self.base.keys()) + [facilityNum for facilityNum in self.facilities.keys() if facilityNum not in self.base])
+
+    def __len__(self) -> int:
+        return len(self.base) + sum(1 for facilityNum in self.facilities.keys() if facilityNum not in self.base)
+
+#Merges several databases into destDb at once. Returns (merged Database, list of MergeConflict) on success, None otherwise.
+#Sources are numbered by their index in [destDb] + appendedDbs. Every field is taken from the source with the highest precedence which has it :
+# - without overwrite, destDb comes first, then appendedDbs in order - like merging them one after the other with getMergedDatabases()
+# - with overwrite, appendedDbs come first in order, then destDb - like merging them one after the other in reverse order
+#Blacklists are the union of the blacklists of all sources - with overwrite, the blacklist of the source with the highest precedence is kept instead.
+#The facilities of appendedDbs are k-way merged by facility number, so every facility and error of the sources is visited once whatever their number :
+#the cost follows the total size of appendedDbs (and of the facilities of destDb they touch), not the number of sources times the size of destDb.
+#destDb is left untouched : the returned Database shares every Facility the merge doesn't modify with it, and those only one source holds with that source.
+#Only destDb's facilities the appended databases have are looked up : if destDb isn't a dict (i.e. it is loaded lazily), an OverlayDatabase of it is returned.
+def getMultiMergedDatabases(destDb : Database, appendedDbs : list, overwrite : bool = False) -> tuple:
+    if destDb == None or any(appendedDb == None for appendedDb in appendedDbs):
+        return None
 
-        return destDb
+    sources = [destDb] + list(appendedDbs)
+    precedence = (list(range(1, len(sources))) + [0]) if overwrite else list(range(len(sources)))
+    ranks = {sourceIdx : rank for rank, sourceIdx in enumerate(precedence)}
+
+    ret = dict()
+    conflicts = list()
+    pool = StringPool() #Holds the strings of the facilities modified by the merge
+    #Entries are (facility number, rank of the source, source index) : the facilities of a number come out together, in order of precedence
+    streams = [[(facilityNum, ranks[sourceIdx], sourceIdx) for facilityNum in sorted(appendedDb.keys())] for sourceIdx, appendedDb in enumerate(sources) if sourceIdx != 0]
+    for facilityNum, group in groupby(heapq.merge(*streams), key = lambda entry: entry[0]):
+        facilities = [(sourceIdx, sources[sourceIdx][facilityNum]) for _, _, sourceIdx in group]
+        destFacility = destDb.get(facilityNum)
+        if destFacility != None:
+            facilities.append((0, destFacility))
+            facilities.sort(key = lambda entry: ranks[entry[0]])
+        facilityObj = _getMultiMergedFacility(facilityNum, facilities, overwrite, pool, conflicts)
+        if facilityObj is not destFacility:
+            ret[facilityNum] = facilityObj
+
+    pool.Seal()
+    if isinstance(destDb, dict):
+        return (Database({**destDb, **ret}), conflicts)
+    return (OverlayDatabase(destDb, ret), conflicts)
 
 #Returns merged Database on success, None otherwise. Set overwrite to True if fields from appendedDb should overwrite those already present in dstDb.
 def getMergedDbAndJSONString(dstDb : Database, appendedDbJSON : str, overwrite : bool = False) -> Database:
     appendedDb = getDatabaseFromJSONString(appendedDbJSON)
-    ret = getMergedDatabases(dstDb, appendedDb, overwrite)
-    
-    del appendedDb
-    gc.collect() #Ensure that temporary database is free'd from memory, since we don't need it anymore
-
-    return ret
+    if appendedDb == None:
+        return None
+    return getMergedDatabases(dstDb, appendedDb, overwrite)
     
 #Returns merged Database on success, None otherwise. Set overwrite to True if fields from the appended Database should overwrite those already present in dstDb.
 def getMergedDbAndJSONFile(dstDb : Database, appendedDbFilePath : str, overwrite : bool = False) -> Database:
-    try:
-        fh = open(appendedDbFilePath, "r")
-    except IOError:
-        print(f"Failed to open {appendedDbFilePath} for reading.")
+    appendedDb = getDatabaseFromJSONFile(appendedDbFilePath)
+    if appendedDb == None:
         return None
+    return getMergedDatabases(dstDb, appendedDb, overwrite)
 
-    appendDbData = fh.read()
-    fh.close()
-    ret = getMergedDbAndJSONString(dstDb, appendDbData, overwrite)
+#Size of the chunks JSON files are read and parsed in
+FILE_CHUNK_SIZE = 1 << 20
 
-    del appendDbData
-    gc.collect() #Ensure that file contents are free'd from memory, since we don't need them anymore
-
-    return ret
-
-#Returns a Database object and the SHA-1 sum of the database file on success, None otherwise.
+#Returns a Database object on success, None otherwise.
+#The file is parsed as it is read, so neither its whole content nor its whole parse tree are ever held in memory.
 def getDatabaseFromJSONFile(dbFilePath : str) -> Database:
     try:
-        fh = open(dbFilePath, "r")
+        fh = open(dbFilePath, "r", encoding="utf-8")
     except IOError:
         print(f"Failed to open '{dbFilePath}' for reading.")
         return None
 
-    dbData = fh.read()
-    fh.close()
-    dbObj = getDatabaseFromJSONString(dbData)
-
-    del dbData
-    gc.collect() #Ensure that file contents are free'd from memory, since we don't need them anymore
+    parser = DatabaseStreamParser()
+    try:
+        with fh:
+            while True:
+                chunk = fh.read(FILE_CHUNK_SIZE)
+                if not chunk or not parser.feed(chunk):
+                    break
+    except (IOError, UnicodeDecodeError):
+        print(f"Failed to read '{dbFilePath}' as UTF-8 text.")
+        return None
 
-    return dbObj
-    
\ No newline at end of file
+    return parser.close()
@@ -0,0 +1,101 @@
+import time
+import asyncio
+import aiohttp
+from dataclasses import dataclass
+
+#Raised when a request couldn't be completed (network error, timeout...)
+class HTTPError(Exception):
+    pass
+
+@dataclass
+class HTTPResponse:
+    status : int        #HTTP status code - 304 if a conditional request found the resource unchanged
+    content : bytes     #Body of the response - empty for 304 responses
+    etag : str          #ETag header of the response, None if the server didn't send one
+
+#Asynchronous HTTP client, to be used from the bot's event loop.
+#All requests share a single session, so that connections to the remote are pooled and kept alive between requests.
+class HTTPBackend:
+    __slots__ = ["session", "timeout", "maxConnections", "requestsCount", "notModifiedCount", "bytesReceived", "requestDuration"]
+
+    def __init__(self, timeout : float = 30.0, maxConnections : int = 4) -> None:
+        self.session : aiohttp.ClientSession = None #Created on first use, because it has to be created from a coroutine
+        self.timeout : float = timeout
+        self.maxConnections : int = maxConnections
+        self.requestsCount : int = 0
+        self.notModifiedCount : int = 0
+        self.bytesReceived : int = 0
+        self.requestDuration = None #metrics.Histogram the duration of requests is recorded in, by status - None when metrics are disabled
+
+    def __observeRequest(self, start : float, status : str) -> None:
+        if self.requestDuration != None:
+            self.requestDuration.observe((status,), time.perf_counter() - start)
+
+    def __getSession(self) -> aiohttp.ClientSession:
+        if self.session == None or self.session.closed:
+            self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout),
+                connector=aiohttp.TCPConnector(limit=self.maxConnections))
+        return self.session
+
+    #Performs a GET request. If an ETag is provided, an If-None-Match header is sent, and the server may answer 304 without a body.
+    #May raise ValueError if the URL is invalid, or HTTPError if the request failed : print exception.args[0] in such cases
+    async def get(self, url : str, headers : dict = None, etag : str = None) -> HTTPResponse:
+        requestHeaders = dict(headers) if headers != None else dict()
+        if etag != None:
+            requestHeaders["If-None-Match"] = etag
+
+        start = time.perf_counter()
+        try:
+            async with self.__getSession().get(url, headers=requestHeaders) as resp:
+                content = await resp.read()
+                ret = HTTPResponse(resp.status, content, resp.headers.get("ETag"))
+        except aiohttp.InvalidURL:
+            raise ValueError(f"Invalid URL `{url}`.")
+        except asyncio.TimeoutError:
+            self.__observeRequest(start, "timeout")
+            raise HTTPError(f"Request to `{url}` timed out.")
+        except aiohttp.ClientError as e:
+            self.__observeRequest(start, "error")
+            raise HTTPError(f"Request to `{url}` failed ({e.__class__.__name__}).")
+
+        self.__observeRequest(start, str(ret.status))
+        self.requestsCount += 1
+        self.bytesReceived += len(content)
+        if ret.status == 304:
+            self.notModifiedCount += 1
+        return ret
+
+    #Performs a GET request, passing the body to consumer chunk by chunk as it is received instead of buffering it whole.
+    #consumer is a coroutine function taking a chunk (bytes) - it is only called for 200 responses, and the transfer is aborted if it returns False.
+    #Returns the HTTP status code. May raise ValueError or HTTPError, like get()
+    async def getStreamed(self, url : str, consumer, headers : dict = None, chunkSize : int = 1 << 16) -> int:
+        start = time.perf_counter()
+        try:
+            async with self.__getSession().get(url, headers=headers) as resp:
+                self.requestsCount += 1
+                if resp.status == 200:
+                    async for chunk in resp.content.iter_chunked(chunkSize):
+                        self.bytesReceived += len(chunk)
+                        if not await consumer(chunk):
+                            break
+                self.__observeRequest(start, str(resp.status)) #Includes the time spent in consumer
+                return resp.status
+        except aiohttp.InvalidURL:
+            raise ValueError(f"Invalid URL `{url}`.")
+        except asyncio.TimeoutError:
+            self.__observeRequest(start, "timeout")
+            raise HTTPError(f"Request to `{url}` timed out.")
+        except aiohttp.ClientError as e:
+            self.__observeRequest(start, "error")
+            raise HTTPError(f"Request to `{url}` failed ({e.__class__.__name__}).")
+
+    async def close(self) -> None:
+        if self.session != None:
+            await self.session.close()
+            self.session = None
+
+    def getStatsAsString(self) -> str:
+        ret = f"Requests : {self.requestsCount}\n"
+        ret += f"Not modified (304) : {self.notModifiedCount}\n"
+        ret += f"Bytes received : {self.bytesReceived}"
+        return ret
@@ -0,0 +1,227 @@
+import os
+import re
+import json
+import mmap
+import threading
+from hashlib import sha1
+from dataclasses import dataclass
+from collections.abc import Mapping
+
+import errorsDatabase
+from errorsDatabase import Facility
+from lruCache import LRUCache
+from merkleTree import getFacilityHash
+
+#Lazily loaded errors database : a facility is only decoded from the JSON file the first time it is looked up, and at most
+#maxResidentFacilities facilities are kept decoded - the least recently used one is dropped when another one must be decoded.
+#Most lookups hit a handful of facilities, so memory use follows the hot set instead of the size of the database.
+#
+#Facilities are located through an offset index (facility -> byte range of its object in the JSON file), stored in a file of its own.
+#Building it scans the JSON file once ; afterwards, loading the database only reads the index, which holds the hashes of the file
+#and of every facility (see merkleTree.py) too.
+#Like snapshots, an index is tied to the size and modification time of the JSON file it was built from.
+#The JSON file is memory-mapped, so it is never read as a whole, and replacing it (os.rename()/os.replace()) leaves the mapping valid.
+#
+#A facility which was evicted is a new Facility object once decoded again : code which shares or compares facilities by identity
+#(i.e. merges, or indexes built from previous ones) just sees it as modified.
+
+INDEX_VERSION = 3 #Bumped whenever the facility hashes change encoding (see merkleTree.py), so that stale indexes are built again
+
+#Decoded facilities of a lazily loaded database. Lookups run on the event loop, but indexes are built from worker threads, hence the lock.
+class ResidentFacilities:
+    __slots__ = ["cache", "lock"]
+
+    def __init__(self, maxSize : int) -> None:
+        self.cache : LRUCache = LRUCache(maxSize)
+        self.lock : threading.Lock = threading.Lock()
+
+    #Returns the facility if it is resident. Otherwise, returns build(facilityNum) and keeps it resident if it isn't None.
+    def get(self, facilityNum : int, build) -> Facility:
+        with self.lock:
+            facility = self.cache.Get(facilityNum)
+            if facility == None:
+                facility = build(facilityNum)
+                if facility != None:
+                    self.cache.Put(facilityNum, facility)
+            return facility
+
+    def getStatsAsString(self) -> str:
+        return self.cache.GetStatsAsString()
+
+@dataclass(frozen=True)
+class OffsetIndex:
+    sourceInfo : tuple  #(size, modification time in ns, SHA-1, Git blob SHA-1) of the JSON file - hashes are hex strings
+    facilities : dict   #Maps a facility number to the (start, end, number of errors, hash) of its object in the JSON file - hashes are hex strings
+
+#Strings (escapes included) and brackets : enough to know where every facility object starts and ends, without decoding anything
+_TOKEN_REGEX = re.compile(rb'"(?:[^"\\]|\\.)*"|[\[\]{}]', re.DOTALL)
+
+#Returns {facility number : (start, end)}, where data[start:end] is the JSON object of every facility, or None if data isn't a database.
+#Only the structure of the document is checked : facility objects themselves are checked by decoding them.
+def getFacilityOffsets(data) -> dict:
+    offsets = dict()
+    depth = 0
+    ended = False
+    facilityCodeStr = None
+    start = 0
+    try:
+        for match in _TOKEN_REGEX.finditer(data):
+            char = data[match.start()]
+            if ended:
+                return None
+            if char == ord('"'):
+                if depth == 1:
+                    if facilityCodeStr != None: #Facilities are objects
+                        return None
+                    facilityCodeStr = json.loads(match.group())
+            elif char in (ord('{'), ord('[')):
+                if depth == 0 and char != ord('{'):
+                    return None
+                if depth == 1:
+                    if char != ord('{') or facilityCodeStr == None:
+                        return None
+                    start = match.start()
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 1:
+                    offsets[int(facilityCodeStr, errorsDatabase.BASE_HEX)] = (start, match.end())
+                    facilityCodeStr = None
+                elif depth == 0:
+                    ended = True
+    except ValueError: #Invalid facility code - UnicodeDecodeError and JSONDecodeError are ValueErrors too
+        return None
+    return offsets if ended else None
+
+#Builds the offset index of the JSON database at jsonPath. Facilities are all decoded once to check and hash them, but one at a time.
+#Returns None if the file couldn't be read or isn't a valid database.
+def buildOffsetIndex(jsonPath : str) -> OffsetIndex:
+    try:
+        with open(jsonPath, "rb") as fh:
+            st = os.fstat(fh.fileno())
+            if st.st_size == 0:
+                print(f"'{jsonPath}' is empty.")
+                return None
+            fileMapping = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+    except OSError:
+        print(f"Failed to open '{jsonPath}' for reading.")
+        return None
+
+    with fileMapping:
+        offsets = getFacilityOffsets(fileMapping)
+        if offsets == None:
+            print(f"'{jsonPath}' isn't a valid errors database.")
+            return None
+        facilities = dict()
+        for facilityNum, (start, end) in offsets.items():
+            facility = errorsDatabase.getFacilityFromJSONData(fileMapping[start:end])
+            if facility == None:
+                return None
+            facilities[facilityNum] = (start, end, len(facility.errors), getFacilityHash(facilityNum, facility).hex())
+
+        gitBlobCtx = sha1(b"blob %d\0" % len(fileMapping))
+        gitBlobCtx.update(fileMapping)
+        return OffsetIndex((st.st_size, st.st_mtime_ns, sha1(fileMapping).hexdigest().lower(), gitBlobCtx.hexdigest().lower()), facilities)
+
+def getIndexData(index : OffsetIndex) -> bytes:
+    size, mtimeNs, sha1Hex, gitBlobShaHex = index.sourceInfo
+    facilities = {"0x%03X" % facilityNum : list(entry) for facilityNum, entry in sorted(index.facilities.items())}
+    return json.dumps({"version" : INDEX_VERSION, "size" : size, "mtime_ns" : mtimeNs, "sha1" : sha1Hex, "git_blob_sha" : gitBlobShaHex,
+        "facilities" : facilities}).encode("utf-8")
+
+#Returns the OffsetIndex of an index file, or None if it is invalid
+def getIndexFromData(data : bytes) -> OffsetIndex:
+    try:
+        indexJSON = json.loads(data)
+        if indexJSON["version"] != INDEX_VERSION:
+            return None
+        facilities = {int(facilityStr, errorsDatabase.BASE_HEX) : (int(start), int(end), int(count), bytes.fromhex(facilityHash).hex())
+            for facilityStr, (start, end, count, facilityHash) in indexJSON["facilities"].items()}
+        return OffsetIndex((int(indexJSON["size"]), int(indexJSON["mtime_ns"]), str(indexJSON["sha1"]), str(indexJSON["git_blob_sha"])), facilities)
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return None
+
+#Writes an index next to its final location, then moves it in place. Returns True on success, False otherwise.
+def writeIndexFile(index : OffsetIndex, indexPath : str) -> bool:
+    tmpPath = indexPath + ".tmp"
+    try:
+        with open(tmpPath, "wb") as fh:
+            fh.write(getIndexData(index))
+        os.replace(tmpPath, indexPath)
+        return True
+    except OSError as e:
+        print(f"Failed to write offset index '{indexPath}' ({e.__class__.__name__}).")
+        return False
+
+#Errors database served from a JSON file through its offset index. Behaves like a regular (read-only) Database.
+class LazyDatabase(Mapping):
+    __slots__ = ["fileMapping", "index", "resident"]
+
+    #May raise OSError, or ValueError if index wasn't built from the JSON file as it is now
+    def __init__(self, jsonPath : str, index : OffsetIndex, maxResidentFacilities : int) -> None:
+        with open(jsonPath, "rb") as fh:
+            st = os.fstat(fh.fileno())
+            if (st.st_size, st.st_mtime_ns) != index.sourceInfo[:2]:
+                raise ValueError(f"Offset index doesn't match '{jsonPath}'.")
+            self.fileMapping : mmap.mmap = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        self.index : OffsetIndex = index
+        self.resident : ResidentFacilities = ResidentFacilities(maxResidentFacilities)
+
+    def getSourceInfo(self) -> tuple:
+        return self.index.sourceInfo
+
+    def getErrorsCount(self) -> int:
+        return sum(entry[2] for entry in self.index.facilities.values())
+
+    #Returns the hash of every facility, by facility number - see merkleTree.getMerkleTreeFromHashes()
+    def getFacilityHashes(self) -> dict:
+        return {facilityNum : bytes.fromhex(entry[3]) for facilityNum, entry in self.index.facilities.items()}
+
+    def __decodeFacility(self, facilityNum : int) -> Facility:
+        start, end = self.index.facilities[facilityNum][:2]
+        return errorsDatabase.getFacilityFromJSONData(self.fileMapping[start:end])
+
+    def get(self, facilityNum : int, default = None) -> Facility:
+        if facilityNum not in self.index.facilities:
+            return default
+        facility = self.resident.get(facilityNum, self.__decodeFacility)
+        return facility if facility != None else default
+
+    def __getitem__(self, facilityNum : int) -> Facility:
+        facility = self.get(facilityNum)
+        if facility == None:
+            raise KeyError(facilityNum)
+        return facility
+
+    def __contains__(self, facilityNum) -> bool:
+        return facilityNum in self.index.facilities
+
+    def __iter__(self):
+        return iter(list(self.index.facilities.keys()))
+
+    def __len__(self) -> int:
+        return len(self.index.facilities)
+
+#Returns the LazyDatabase of the JSON file at jsonPath, or None on failure.
+#The offset index stored at indexPath is used if it is up to date - otherwise, it is built again and stored there.
+def openLazyDatabase(jsonPath : str, indexPath : str, maxResidentFacilities : int) -> LazyDatabase:
+    index = None
+    try:
+        with open(indexPath, "rb") as fh:
+            index = getIndexFromData(fh.read())
+        st = os.stat(jsonPath)
+        if index != None and index.sourceInfo[:2] != (st.st_size, st.st_mtime_ns):
+            index = None
+    except OSError:
+        index = None
+
+    if index == None:
+        index = buildOffsetIndex(jsonPath)
+        if index == None:
+            return None
+        writeIndexFile(index, indexPath) #Only makes the next loads faster
+    try:
+        return LazyDatabase(jsonPath, index, maxResidentFacilities)
+    except (OSError, ValueError) as e:
+        print(f"Failed to open '{jsonPath}' lazily ({e}).")
+        return None
@@ -0,0 +1,151 @@
+import json
+from hashlib import sha1
+from aiohttp import web
+
+import codeResolver
+from lruCache import LRUCache
+
+#Optional HTTP JSON API, for internal tools which want the answers the bot gives (i.e. a ticketing system, a dashboard).
+#It runs on the bot's event loop, with aiohttp (installed alongside discord.py), and reads the live databases on every request :
+#updates, merges and reloads are picked up as soon as the bot swaps its holders.
+#
+#Endpoints :
+# - GET /code/{code} : an error code, in hexadecimal (0x80010002, 80010002, or negative : -0x7FFEFFFE)
+# - GET /short/{code} : a short code (C1-2345-6, C123456...)
+# - POST /batch : {"codes" : ["0x80010002", "C1-2345-6", ...]} - every input is parsed like the error_code command does
+# - GET /status : root hash of the live errors database (see merkleTree.py), SHA-1 hash of the live short codes database
+#Responses of the GET endpoints only depend on the URL and on the databases, so their ETag is derived from the hashes of both
+#databases : clients sending it back in If-None-Match get a 304 until a database changes. Serialized responses are cached for the same reason.
+#Connections are kept alive between requests (aiohttp's default), so clients with a session don't pay for a connection per lookup.
+
+MAX_REQUEST_BODY_SIZE = 64 * 1024           #Bodies of /batch requests - MAX_BATCH_CODES codes fit with room to spare
+MAX_BATCH_CODES = codeResolver.MAX_BATCH_CODES
+RESPONSES_CACHE_SIZE = 4096                 #Serialized responses of GET endpoints kept in cache
+CONTENT_TYPE = "application/json"
+
+#Serves the API on host:port. getDatabases() must return the (errors database holder, short codes database holder) the bot uses.
+class LookupApiServer:
+    __slots__ = ["getDatabases", "host", "port", "runner", "responseCache"]
+
+    def __init__(self, getDatabases, host : str, port : int) -> None:
+        self.getDatabases = getDatabases
+        self.host : str = host
+        self.port : int = port
+        self.runner : web.AppRunner = None
+        self.responseCache : LRUCache = LRUCache(RESPONSES_CACHE_SIZE)
+
+    async def start(self) -> None:
+        app = web.Application(client_max_size=MAX_REQUEST_BODY_SIZE)
+        app.router.add_get("/code/{code}", self.__handleCode)
+        app.router.add_get("/short/{code}", self.__handleShortCode)
+        app.router.add_post("/batch", self.__handleBatch)
+        app.router.add_get("/status", self.__handleStatus)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        try:
+            await web.TCPSite(runner, self.host, self.port).start()
+        except OSError:
+            await runner.cleanup()
+            raise
+        self.runner = runner
+        print(f"Serving lookup API on http://{self.host}:{self.port}/")
+
+    async def close(self) -> None:
+        if self.runner != None:
+            await self.runner.cleanup()
+            self.runner = None
+
+    #Returns (errors database holder, short codes database, ETag), or raises a 503 if no errors database is loaded
+    def __getDatabases(self) -> tuple:
+        errorsDB, shortCodesDB = self.getDatabases()
+        if errorsDB.databaseObject == None:
+            raise _getErrorResponse(web.HTTPServiceUnavailable, "No valid errors database is currently loaded.")
+        scDb = shortCodesDB.databaseObject
+        version = f"{errorsDB.rootHash}:{scDb.GetDBSha1() if scDb.IsValidDatabaseLoaded() else None}"
+        return (errorsDB, scDb, '"' + sha1(version.encode("ascii")).hexdigest() + '"')
+
+    #Returns the cached response to a GET request, or build(errors database holder, short codes database) serialized to JSON
+    #build() may raise HTTP errors, which aren't cached
+    def __getCachedResponse(self, request : web.Request, build) -> web.Response:
+        errorsDB, scDb, etag = self.__getDatabases()
+        headers = {"ETag" : etag, "Cache-Control" : "no-cache"} #Clients may keep responses, but must revalidate them
+        tags = _getIfNoneMatchTags(request)
+        if etag in tags or "*" in tags:
+            return web.Response(status=304, headers=headers)
+
+        self.responseCache.SetVersion(etag)
+        body = self.responseCache.Get(request.path)
+        if body == None:
+            body = json.dumps(build(errorsDB, scDb)).encode("utf-8")
+            self.responseCache.Put(request.path, body)
+        return web.Response(body=body, content_type=CONTENT_TYPE, headers=headers)
+
+    async def __handleCode(self, request : web.Request) -> web.Response:
+        input_str = request.match_info["code"].strip()
+        def build(errorsDB, scDb) -> dict:
+            #Parsed like error_code inputs, without a short codes database : short codes have their own endpoint
+            inputKind, code, failure = codeResolver.parseErrorCodeInput(None, input_str)
+            if inputKind != "hex":
+                raise _getErrorResponse(web.HTTPBadRequest, f"'{input_str}' isn't a hexadecimal error code.")
+            if failure != None: #"too_long"
+                raise _getErrorResponse(web.HTTPBadRequest, "Input too long - error codes are only 4 bytes wide.")
+            return codeResolver.getErrorCodeDict(errorsDB.compiledObject, scDb, code)
+        return self.__getCachedResponse(request, build)
+
+    async def __handleShortCode(self, request : web.Request) -> web.Response:
+        input_str = request.match_info["code"].strip()
+        def build(errorsDB, scDb) -> dict:
+            if not scDb.IsValidDatabaseLoaded():
+                raise _getErrorResponse(web.HTTPServiceUnavailable, "No valid short error codes database is currently loaded.")
+            code = scDb.ResolveShortCode(input_str)
+            if code == 0:
+                raise _getErrorResponse(web.HTTPNotFound, f"'{input_str}' is an unknown short code or an invalid input.")
+            return dict(short_code=scDb.GetCanonicalShortCode(input_str), **codeResolver.getErrorCodeDict(errorsDB.compiledObject, scDb, code))
+        return self.__getCachedResponse(request, build)
+
+    async def __handleStatus(self, request : web.Request) -> web.Response:
+        errorsDB, shortCodesDB = self.getDatabases()
+        scDb = shortCodesDB.databaseObject
+        return web.json_response({
+            "errors_db" : {"loaded" : errorsDB.databaseObject != None, "root_hash" : errorsDB.rootHash},
+            "short_codes_db" : {"loaded" : scDb.IsValidDatabaseLoaded(), "sha1" : scDb.GetDBSha1() if scDb.IsValidDatabaseLoaded() else None},
+        })
+
+    #Results are in the order of the inputs. Inputs which couldn't be resolved get an "error" (one of the failures of parseErrorCodeInput()).
+    async def __handleBatch(self, request : web.Request) -> web.Response:
+        try:
+            inputs = (await request.json())["codes"]
+        except (ValueError, KeyError, TypeError):
+            raise _getErrorResponse(web.HTTPBadRequest, 'Expected a JSON object : {"codes" : ["0x80010002", "C1-2345-6", ...]}.')
+        if not isinstance(inputs, list) or not all(isinstance(input_str, str) and input_str.strip() != "" for input_str in inputs):
+            raise _getErrorResponse(web.HTTPBadRequest, '"codes" must be a list of non-empty strings.')
+        if len(inputs) > MAX_BATCH_CODES:
+            raise _getErrorResponse(web.HTTPRequestEntityTooLarge, f"At most {MAX_BATCH_CODES} codes can be resolved at once.", MAX_BATCH_CODES, len(inputs))
+
+        errorsDB, scDb, etag = self.__getDatabases()
+        results = list()
+        for input_str in inputs:
+            normalized = input_str.strip().upper()
+            inputKind, code, failure = codeResolver.parseErrorCodeInput(scDb, normalized)
+            if failure != None:
+                results.append({"input" : input_str, "error" : failure})
+                continue
+            result = {"input" : input_str}
+            if inputKind == "short_code":
+                result["short_code"] = scDb.GetCanonicalShortCode(normalized)
+            result.update(codeResolver.getErrorCodeDict(errorsDB.compiledObject, scDb, code))
+            results.append(result)
+        #The ETag tells which databases answered, but POST responses can't be revalidated
+        return web.Response(body=json.dumps({"results" : results}).encode("utf-8"), content_type=CONTENT_TYPE, headers={"ETag" : etag})
+
+#Returns an HTTP error (exception class from aiohttp.web, args being the ones it requires) with a JSON body
+def _getErrorResponse(errorClass, message : str, *args) -> web.HTTPException:
+    return errorClass(*args, text=json.dumps({"error" : message}), content_type=CONTENT_TYPE)
+
+#Returns the entity tags listed by the If-None-Match header of a request. Weak comparison is used, as for any GET.
+def _getIfNoneMatchTags(request : web.Request) -> list:
+    header = request.headers.get("If-None-Match")
+    if header == None:
+        return []
+    tags = [tag.strip() for tag in header.split(",")]
+    return [tag[2:] if tag.startswith("W/") else tag for tag in tags]
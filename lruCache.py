@@ -0,0 +1,51 @@
+from collections import OrderedDict
+
+#Bounded Least Recently Used cache
+#The cache is tied to a "version" (i.e. the SHA-1 of the data its values are derived from) : changing the version drops every entry.
+class LRUCache:
+    __slots__ = ["maxSize", "version", "entries", "hits", "misses", "evictions"]
+
+    def __init__(self, maxSize : int) -> None:
+        self.maxSize : int = maxSize
+        self.version = None
+        self.entries : OrderedDict = OrderedDict()
+        self.hits : int = 0
+        self.misses : int = 0
+        self.evictions : int = 0
+
+    #Drops every entry if version is different from the current version of the cache
+    def SetVersion(self, version) -> None:
+        if version != self.version:
+            self.entries.clear()
+            self.version = version
+
+    #Returns the value associated to key, or None if it isn't cached
+    def Get(self, key):
+        value = self.entries.get(key)
+        if value == None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return value
+
+    def Put(self, key, value) -> None:
+        if self.maxSize <= 0:
+            return
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxSize:
+            self.entries.popitem(last = False)
+            self.evictions += 1
+
+    def Clear(self) -> None:
+        self.entries.clear()
+
+    def GetStatsAsString(self) -> str:
+        lookups = self.hits + self.misses
+        hitRate = (100.0 * self.hits / lookups) if lookups != 0 else 0.0
+        ret = f"Entries : {len(self.entries)}/{self.maxSize}\n"
+        ret += f"Hits : {self.hits} ({hitRate:.1f}%)\n"
+        ret += f"Misses : {self.misses}\n"
+        ret += f"Evictions : {self.evictions}"
+        return ret
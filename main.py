@@ -2,11 +2,8 @@
 import os #rename, abort
 import re
 import discord
-import requests
 
 from discord.ext import commands
-from requests.models import MissingSchema
-from requests.sessions import InvalidSchema
 
 import SECRETS #TOKEN
 import CONFIG #REPO_URL, PREFIX
@@ -17,7 +14,22 @@ bot = commands.Bot(command_prefix=commands.when_mentioned_or(CONFIG.PREFIX), cas
 
 initParam = RivetCogInitParam(RivetCog.REMOTE_API_TARGET_GITHUB, #Change this if you implement support for another site
     CONFIG.REPO_URL, CONFIG.LOCAL_ERRORS_DATABASE_PATH, CONFIG.REMOTE_ERRORS_DATABASE_PATH,
-    CONFIG.LOCAL_SHORT_CODES_DATABASE_PATH, CONFIG.REMOTE_SHORT_CODES_DATABASE_PATH)
+    CONFIG.LOCAL_SHORT_CODES_DATABASE_PATH, CONFIG.REMOTE_SHORT_CODES_DATABASE_PATH,
+    errorsDB_snapshotPath=CONFIG.LOCAL_ERRORS_SNAPSHOT_PATH,
+    errorsDB_remoteShardsPath=CONFIG.REMOTE_ERRORS_SHARDS_PATH,
+    errorsDB_localShardsPath=CONFIG.LOCAL_ERRORS_SHARDS_PATH,
+    errorsDB_indexPath=CONFIG.LOCAL_ERRORS_INDEX_PATH,
+    errorsDB_maxResidentFacilities=CONFIG.ERRORS_MAX_RESIDENT_FACILITIES,
+    responseCacheSize=CONFIG.RESPONSE_CACHE_SIZE,
+    httpTimeout=CONFIG.HTTP_TIMEOUT,
+    autoRefreshInterval=CONFIG.AUTO_REFRESH_INTERVAL,
+    autoRefreshJitter=CONFIG.AUTO_REFRESH_JITTER,
+    autoRefreshMaxBackoff=CONFIG.AUTO_REFRESH_MAX_BACKOFF,
+    metricsHost=CONFIG.METRICS_HOST,
+    metricsPort=CONFIG.METRICS_PORT,
+    lookupApiHost=CONFIG.LOOKUP_API_HOST,
+    lookupApiPort=CONFIG.LOOKUP_API_PORT,
+    mergeSourcesPath=CONFIG.MERGE_SOURCES_PATH)
 
 rivet_cog = RivetCog(bot, initParam)
 bot.add_cog(rivet_cog)
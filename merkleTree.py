@@ -0,0 +1,156 @@
+import struct
+from hashlib import sha1
+from dataclasses import dataclass
+
+import errorsDatabase
+from errorsDatabase import Database, Facility, Error
+
+#Content hashes of an errors database, as a Merkle tree : errors -> facilities -> root.
+# - the hash of an error is the SHA-1 of its number, name and description
+# - the hash of a facility is the SHA-1 of its number, name, description and normalized blacklist, then of the hashes of its errors by error number
+# - the root hash is the SHA-1 of the number and hash of every facility, by facility number
+#Fields are encoded canonically (see _encodeString()), so hashes only depend on the content of a database - unlike the SHA-1 of a JSON file,
+#which also depends on its formatting and on the order of its keys.
+#
+#Only the hashes of facilities are kept : error hashes are only needed to hash their facility.
+#Facilities are immutable, so a facility shared by identity with a previous database (i.e. after a merge) keeps the hash it had there :
+#only the facilities which were modified are hashed again. Snapshots and offset indexes store facility hashes, so that databases loaded from
+#them don't have to be decoded to be hashed (see getMerkleTreeFromHashes()).
+
+@dataclass(frozen=True)
+class MerkleTree:
+    __slots__ = ["facilityHashes", "facilities", "rootHash"]
+    facilityHashes : dict   #Maps a facility number to the hash of the facility (20 bytes)
+    facilities : dict       #Maps a facility number to the Facility object it was hashed from - empty if the hashes were loaded
+    rootHash : str          #Hex string
+
+#A facility which differs between two databases
+@dataclass(frozen=True)
+class FacilityDiff:
+    __slots__ = ["facilityNum", "status", "oldFacility", "newFacility", "fields", "addedErrors", "removedErrors", "changedErrors"]
+    facilityNum : int
+    status : str                #"added", "removed" or "changed"
+    oldFacility : Facility      #None if the facility was added
+    newFacility : Facility      #None if the facility was removed
+    fields : tuple              #Fields of the facility itself which changed (errorsDatabase.NAME_KEY, DESCRIPTION_KEY or BLACKLIST_KEY)
+    addedErrors : tuple         #Numbers of the errors which were added, removed or changed - empty for added and removed facilities
+    removedErrors : tuple
+    changedErrors : tuple
+
+#Strings are prefixed by their length, so that no two sequences of strings have the same encoding - None is a length no string can have
+def _encodeString(s : str) -> bytes:
+    if s == None:
+        return b"\xff\xff\xff\xff"
+    encoded = s.encode("utf-8")
+    return struct.pack("<I", len(encoded)) + encoded
+
+#Facility numbers and blacklist ranges are any integer the JSON file holds (i.e. facility 0x10000, or negative ones), so they are encoded as strings.
+#Error numbers always fit in 16 bits, since parsing rejects the other ones.
+def _encodeInt(n : int) -> bytes:
+    return _encodeString("%X" % n)
+
+def getErrorHash(errorNum : int, errorObj : Error) -> bytes:
+    return sha1(struct.pack("<H", errorNum) + _encodeString(errorObj.name) + _encodeString(errorObj.description)).digest()
+
+def getFacilityHash(facilityNum : int, facilityObj : Facility) -> bytes:
+    blacklist = errorsDatabase.getNormalizedBlacklist(facilityObj.blacklist)
+    sha1Ctx = sha1(_encodeInt(facilityNum) + _encodeString(facilityObj.name) + _encodeString(facilityObj.description))
+    sha1Ctx.update(struct.pack("<I", len(blacklist)))
+    for blacklistRange in blacklist:
+        sha1Ctx.update(_encodeInt(blacklistRange.min) + _encodeInt(blacklistRange.max))
+    for errorNum, errorObj in sorted(facilityObj.errors.items(), key = lambda item: item[0]):
+        sha1Ctx.update(getErrorHash(errorNum, errorObj))
+    return sha1Ctx.digest()
+
+def getRootHash(facilityHashes : dict) -> str:
+    sha1Ctx = sha1()
+    for facilityNum, facilityHash in sorted(facilityHashes.items()):
+        sha1Ctx.update(_encodeInt(facilityNum) + facilityHash)
+    return sha1Ctx.hexdigest().lower()
+
+#Builds the tree of db. If previous is the tree of a database db was derived from, the hashes of the facilities db shares with it are reused.
+def buildMerkleTree(db : Database, previous : MerkleTree = None) -> MerkleTree:
+    facilityHashes = dict()
+    facilities = dict()
+    for facilityNum, facilityObj in db.items():
+        if previous != None and previous.facilities.get(facilityNum) is facilityObj:
+            facilityHashes[facilityNum] = previous.facilityHashes[facilityNum]
+        else:
+            facilityHashes[facilityNum] = getFacilityHash(facilityNum, facilityObj)
+        facilities[facilityNum] = facilityObj
+    return MerkleTree(facilityHashes, facilities, getRootHash(facilityHashes))
+
+#Returns the tree of a database derived from the one of previous by replacing or adding facilities (i.e. an errorsDatabase.OverlayDatabase).
+#Unlike buildMerkleTree(), the facilities previous was built from aren't visited, so those of lazily loaded databases are never decoded.
+def updateMerkleTree(previous : MerkleTree, facilities : dict) -> MerkleTree:
+    facilityHashes = dict(previous.facilityHashes)
+    treeFacilities = dict(previous.facilities)
+    for facilityNum, facilityObj in facilities.items():
+        if treeFacilities.get(facilityNum) is not facilityObj:
+            facilityHashes[facilityNum] = getFacilityHash(facilityNum, facilityObj)
+            treeFacilities[facilityNum] = facilityObj
+    return MerkleTree(facilityHashes, treeFacilities, getRootHash(facilityHashes))
+
+#Returns the tree of a database from the stored hashes of its facilities, without decoding them
+def getMerkleTreeFromHashes(facilityHashes : dict) -> MerkleTree:
+    return MerkleTree(dict(facilityHashes), dict(), getRootHash(facilityHashes))
+
+#Returns the FacilityDiff of every facility which differs between two databases, by facility number.
+#Facilities are compared by hash first : only the ones which changed are looked into, so this takes time proportional to their size.
+def getDatabaseDiff(oldDb : Database, oldTree : MerkleTree, newDb : Database, newTree : MerkleTree) -> list:
+    if oldTree.rootHash == newTree.rootHash:
+        return []
+
+    diffs = list()
+    for facilityNum in sorted(oldTree.facilityHashes.keys() | newTree.facilityHashes.keys()):
+        oldHash = oldTree.facilityHashes.get(facilityNum)
+        newHash = newTree.facilityHashes.get(facilityNum)
+        if oldHash == newHash:
+            continue
+        if oldHash == None:
+            diffs.append(FacilityDiff(facilityNum, "added", None, newDb[facilityNum], (), (), (), ()))
+            continue
+        if newHash == None:
+            diffs.append(FacilityDiff(facilityNum, "removed", oldDb[facilityNum], None, (), (), (), ()))
+            continue
+
+        oldFacility, newFacility = oldDb[facilityNum], newDb[facilityNum]
+        fields = tuple(field for field, oldValue, newValue in (
+            (errorsDatabase.NAME_KEY, oldFacility.name, newFacility.name),
+            (errorsDatabase.DESCRIPTION_KEY, oldFacility.description, newFacility.description),
+            (errorsDatabase.BLACKLIST_KEY, errorsDatabase.getNormalizedBlacklist(oldFacility.blacklist), errorsDatabase.getNormalizedBlacklist(newFacility.blacklist)))
+            if oldValue != newValue)
+        oldErrors = dict(oldFacility.errors.items())
+        newErrors = dict(newFacility.errors.items())
+        diffs.append(FacilityDiff(facilityNum, "changed", oldFacility, newFacility, fields,
+            tuple(sorted(newErrors.keys() - oldErrors.keys())),
+            tuple(sorted(oldErrors.keys() - newErrors.keys())),
+            tuple(sorted(errorNum for errorNum in oldErrors.keys() & newErrors.keys() if oldErrors[errorNum] != newErrors[errorNum]))))
+    return diffs
+
+#Returns a one-line summary of a diff
+def getDiffSummary(diffs : list) -> str:
+    counts = {status : sum(1 for diff in diffs if diff.status == status) for status in ("added", "removed", "changed")}
+    errorsAdded = sum(len(diff.addedErrors) + (len(diff.newFacility.errors) if diff.status == "added" else 0) for diff in diffs)
+    errorsRemoved = sum(len(diff.removedErrors) + (len(diff.oldFacility.errors) if diff.status == "removed" else 0) for diff in diffs)
+    errorsChanged = sum(len(diff.changedErrors) for diff in diffs)
+    return f"Facilities : {counts['added']} added, {counts['removed']} removed, {counts['changed']} changed - " \
+        f"errors : {errorsAdded} added, {errorsRemoved} removed, {errorsChanged} changed."
+
+#Returns a diff as text, in the format of unified diffs : + added, - removed, ~ changed
+def getDiffReport(diffs : list) -> str:
+    def getCode(facilityNum : int, errorNum : int) -> str:
+        return f"0x{errorsDatabase.IS_ERROR_MASK | (facilityNum << 16) | errorNum:08X}"
+
+    lines = list()
+    for diff in diffs:
+        if diff.status == "added":
+            lines.append(f"+ Facility 0x{diff.facilityNum:03X} {diff.newFacility.name} ({len(diff.newFacility.errors)} errors)")
+        elif diff.status == "removed":
+            lines.append(f"- Facility 0x{diff.facilityNum:03X} {diff.oldFacility.name} ({len(diff.oldFacility.errors)} errors)")
+        else:
+            lines.append(f"~ Facility 0x{diff.facilityNum:03X} {diff.newFacility.name}" + (f" : {', '.join(diff.fields)} changed" if len(diff.fields) != 0 else ""))
+            lines += [f"+   {getCode(diff.facilityNum, errorNum)} {diff.newFacility.errors[errorNum].name}" for errorNum in diff.addedErrors]
+            lines += [f"-   {getCode(diff.facilityNum, errorNum)} {diff.oldFacility.errors[errorNum].name}" for errorNum in diff.removedErrors]
+            lines += [f"~   {getCode(diff.facilityNum, errorNum)} {diff.newFacility.errors[errorNum].name}" for errorNum in diff.changedErrors]
+    return "\n".join(lines)
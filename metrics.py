@@ -0,0 +1,152 @@
+import time
+from bisect import bisect_left
+from aiohttp import web
+
+#Minimal instrumentation, exposed in the Prometheus text format (version 0.0.4) by an optional local HTTP listener (aiohttp, like lookupApi.py).
+#Metrics are only ever updated from the bot's process, so there is no need for a client library : a metric is a dict
+#mapping a tuple of label values to its value(s), rendered on demand when the listener is scraped.
+#The bot doesn't create any metric when the listener is disabled - instrumented code checks for None before recording anything.
+
+#Default histogram buckets, in seconds - from lookups (microseconds) to database downloads (tens of seconds)
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def _escapeLabelValue(value : str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _formatValue(value : float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    __slots__ = ["name", "help", "labelNames", "values"]
+    TYPE = None
+
+    def __init__(self, name : str, help : str, labelNames : tuple = ()) -> None:
+        self.name : str = name
+        self.help : str = help
+        self.labelNames : tuple = labelNames
+        self.values : dict = dict() #Maps a tuple of label values to the value(s) of the metric
+
+    def _formatLabels(self, labelValues : tuple, extra : str = None) -> str:
+        pairs = [f"{name}=\"{_escapeLabelValue(str(value))}\"" for name, value in zip(self.labelNames, labelValues)]
+        if extra != None:
+            pairs.append(extra)
+        return ("{" + ",".join(pairs) + "}") if len(pairs) != 0 else ""
+
+    def _renderSamples(self, lines : list) -> None:
+        for labelValues, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{self._formatLabels(labelValues)} {_formatValue(value)}")
+
+    def render(self, lines : list) -> None:
+        lines.append(f"# HELP {self.name} {self.help}")
+        lines.append(f"# TYPE {self.name} {self.TYPE}")
+        self._renderSamples(lines)
+
+class Counter(_Metric):
+    __slots__ = []
+    TYPE = "counter"
+
+    def inc(self, labelValues : tuple = (), amount : float = 1) -> None:
+        self.values[labelValues] = self.values.get(labelValues, 0) + amount
+
+class Gauge(_Metric):
+    __slots__ = []
+    TYPE = "gauge"
+
+    def set(self, labelValues : tuple, value : float) -> None:
+        self.values[labelValues] = value
+
+#Each value of a histogram is [count of each bucket (not cumulative), sum of the observations]
+class Histogram(_Metric):
+    __slots__ = ["buckets"]
+    TYPE = "histogram"
+
+    def __init__(self, name : str, help : str, labelNames : tuple = (), buckets : tuple = LATENCY_BUCKETS) -> None:
+        _Metric.__init__(self, name, help, labelNames)
+        self.buckets : tuple = tuple(buckets) + (float("inf"),)
+
+    def observe(self, labelValues : tuple, value : float) -> None:
+        entry = self.values.get(labelValues)
+        if entry == None:
+            entry = self.values[labelValues] = [[0] * len(self.buckets), 0.0]
+        entry[0][bisect_left(self.buckets, value)] += 1 #Buckets are upper bounds, inclusive
+        entry[1] += value
+
+    def _renderSamples(self, lines : list) -> None:
+        for labelValues, (counts, total) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                bucketLabels = self._formatLabels(labelValues, f"le=\"{_formatValue(bound)}\"")
+                lines.append(f"{self.name}_bucket{bucketLabels} {cumulative}")
+            lines.append(f"{self.name}_sum{self._formatLabels(labelValues)} {_formatValue(total)}")
+            lines.append(f"{self.name}_count{self._formatLabels(labelValues)} {cumulative}")
+
+#The metrics of the bot
+class BotMetrics:
+    __slots__ = ["startTime", "commandDuration", "commandErrors", "lookups", "databaseOperationDuration", "databaseOperationBytes",
+        "databaseEntries", "httpRequestDuration"]
+
+    def __init__(self) -> None:
+        self.startTime : float = time.time()
+        self.commandDuration : Histogram = Histogram("rivet_command_duration_seconds", "Time spent running commands.", ("command",))
+        self.commandErrors : Counter = Counter("rivet_command_errors_total", "Commands which raised an error.", ("command",))
+        self.lookups : Counter = Counter("rivet_lookups_total", "error_code lookups, by kind of input and outcome.", ("input", "outcome"))
+        self.databaseOperationDuration : Histogram = Histogram("rivet_database_operation_duration_seconds",
+            "Time spent parsing, hashing, merging and serializing databases.", ("database", "operation"))
+        self.databaseOperationBytes : Gauge = Gauge("rivet_database_operation_bytes", "Size of the data handled by the last operation on a database.",
+            ("database", "operation"))
+        self.databaseEntries : Gauge = Gauge("rivet_database_entries", "Number of entries (errors or short codes) of the live databases.", ("database",))
+        self.httpRequestDuration : Histogram = Histogram("rivet_http_request_duration_seconds", "Time spent on HTTP requests to remotes.", ("status",))
+
+    #Records an operation on a database which started at start (a time.perf_counter() value), and the size of the data it handled if known
+    def observeDatabaseOperation(self, database : str, operation : str, start : float, size : int = None) -> None:
+        self.databaseOperationDuration.observe((database, operation), time.perf_counter() - start)
+        if size != None:
+            self.databaseOperationBytes.set((database, operation), size)
+
+    def render(self) -> str:
+        lines = [
+            "# HELP rivet_start_time_seconds Time the bot was started at, since the Epoch.",
+            "# TYPE rivet_start_time_seconds gauge",
+            f"rivet_start_time_seconds {_formatValue(self.startTime)}",
+        ]
+        for metric in (self.commandDuration, self.commandErrors, self.lookups, self.databaseOperationDuration, self.databaseOperationBytes,
+            self.databaseEntries, self.httpRequestDuration):
+            metric.render(lines)
+        return "\n".join(lines) + "\n"
+
+#Serves GET (and HEAD) /metrics on a local port. Anything else gets a 404 (or 405 for other methods).
+class MetricsServer:
+    __slots__ = ["metrics", "host", "port", "runner"]
+
+    def __init__(self, metrics : BotMetrics, host : str, port : int) -> None:
+        self.metrics : BotMetrics = metrics
+        self.host : str = host
+        self.port : int = port
+        self.runner : web.AppRunner = None
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_get("/metrics", self.__handleMetrics)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        try:
+            await web.TCPSite(runner, self.host, self.port).start()
+        except OSError:
+            await runner.cleanup()
+            raise
+        self.runner = runner
+        print(f"Serving metrics on http://{self.host}:{self.port}/metrics")
+
+    async def close(self) -> None:
+        if self.runner != None:
+            await self.runner.cleanup()
+            self.runner = None
+
+    async def __handleMetrics(self, request : web.Request) -> web.Response:
+        #The content type has a version parameter, which aiohttp's content_type argument doesn't take
+        return web.Response(body=self.metrics.render().encode("utf-8"), headers={"Content-Type" : CONTENT_TYPE})
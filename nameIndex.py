@@ -0,0 +1,126 @@
+from array import array
+from bisect import bisect_left
+from heapq import merge as heapq_merge
+from itertools import islice
+
+import errorsDatabase
+from errorsDatabase import Database, Facility
+
+#Reverse index of an errors database : name -> code.
+#Names are matched case-insensitively ; the index stores them uppercased.
+#
+# - every facility has a FacilityNames part holding the sorted names of its errors. Parts are tied to the Facility object they
+#   were built from : since Facility objects are immutable and shared between a database and the ones merged from it,
+#   an index for a merged database only needs to build parts for the facilities the merge created.
+# - exact lookups go through a single dict, which is patched rather than rebuilt when parts change.
+# - prefix lookups bisect every part, and merge the sorted results lazily.
+#
+#Like the databases, indexes are immutable once built.
+
+#Error codes in the index have the error bit set, and the fatal bit cleared
+def _getErrorCode(facilityNum : int, errorNum : int) -> int:
+    return errorsDatabase.IS_ERROR_MASK | (facilityNum << 16) | errorNum
+
+#Sorted names of the errors of a facility
+class FacilityNames:
+    __slots__ = ["facility", "keys", "errorNums"]
+
+    def __init__(self, facility : Facility) -> None:
+        entries = sorted((errorObj.name.upper(), errorNum) for errorNum, errorObj in facility.errors.items())
+        self.facility : Facility = facility #Only compared by identity
+        self.keys : list = [entry[0] for entry in entries]
+        self.errorNums : array = array("H", [entry[1] for entry in entries])
+
+    #Yields the (name, code) pairs whose name starts with prefix, in order
+    def iterPrefix(self, facilityNum : int, prefix : str):
+        idx = bisect_left(self.keys, prefix)
+        while idx < len(self.keys) and self.keys[idx].startswith(prefix):
+            yield (self.keys[idx], _getErrorCode(facilityNum, self.errorNums[idx]))
+            idx += 1
+
+#Adds code to the codes of name in an exact lookup map - codes are stored as-is, or as a tuple if several codes share a name
+def _addToExactMap(exactMap : dict, name : str, code : int) -> None:
+    codes = exactMap.get(name)
+    if codes == None:
+        exactMap[name] = code
+    elif isinstance(codes, tuple):
+        exactMap[name] = codes + (code,)
+    else:
+        exactMap[name] = (codes, code)
+
+def _removeFromExactMap(exactMap : dict, name : str, code : int) -> None:
+    codes = exactMap.get(name)
+    if not isinstance(codes, tuple):
+        del exactMap[name]
+    else:
+        codes = tuple(c for c in codes if c != code)
+        exactMap[name] = codes[0] if len(codes) == 1 else codes
+
+class NameIndex:
+    __slots__ = ["parts", "errorNames", "facilityNames", "facilityKeys"]
+
+    #Builds the index of db. If previous is the index of a database db was merged from, its parts are reused for unmodified facilities.
+    def __init__(self, db : Database, previous = None) -> None:
+        previousParts = previous.parts if previous != None else dict()
+        self.parts : dict = dict() #Maps a facility number to its FacilityNames
+        added = list()
+        for facilityNum, facilityObj in db.items():
+            part = previousParts.get(facilityNum)
+            if part == None or part.facility is not facilityObj:
+                part = FacilityNames(facilityObj)
+                added.append((facilityNum, part))
+            self.parts[facilityNum] = part
+
+        #Exact lookups - copying the previous map and patching it is much cheaper than building it again
+        if previous != None:
+            self.errorNames : dict = dict(previous.errorNames)
+            for facilityNum, part in previousParts.items():
+                if self.parts.get(facilityNum) is not part:
+                    for key, errorNum in zip(part.keys, part.errorNums):
+                        _removeFromExactMap(self.errorNames, key, _getErrorCode(facilityNum, errorNum))
+        else:
+            self.errorNames : dict = dict()
+        for facilityNum, part in added:
+            for key, errorNum in zip(part.keys, part.errorNums):
+                _addToExactMap(self.errorNames, key, _getErrorCode(facilityNum, errorNum))
+
+        #There are few facilities, so their names are always indexed from scratch
+        self.facilityNames : dict = dict() #Maps a name to the numbers of the facilities bearing it
+        for facilityNum, facilityObj in sorted(db.items()):
+            self.facilityNames.setdefault(facilityObj.name.upper(), list()).append(facilityNum)
+        self.facilityKeys : list = sorted(self.facilityNames.keys())
+
+    #Returns the codes of the errors named name (empty if there is none)
+    def getCodesOfErrorName(self, name : str) -> tuple:
+        codes = self.errorNames.get(name.upper(), ())
+        return codes if isinstance(codes, tuple) else (codes,)
+
+    #Returns the numbers of the facilities named name (empty if there is none)
+    def getFacilitiesOfName(self, name : str) -> tuple:
+        return tuple(self.facilityNames.get(name.upper(), ()))
+
+    #Returns up to limit (name, code) pairs for the error names starting with prefix, sorted by name
+    def completeErrorName(self, prefix : str, limit : int = 25) -> list:
+        prefix = prefix.upper()
+        iterators = [part.iterPrefix(facilityNum, prefix) for facilityNum, part in self.parts.items()]
+        return list(islice(heapq_merge(*iterators), limit))
+
+    #Returns up to limit (name, facility number) pairs for the facility names starting with prefix, sorted by name
+    def completeFacilityName(self, prefix : str, limit : int = 25) -> list:
+        prefix = prefix.upper()
+        ret = list()
+        idx = bisect_left(self.facilityKeys, prefix)
+        while idx < len(self.facilityKeys) and len(ret) < limit and self.facilityKeys[idx].startswith(prefix):
+            key = self.facilityKeys[idx]
+            ret += [(key, facilityNum) for facilityNum in self.facilityNames[key]]
+            idx += 1
+        return ret[:limit]
+
+    #Returns up to limit facility and error names starting with prefix, sorted - this is what an autocomplete endpoint answers with
+    def complete(self, prefix : str, limit : int = 25) -> list:
+        facilityNames = (key for key, facilityNum in self.completeFacilityName(prefix, limit))
+        errorNames = (key for key, code in self.completeErrorName(prefix, limit))
+        return list(islice(heapq_merge(facilityNames, errorNames), limit))
+
+    def getNamesCount(self) -> int:
+        return sum(len(part.keys) for part in self.parts.values())
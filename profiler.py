@@ -0,0 +1,150 @@
+import io
+import sys
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+
+#Diagnosis tools for the live bot, which can't have a profiler attached to it :
+# - SamplingProfiler samples the stacks of every thread at a fixed interval, from a thread of its own. It covers the event loop
+#   and the worker threads databases are loaded in, and only costs the sampling itself (the GIL is taken every interval).
+# - profileCall() runs a function under cProfile, for exact call counts and times of a single operation. cProfile only sees the
+#   thread it runs in, so it must be called from the thread doing the work (i.e. from a worker thread).
+# - AllocationTracer records where the memory allocated while it is active was allocated from, with tracemalloc.
+#Reports are plain text, meant to be sent as a file.
+
+DEFAULT_SAMPLING_INTERVAL = 0.005 #Seconds
+REPORT_MAX_ENTRIES = 30
+
+#Frames threads sit in when they have nothing to do - samples ending in them are counted as idle, not as work.
+#These are (file name, function name) pairs : Python frames only, since the blocking calls themselves are C functions.
+IDLE_FRAMES = {
+    ("selectors.py", "select"), #Event loop waiting for events
+    ("thread.py", "_worker"),   #Executor thread waiting for work
+    ("threading.py", "wait"),
+}
+
+def _getFrameKey(code) -> tuple:
+    return (code.co_filename, code.co_firstlineno, code.co_name)
+
+def _formatFrameKey(key : tuple) -> str:
+    fileName, lineNo, functionName = key
+    return f"{functionName} ({fileName}:{lineNo})"
+
+def _isIdleFrame(code) -> bool:
+    return (code.co_filename.rsplit("/", 1)[-1].rsplit("\\", 1)[-1], code.co_name) in IDLE_FRAMES
+
+class SamplingProfiler:
+    __slots__ = ["interval", "thread", "stopEvent", "ownSamples", "totalSamples", "samplesCount", "idleSamplesCount", "startTime", "duration"]
+
+    def __init__(self, interval : float = DEFAULT_SAMPLING_INTERVAL) -> None:
+        self.interval : float = interval
+        self.thread : threading.Thread = None
+        self.stopEvent : threading.Event = threading.Event()
+        self.ownSamples : dict = dict()     #Maps a function to the number of samples it was running in
+        self.totalSamples : dict = dict()   #Maps a function to the number of samples it was on the stack in
+        self.samplesCount : int = 0         #Number of non-idle stacks sampled
+        self.idleSamplesCount : int = 0
+        self.startTime : float = None
+        self.duration : float = 0.0
+
+    def start(self) -> None:
+        self.startTime = time.perf_counter()
+        self.thread = threading.Thread(target=self.__run, name="SamplingProfiler", daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stopEvent.set()
+        self.thread.join()
+        self.duration = time.perf_counter() - self.startTime
+
+    def __sample(self, profilerThreadId : int) -> None:
+        for threadId, frame in sys._current_frames().items():
+            if threadId == profilerThreadId:
+                continue
+            if _isIdleFrame(frame.f_code):
+                self.idleSamplesCount += 1
+                continue
+
+            self.samplesCount += 1
+            key = _getFrameKey(frame.f_code)
+            self.ownSamples[key] = self.ownSamples.get(key, 0) + 1
+            seen = set() #Recursive functions only count once per stack
+            while frame != None:
+                key = _getFrameKey(frame.f_code)
+                if key not in seen:
+                    seen.add(key)
+                    self.totalSamples[key] = self.totalSamples.get(key, 0) + 1
+                frame = frame.f_back
+
+    def __run(self) -> None:
+        profilerThreadId = threading.get_ident()
+        while not self.stopEvent.wait(self.interval):
+            self.__sample(profilerThreadId)
+
+    def getReport(self, limit : int = REPORT_MAX_ENTRIES) -> str:
+        ret = f"Sampling profile : {self.duration:.2f}s, one sample every {self.interval * 1000:.1f}ms\n"
+        ret += f"{self.samplesCount} busy samples, {self.idleSamplesCount} idle samples (all threads)\n"
+        if self.samplesCount == 0:
+            return ret + "Nothing ran while sampling.\n"
+        for title, counts in (("own samples (running)", self.ownSamples), ("total samples (running or on the stack)", self.totalSamples)):
+            ret += f"\nTop functions by {title} :\n"
+            ret += f"{'samples':>8} {'%':>6}  function\n"
+            for key, count in sorted(counts.items(), key=lambda entry: entry[1], reverse=True)[:limit]:
+                ret += f"{count:>8} {count * 100 / self.samplesCount:>5.1f}%  {_formatFrameKey(key)}\n"
+        return ret
+
+#Runs function(*args) under cProfile in the calling thread. Returns (return value of function, report).
+def profileCall(function, *args, limit : int = REPORT_MAX_ENTRIES) -> tuple:
+    profile = cProfile.Profile()
+    start = time.perf_counter()
+    profile.enable()
+    try:
+        ret = function(*args)
+    finally:
+        profile.disable()
+    duration = time.perf_counter() - start
+
+    stream = io.StringIO()
+    stats = pstats.Stats(profile, stream=stream)
+    stream.write(f"cProfile : {duration:.3f}s\n\nTop functions by cumulative time :\n")
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(limit)
+    stream.write("\nTop functions by own time :\n")
+    stats.sort_stats(pstats.SortKey.TIME).print_stats(limit)
+    return (ret, stream.getvalue())
+
+#Traces the allocations made between start() and stop() - tracing slows every allocation down, so it must be kept short
+class AllocationTracer:
+    __slots__ = ["running", "startedTracing", "snapshot", "peak"]
+
+    def __init__(self) -> None:
+        self.running : bool = False
+        self.startedTracing : bool = False #Set if tracemalloc wasn't already tracing when start() was called
+        self.snapshot : tracemalloc.Snapshot = None
+        self.peak : int = 0
+
+    def start(self) -> None:
+        self.startedTracing = not tracemalloc.is_tracing()
+        if self.startedTracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        self.running = True
+
+    def stop(self) -> None:
+        self.snapshot = tracemalloc.take_snapshot()
+        self.peak = tracemalloc.get_traced_memory()[1]
+        if self.startedTracing:
+            tracemalloc.stop()
+        self.running = False
+
+    #Computing the statistics of a snapshot is slow : call this from a worker thread
+    def getReport(self, limit : int = REPORT_MAX_ENTRIES) -> str:
+        snapshot = self.snapshot.filter_traces((tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)))
+        statistics = snapshot.statistics("lineno")
+        ret = f"Allocations : peak {self.peak / (1 << 20):.2f} MiB traced, {sum(stat.size for stat in statistics) / (1 << 20):.2f} MiB still allocated\n"
+        ret += f"\nTop allocation sites still allocated :\n{'KiB':>10} {'blocks':>8}  site\n"
+        for stat in statistics[:limit]:
+            frame = stat.traceback[0]
+            ret += f"{stat.size / 1024:>10.1f} {stat.count:>8}  {frame.filename}:{frame.lineno}\n"
+        return ret
@@ -0,0 +1,194 @@
+import os
+import sys
+import json
+import time
+import argparse
+import multiprocessing
+from collections import deque
+
+import CONFIG
+import errorsDatabase
+import codeResolver
+import shardedDatabase
+from lruCache import LRUCache
+from shortCodesDatabase import SCDatabase
+
+#Command line frontend : resolves every error code found in logs, without Discord.
+#Only the local databases are used (see CONFIG.py for their default paths) - run the bot, or download them, to get them.
+#
+#Input is read in blocks of whole lines, which are resolved by a pool of worker processes (--jobs) and written out in order.
+#Every line is echoed, followed by one annotation line per code found on it (text), or turned into a JSON object (jsonl).
+#
+#Usage :
+#   python -m rivet crash.log other.log > annotated.log
+#   zcat logs.gz | python -m rivet --format jsonl --only-matches --jobs 8 > codes.jsonl
+#   python -m rivet 0x80010002 C1-2345-6 (arguments which aren't files are resolved as codes)
+
+BLOCK_SIZE = 1 << 20 #Size of the blocks of lines sent to workers, in bytes (a block may be bigger if a line is)
+MAX_PENDING_BLOCKS_PER_JOB = 4 #Blocks queued per worker - bounds memory use whatever the size of the input
+ANNOTATIONS_CACHE_SIZE = 65536 #Annotations of the most frequent codes are only computed once per worker
+
+#State of a worker process, set by _initWorker()
+_compiledDb : errorsDatabase.CompiledDatabase = None
+_scDb : SCDatabase = None
+_outputFormat : str = None
+_onlyMatches : bool = False
+_annotations : LRUCache = None
+
+#Returns the errors database at path : a JSON file, or a folder of shards. Returns None on failure.
+def loadErrorsDatabase(path : str) -> errorsDatabase.Database:
+    if os.path.isdir(path):
+        loaded = shardedDatabase.loadShardedDatabase(path)
+        return loaded[0] if loaded != None else None
+    return errorsDatabase.getDatabaseFromJSONFile(path)
+
+def _initWorker(errorsDbPath : str, shortCodesDbPath : str, outputFormat : str, onlyMatches : bool) -> None:
+    global _compiledDb, _scDb, _outputFormat, _onlyMatches, _annotations
+    if _compiledDb == None: #Forked workers inherit the databases of the main process
+        db = loadErrorsDatabase(errorsDbPath)
+        _compiledDb = errorsDatabase.CompiledDatabase(db) if db != None else None
+        _scDb = SCDatabase()
+        _scDb.LoadFromFile(shortCodesDbPath)
+    _outputFormat = outputFormat
+    _onlyMatches = onlyMatches
+    _annotations = LRUCache(ANNOTATIONS_CACHE_SIZE)
+
+#Returns the annotation of a match of codeResolver.CANDIDATES_REGEX in the output format, or None if it doesn't stand for a 32-bit code
+def _getAnnotation(match):
+    text = match.group(0)
+    annotation = _annotations.Get(text)
+    if annotation != None:
+        return annotation
+
+    key = codeResolver.getCandidateKey(match)
+    if key == None:
+        return None
+    code, header, info = codeResolver.resolveCandidate(_compiledDb, _scDb, key, text)
+    shortCodes = _scDb.GetShortCodesOfErrorCode(code) if (code != None and _scDb.IsValidDatabaseLoaded()) else ()
+    if _outputFormat == "jsonl":
+        annotation = {"match" : text, "code" : f"0x{code:08X}" if code != None else None, "info" : info, "short_codes" : list(shortCodes)}
+        if code != None:
+            annotation["class"] = errorsDatabase.CODE_CLASS_NAMES[errorsDatabase.classifyErrorCode(_compiledDb.databaseObject, code)]
+    else:
+        annotation = f"    {header} : " + info.replace("\n", " | ")
+        if len(shortCodes) != 0 and not isinstance(key, str): #Like the bot, short codes are only listed for hexadecimal inputs
+            annotation += " | Short codes : " + ", ".join(shortCodes)
+    _annotations.Put(text, annotation)
+    return annotation
+
+#Resolves a block of lines. Returns (output, number of lines, number of codes found).
+def resolveBlock(source : str, firstLineNumber : int, block : bytes) -> tuple:
+    output = list()
+    codesCount = 0
+    #Only \n ends lines, like when blocks are cut : splitlines() would also split on form feeds and such, and shift line numbers
+    lines = block.decode("utf-8", errors="replace").split("\n")
+    if lines[-1] == "":
+        lines.pop()
+    for lineNumber, line in enumerate(lines, firstLineNumber):
+        line = line[:-1] if line.endswith("\r") else line
+        annotations = [annotation for annotation in map(_getAnnotation, codeResolver.CANDIDATES_REGEX.finditer(line)) if annotation != None]
+        codesCount += len(annotations)
+        if _onlyMatches and len(annotations) == 0:
+            continue
+        if _outputFormat == "jsonl":
+            output.append(json.dumps({"source" : source, "line" : lineNumber, "text" : line, "codes" : annotations}))
+        else:
+            output.append(line)
+            output += annotations
+    return ("".join(entry + "\n" for entry in output), len(lines), codesCount)
+
+#Yields (first line number, block of whole lines) for a binary stream
+def readBlocks(stream):
+    lineNumber = 1
+    remainder = b""
+    while True:
+        chunk = stream.read(BLOCK_SIZE)
+        if not chunk:
+            break
+        chunk = remainder + chunk
+        end = chunk.rfind(b"\n") + 1
+        if end == 0: #No complete line yet
+            remainder = chunk
+            continue
+        block, remainder = chunk[:end], chunk[end:]
+        yield (lineNumber, block)
+        lineNumber += block.count(b"\n")
+    if remainder:
+        yield (lineNumber, remainder)
+
+#Yields the (source, first line number, block) tasks for every input
+def getTasks(inputs : list):
+    for path in inputs:
+        if path == "-":
+            for lineNumber, block in readBlocks(sys.stdin.buffer):
+                yield ("<stdin>", lineNumber, block)
+        elif os.path.isfile(path):
+            with open(path, "rb") as fh:
+                for lineNumber, block in readBlocks(fh):
+                    yield (path, lineNumber, block)
+        elif codeResolver.CANDIDATES_REGEX.search(path) != None: #Not a file : resolve the argument itself
+            yield ("<argument>", 1, path.encode("utf-8"))
+        else:
+            print(f"'{path}' is neither a file nor a code.", file=sys.stderr)
+
+#Resolves the tasks in the main process, or in a pool of jobs processes. Results are yielded in order.
+def resolveTasks(tasks, jobs : int, initArgs : tuple):
+    if jobs <= 1:
+        for task in tasks:
+            yield resolveBlock(*task)
+        return
+
+    #Pool.imap() would read the whole input ahead of the workers : only a few blocks per worker are kept pending instead
+    with multiprocessing.Pool(jobs, _initWorker, initArgs) as pool:
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.apply_async(resolveBlock, task))
+            if len(pending) >= jobs * MAX_PENDING_BLOCKS_PER_JOB:
+                yield pending.popleft().get()
+        while len(pending) != 0:
+            yield pending.popleft().get()
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="rivet", description="Annotates the PS Vita error codes (and short codes) found in logs")
+    parser.add_argument("inputs", nargs="*", default=["-"], help="Log files to resolve, - for standard input (default), or codes to resolve")
+    parser.add_argument("--errors-db", default=CONFIG.LOCAL_ERRORS_DATABASE_PATH, help="Errors database (JSON file, or folder of shards)")
+    parser.add_argument("--short-codes-db", default=CONFIG.LOCAL_SHORT_CODES_DATABASE_PATH, help="Short codes database")
+    parser.add_argument("--format", choices=("text", "jsonl"), default="text", help="Output format (default : text)")
+    parser.add_argument("--only-matches", action="store_true", help="Only output the lines holding codes")
+    parser.add_argument("--jobs", "-j", type=int, default=1, help="Number of worker processes, 0 for one per core (default : 1)")
+    parser.add_argument("--quiet", "-q", action="store_true", help="Don't report throughput on standard error")
+    args = parser.parse_args()
+
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    initArgs = (args.errors_db, args.short_codes_db, args.format, args.only_matches)
+    _initWorker(*initArgs) #Loads the databases once, so that forked workers don't have to
+    if _compiledDb == None:
+        print(f"Failed to load errors database '{args.errors_db}'.", file=sys.stderr)
+        return 1
+    if not _scDb.IsValidDatabaseLoaded():
+        print(f"Failed to load short codes database '{args.short_codes_db}' - short codes won't be resolved.", file=sys.stderr)
+
+    sys.stdout.reconfigure(encoding="utf-8", errors="replace") #Descriptions aren't always ASCII, whatever the locale is
+    start = time.perf_counter()
+    linesCount = codesCount = 0
+    try:
+        for output, blockLines, blockCodes in resolveTasks(getTasks(args.inputs), jobs, initArgs):
+            sys.stdout.write(output)
+            linesCount += blockLines
+            codesCount += blockCodes
+        sys.stdout.flush()
+    except BrokenPipeError: #i.e. piped into head - stdout is redirected so that flushing it at exit doesn't fail again
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 0
+    except OSError as e:
+        print(f"Failed to read input ({e}).", file=sys.stderr)
+        return 1
+
+    duration = time.perf_counter() - start
+    if not args.quiet:
+        print(f"Resolved {codesCount} codes in {linesCount} lines in {duration:.2f}s with {jobs} job(s) : "
+            f"{linesCount / duration if duration > 0 else 0:.0f} lines/s.", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
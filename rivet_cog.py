@@ -1,30 +1,79 @@
 import os
+import json
+import time
+import random
+import io
+import asyncio
+import codecs
 import discord
 from hashlib import sha1
 from discord.ext import commands
-from dataclasses import dataclass
+from dataclasses import dataclass, replace as dataclass_replace
 from re import findall as regexp_findall
-from requests import get as make_http_request
-from requests.exceptions import MissingSchema, InvalidSchema, HTTPError
 
 import errorsDatabase
+import binaryDatabase
+import codeResolver
+import shardedDatabase
+import lazyDatabase
+import merkleTree
+from httpBackend import HTTPBackend, HTTPError
+from lruCache import LRUCache
+from metrics import BotMetrics, MetricsServer
+from lookupApi import LookupApiServer
+from profiler import SamplingProfiler, AllocationTracer, profileCall
+from nameIndex import NameIndex
+from searchIndex import SearchIndex
 from shortCodesDatabase import SCDatabase
 import SECRETS #WHITELIST
 
 SHA1_ALL_ZEROES =  "0000000000000000000000000000000000000000"
+DISCORD_MESSAGE_MAX_LENGTH = 2000 #Longer replies are sent as files
+MAX_PROFILING_DURATION = 60 #Maximum duration of a sampling profile, in seconds
+MAX_PROFILING_LOOKUPS = 100000 #Maximum number of lookups of a profiled error_code batch
+MAX_MERGE_SOURCES = 8 #Maximum number of databases merge_err_db merges at once
 
-@dataclass
+#Values of the optional overwrite argument of merge_err_db - the ones discord.py accepts for bool arguments
+_BOOLEAN_ARGUMENTS = {"yes" : True, "y" : True, "true" : True, "t" : True, "1" : True, "enable" : True, "on" : True,
+    "no" : False, "n" : False, "false" : False, "f" : False, "0" : False, "disable" : False, "off" : False}
+
+#Holders are snapshots of a database and of everything derived from it : they are never modified.
+#To change a database, a new holder is built (off the event loop if it is expensive), then published by replacing the cog's reference to the holder.
+#Readers only ever dereference the cog's holder once, so they always see a consistent database without having to lock anything.
+#The content of the errors database is identified by the root hash of its Merkle tree (see merkleTree.py) : it doesn't depend on the format of the
+#file the database was loaded from, and is only hashed again for the facilities which changed.
+@dataclass(frozen=True)
 class ErrDBHolder:
-    sha1 : str
+    merkleTree : merkleTree.MerkleTree #None if the database couldn't be loaded
     localPath : str
     remotePath : str
     databaseObject : errorsDatabase.Database
+    compiledObject : errorsDatabase.CompiledDatabase
+    gitBlobSha : str = None #Git blob SHA-1 of the local file the live database was loaded from, None if the live database doesn't match any file
+    snapshotPath : str = None #Local path of the binary snapshot compiled from the local file - None if snapshots are disabled
+    nameIndex : NameIndex = None #Reverse (name -> code) index of the database
+    searchIndex : SearchIndex = None #Full-text index of the descriptions of the database
+    shardManifest : dict = None #shardedDatabase.Manifest of the shards the live database is made of, None if it wasn't loaded from shards.
+                                #gitBlobSha is then the one of the manifest file.
 
-@dataclass
+    @property
+    def rootHash(self) -> str:
+        return self.merkleTree.rootHash if self.merkleTree != None else None
+
+@dataclass(frozen=True)
 class SCDBHolder:
     localPath : str
     remotePath : str
     databaseObject : SCDatabase
+    gitBlobSha : str = None #Git blob SHA-1 of the local file the live database was loaded from
+
+#Information about a file of the remote repository, as given by its directory listing
+@dataclass
+class RemoteFileInfo:
+    path : str
+    gitBlobSha : str    #SHA-1 of the file as a Git blob object (see _getGitBlobShaOfDataSync)
+    size : int
+    downloadURL : str
 
 @dataclass
 class RivetCogInitParam:
@@ -34,6 +83,57 @@ class RivetCogInitParam:
     errorsDB_remotePath : str       #Path on the remote repository where the errors database is stored
     shortCodesDB_localPath : str    #Local path where the short codes database should be stored
     shortCodesDB_remotePath : str   #Path on the remote repository where the short codes database is stored
+    errorsDB_snapshotPath : str = None  #Local path where the binary snapshot of the errors database should be stored - None or empty to disable snapshots
+    errorsDB_remoteShardsPath : str = None  #Folder of the remote repository holding the sharded errors database - None to use the monolithic database
+    errorsDB_localShardsPath : str = None   #Local folder where the shards of the errors database should be stored
+    errorsDB_indexPath : str = None             #Local path where the offset index of the errors database should be stored, when it is loaded lazily
+    errorsDB_maxResidentFacilities : int = 0    #Maximum number of facilities of the errors database kept decoded - 0 loads the whole database
+    responseCacheSize : int = 256   #Maximum number of error_code responses kept in cache
+    httpTimeout : float = 30.0      #Timeout of HTTP requests, in seconds
+    autoRefreshInterval : float = 0.0       #Delay between two checks of the remote repository for new databases, in seconds - 0 disables auto-refresh
+    autoRefreshJitter : float = 0.1         #Random fraction of the interval added to each delay, so that multiple bots don't poll in lockstep
+    autoRefreshMaxBackoff : float = 86400.0 #Maximum delay between two checks when they keep failing, in seconds
+    metricsHost : str = "127.0.0.1" #Address the metrics listener binds to
+    metricsPort : int = 0           #Port of the local HTTP listener serving metrics in the Prometheus format - 0 disables metrics
+    lookupApiHost : str = "127.0.0.1"   #Address the lookup API binds to
+    lookupApiPort : int = 0             #Port of the HTTP JSON API serving lookups to other tools (see lookupApi.py) - 0 disables the API
+    mergeSourcesPath : str = None   #Local folder merge_err_db may read databases from - None or empty to only merge from URLs
+
+#Where the shards of the errors database are, when the sharded layout is used (see shardedDatabase.py)
+@dataclass
+class ShardedLayout:
+    remotePath : str    #Folder of the remote repository, "" for its root
+    localPath : str
+
+    def getRemotePath(self, fileName : str) -> str:
+        return f"{self.remotePath}/{fileName}" if self.remotePath else fileName
+
+#Lazy loading of the errors database (see lazyDatabase.py) : facilities are only decoded when looked up, and only the most recently used ones are kept.
+#The offset index is only used if snapshots are disabled - snapshots have a facility table of their own.
+@dataclass
+class LazyLoading:
+    indexPath : str
+    maxResidentFacilities : int
+
+@dataclass
+class AutoRefreshState:
+    interval : float
+    jitter : float
+    maxBackoff : float
+    task : asyncio.Task = None
+    lastSuccessTime : float = None  #time.time() of the last successful check
+    lastFailure : str = None        #Reason of the last failed check
+    failuresCount : int = 0         #Number of consecutive failed checks
+
+#Stand-in for a command context, used when the bot updates itself : messages go to stdout instead of a channel
+class _ConsoleContext:
+    __slots__ = ["prefix"]
+
+    def __init__(self, prefix : str) -> None:
+        self.prefix : str = prefix
+
+    async def send(self, content = None, **kwargs):
+        print(f"{self.prefix} {content}")
 
 async def _getSha1OfData(data : bytes) -> str:
     sha1Ctx = sha1()
@@ -63,6 +163,296 @@ def _getSha1OfFileSync(path : str) -> str:
     fh.close()
     return ret
 
+#Git identifies files by the SHA-1 of "blob <size>\0<content>" - this is the hash the GitHub contents API returns
+def _getGitBlobShaOfDataSync(data : bytes) -> str:
+    sha1Ctx = sha1()
+    sha1Ctx.update(b"blob %d\0" % len(data))
+    sha1Ctx.update(data)
+    return sha1Ctx.hexdigest().lower()
+
+def _getGitBlobShaOfFileSync(path : str) -> str:
+    try:
+        fh = open(path, "rb")
+    except IOError:
+        return None
+    ret = _getGitBlobShaOfDataSync(fh.read())
+    fh.close()
+    return ret
+
+def _getErrorsCount(db : errorsDatabase.Database) -> int:
+    #Lazily loaded databases know it without decoding every facility
+    if isinstance(db, (lazyDatabase.LazyDatabase, binaryDatabase.MappedDatabase, errorsDatabase.OverlayDatabase)):
+        return db.getErrorsCount()
+    return sum(len(facilityObj.errors) for facilityObj in db.values())
+
+#Loads the errors database stored at localPath. This is blocking, so the bot runs it in a worker thread.
+#If snapshotPath is set, the database is served from a memory-mapped binary snapshot of the local file, which is (re)compiled if it is missing or out of date.
+#The returned holder has no databaseObject if loading failed.
+#If lazyLoading is set, facilities are decoded from the snapshot, or from the local file through its offset index, as they are looked up.
+#The name and full-text indexes of lazily loaded databases and of snapshots aren't built here, since that would decode every facility
+#(see RivetCog.__getIndexedErrorsDB()).
+#If metrics are provided, the duration of the load is recorded in them.
+def _loadErrorsDatabaseSync(localPath : str, remotePath : str, snapshotPath : str = None, lazyLoading : LazyLoading = None,
+    metrics : BotMetrics = None) -> ErrDBHolder:
+    start = time.perf_counter()
+    maxResidentFacilities = lazyLoading.maxResidentFacilities if lazyLoading != None else 0
+    if snapshotPath:
+        snapshot = binaryDatabase.openSnapshotIfUpToDate(snapshotPath, localPath, maxResidentFacilities)
+        if snapshot != None: #Fast path - the JSON file doesn't even need to be read
+            sourceGitBlobSha = snapshot.getSourceInfo()[3]
+            tree = merkleTree.getMerkleTreeFromHashes(snapshot.getFacilityHashes())
+            if metrics != None:
+                metrics.observeDatabaseOperation("errors", "open_snapshot", start, os.path.getsize(snapshotPath))
+                metrics.databaseEntries.set(("errors",), _getErrorsCount(snapshot))
+            return ErrDBHolder(tree, localPath, remotePath, snapshot, errorsDatabase.CompiledDatabase(snapshot, lazy=True),
+                sourceGitBlobSha.hex(), snapshotPath)
+    elif lazyLoading != None:
+        db = lazyDatabase.openLazyDatabase(localPath, lazyLoading.indexPath, lazyLoading.maxResidentFacilities)
+        if db == None:
+            return ErrDBHolder(None, localPath, remotePath, None, None, None, snapshotPath)
+        sourceGitBlobSha = db.getSourceInfo()[3]
+        if metrics != None:
+            metrics.observeDatabaseOperation("errors", "open_lazy", start)
+            metrics.databaseEntries.set(("errors",), _getErrorsCount(db))
+        return ErrDBHolder(merkleTree.getMerkleTreeFromHashes(db.getFacilityHashes()), localPath, remotePath, db, errorsDatabase.CompiledDatabase(db, lazy=True),
+            sourceGitBlobSha, snapshotPath)
+
+    try:
+        fh = open(localPath, "rb")
+    except IOError:
+        print(f"Failed to open '{localPath}' for reading.")
+        return ErrDBHolder(None, localPath, remotePath, None, None, None, snapshotPath)
+
+    #The file is hashed and parsed chunk by chunk as it is read, so its whole content is never held in memory
+    with fh:
+        fileSize = os.fstat(fh.fileno()).st_size
+        sha1Ctx = sha1()
+        gitBlobCtx = sha1(b"blob %d\0" % fileSize)
+        utf8Decoder = codecs.getincrementaldecoder("utf-8")()
+        parser = errorsDatabase.DatabaseStreamParser()
+        parsing = True #Cleared once the file is known to be invalid - it still has to be hashed entirely
+        while True:
+            chunk = fh.read(errorsDatabase.FILE_CHUNK_SIZE)
+            sha1Ctx.update(chunk)
+            gitBlobCtx.update(chunk)
+            if parsing:
+                try:
+                    parsing = parser.feed(utf8Decoder.decode(chunk, final = not chunk))
+                except UnicodeDecodeError:
+                    print(f"Failed to decode '{localPath}' as UTF-8.")
+                    parsing = False
+            if not chunk:
+                break
+    db = parser.close() if parsing else None
+    dataSha1 = sha1Ctx.hexdigest().lower()
+    dataGitBlobSha = gitBlobCtx.hexdigest().lower()
+    if db == None:
+        return ErrDBHolder(None, localPath, remotePath, None, None, dataGitBlobSha, snapshotPath)
+    if metrics != None:
+        metrics.observeDatabaseOperation("errors", "parse", start, fileSize)
+        metrics.databaseEntries.set(("errors",), _getErrorsCount(db))
+    start = time.perf_counter()
+    tree = merkleTree.buildMerkleTree(db)
+    if metrics != None:
+        metrics.observeDatabaseOperation("errors", "hash", start)
+
+    if snapshotPath:
+        #Compile the snapshot for the next loads, and serve this database from it too - it stores the hashes of the facilities
+        sourceInfo = binaryDatabase.getSourceInfoOfFile(localPath, dataSha1, dataGitBlobSha)
+        if binaryDatabase.writeSnapshotFile(db, sourceInfo, snapshotPath, tree.facilityHashes):
+            snapshot = binaryDatabase.openSnapshotIfUpToDate(snapshotPath, localPath, maxResidentFacilities)
+            if snapshot != None:
+                db = snapshot
+                tree = merkleTree.getMerkleTreeFromHashes(tree.facilityHashes) #The hashed facilities aren't the ones of the snapshot
+
+    if isinstance(db, binaryDatabase.MappedDatabase):
+        return ErrDBHolder(tree, localPath, remotePath, db, errorsDatabase.CompiledDatabase(db, lazy=True), dataGitBlobSha, snapshotPath)
+    return ErrDBHolder(tree, localPath, remotePath, db, errorsDatabase.CompiledDatabase(db, lazy=bool(snapshotPath)), dataGitBlobSha, snapshotPath,
+        NameIndex(db), SearchIndex(db))
+
+#Loads the errors database from the local shards in shardsPath - see _loadErrorsDatabaseSync()
+def _loadShardedErrorsDatabaseSync(shardsPath : str, localPath : str, remotePath : str, snapshotPath : str = None, metrics : BotMetrics = None) -> ErrDBHolder:
+    start = time.perf_counter()
+    loaded = shardedDatabase.loadShardedDatabase(shardsPath)
+    if loaded == None:
+        return ErrDBHolder(None, localPath, remotePath, None, None, None, snapshotPath)
+
+    db, manifest, manifestData = loaded
+    if metrics != None:
+        metrics.observeDatabaseOperation("errors", "parse_shards", start)
+        metrics.databaseEntries.set(("errors",), _getErrorsCount(db))
+    return ErrDBHolder(merkleTree.buildMerkleTree(db), localPath, remotePath, db, errorsDatabase.CompiledDatabase(db), _getGitBlobShaOfDataSync(manifestData),
+        snapshotPath, NameIndex(db), SearchIndex(db), manifest)
+
+#Loads the local copy of the errors database : from the local shards if the sharded layout is used and they exist, from the local file otherwise
+#Shards are always loaded entirely.
+def _loadLocalErrorsDatabaseSync(localPath : str, remotePath : str, snapshotPath : str, lazyLoading : LazyLoading, shardedLayout : ShardedLayout,
+    metrics : BotMetrics = None) -> ErrDBHolder:
+    if shardedLayout != None and os.path.isfile(os.path.join(shardedLayout.localPath, shardedDatabase.MANIFEST_FILE_NAME)):
+        return _loadShardedErrorsDatabaseSync(shardedLayout.localPath, localPath, remotePath, snapshotPath, metrics)
+    return _loadErrorsDatabaseSync(localPath, remotePath, snapshotPath, lazyLoading, metrics)
+
+#Replaces the facilities of the changed shards in the database of a holder, and stores the shards locally. This is blocking, so the bot runs it in a worker thread.
+#shardsData maps the number of every changed facility to the content of its shard. Returns a new holder on success, None otherwise.
+def _applyErrorsShardsSync(holder : ErrDBHolder, shardsPath : str, manifest : dict, manifestData : bytes, shardsData : dict, metrics : BotMetrics = None) -> ErrDBHolder:
+    start = time.perf_counter()
+    newFacilities = dict()
+    for facilityNum, data in shardsData.items():
+        facilityObj = shardedDatabase.getFacilityFromShardData(facilityNum, data)
+        if facilityObj == None:
+            return None
+        newFacilities[facilityNum] = facilityObj
+    newDb = shardedDatabase.getUpdatedDatabase(holder.databaseObject, manifest, newFacilities)
+
+    previousManifest = holder.shardManifest if holder.shardManifest != None else dict()
+    fileNames = {info.fileName for info in manifest.values()}
+    staleFileNames = [info.fileName for info in previousManifest.values() if info.fileName not in fileNames]
+    if not shardedDatabase.writeShards(shardsPath, {manifest[facilityNum].fileName : data for facilityNum, data in shardsData.items()}, manifestData, staleFileNames):
+        return None
+    if metrics != None:
+        metrics.observeDatabaseOperation("errors", "apply_shards", start, sum(len(data) for data in shardsData.values()))
+        metrics.databaseEntries.set(("errors",), _getErrorsCount(newDb))
+
+    #Only the facilities of the changed shards need to be hashed, compiled and indexed again
+    return ErrDBHolder(merkleTree.buildMerkleTree(newDb, holder.merkleTree), holder.localPath, holder.remotePath, newDb, errorsDatabase.CompiledDatabase(newDb, previous=holder.compiledObject),
+        _getGitBlobShaOfDataSync(manifestData), holder.snapshotPath, NameIndex(newDb, holder.nameIndex), SearchIndex(newDb), manifest)
+
+#Stores the database of a holder as the local shards in shardsPath, replacing the ones stored there. This is blocking, so the bot runs it in a worker thread.
+#Returns a new holder tracking the written shards on success, None otherwise. The content of the database is unchanged, and so is its root hash.
+def _saveErrorsShardsSync(holder : ErrDBHolder, shardsPath : str) -> ErrDBHolder:
+    split = shardedDatabase.splitDatabase(holder.databaseObject)
+    if split == None:
+        return None
+    manifest, shardsData = split
+    manifestData = shardedDatabase.getManifestData(manifest)
+
+    #The shards of a database which wasn't loaded from them may still be lying around
+    previous = shardedDatabase.loadManifest(shardsPath) if holder.shardManifest == None and \
+        os.path.isfile(os.path.join(shardsPath, shardedDatabase.MANIFEST_FILE_NAME)) else None
+    previousManifest = holder.shardManifest if holder.shardManifest != None else (previous[0] if previous != None else dict())
+    staleFileNames = [info.fileName for info in previousManifest.values() if info.fileName not in shardsData]
+    if not shardedDatabase.writeShards(shardsPath, shardsData, manifestData, staleFileNames):
+        return None
+    return dataclass_replace(holder, gitBlobSha = _getGitBlobShaOfDataSync(manifestData), shardManifest = manifest)
+
+#Returns the content of the JSON file of an errors database, or None if it couldn't be serialized. This is blocking (and decodes every facility
+#of lazily loaded databases), so the bot runs it in a worker thread.
+def _getErrorsDatabaseDataSync(db : errorsDatabase.Database, metrics : BotMetrics = None) -> bytes:
+    start = time.perf_counter()
+    dbJSON = errorsDatabase.getJSONStringFromDatabase(db)
+    if dbJSON == None:
+        return None
+    data = dbJSON.encode("utf-8")
+    if metrics != None:
+        metrics.observeDatabaseOperation("errors", "serialize", start, len(data))
+    return data
+
+#Merges errors databases into the database of a holder, in a single pass (see errorsDatabase.getMultiMergedDatabases()).
+#This is blocking, so the bot runs it in a worker thread.
+#Returns (new holder, list of errorsDatabase.MergeConflict) on success, None otherwise - the source holder is left untouched in both cases.
+def _mergeErrorsDatabasesSync(holder : ErrDBHolder, appendedDbs : list, overwrite : bool, metrics : BotMetrics = None) -> tuple:
+    start = time.perf_counter()
+    merged = errorsDatabase.getMultiMergedDatabases(holder.databaseObject, appendedDbs, overwrite)
+    if merged == None:
+        return None
+    newDb, conflicts = merged
+    if metrics != None:
+        metrics.observeDatabaseOperation("errors", "merge", start)
+    #Facilities the merge left untouched are shared with the live database, so only the ones it created are hashed
+    #Merges into lazily loaded databases only hold those, which spares decoding the others
+    start = time.perf_counter()
+    if isinstance(newDb, errorsDatabase.OverlayDatabase):
+        tree = merkleTree.updateMerkleTree(holder.merkleTree, newDb.facilities)
+    else:
+        tree = merkleTree.buildMerkleTree(newDb, holder.merkleTree)
+    if metrics != None:
+        metrics.observeDatabaseOperation("errors", "hash", start)
+        metrics.databaseEntries.set(("errors",), _getErrorsCount(newDb))
+
+    #The live database no longer matches the local file, hence no Git blob SHA-1
+    #Only the facilities the merge created need to be compiled again - lazily compiled databases stay lazy.
+    #The name and full-text indexes are built again on first use (see RivetCog.__getIndexedErrorsDB()).
+    #If the database was made of shards, the shards of the facilities the merge left untouched still match it
+    shardManifest = None
+    if holder.shardManifest != None:
+        shardManifest = {facilityNum : info for facilityNum, info in holder.shardManifest.items() if newDb.get(facilityNum) is holder.databaseObject.get(facilityNum)}
+    return (ErrDBHolder(tree, holder.localPath, holder.remotePath,
+        newDb, errorsDatabase.CompiledDatabase(newDb, lazy=holder.compiledObject.lazy, previous=holder.compiledObject), None,
+        holder.snapshotPath, shardManifest=shardManifest), conflicts)
+
+#Returns the (summary, report) of the structural diff between the databases of two holders, or None if one of them isn't loaded.
+#Only the facilities whose hashes differ are compared (see merkleTree.getDatabaseDiff()). Lazily loaded ones are decoded, hence the worker thread.
+def _getErrorsDatabaseDiffSync(oldHolder : ErrDBHolder, newHolder : ErrDBHolder) -> tuple:
+    if oldHolder.merkleTree == None or newHolder.merkleTree == None:
+        return None
+    diffs = merkleTree.getDatabaseDiff(oldHolder.databaseObject, oldHolder.merkleTree, newHolder.databaseObject, newHolder.merkleTree)
+    return (merkleTree.getDiffSummary(diffs), merkleTree.getDiffReport(diffs))
+
+#Returns the report of the conflicts of a merge, sourceNames being the names of the merged sources by index (0 being the live database)
+def _getMergeConflictsReport(conflicts : list, sourceNames : list) -> str:
+    def formatValue(value) -> str:
+        if isinstance(value, list): #Blacklist
+            return ", ".join(f"0x{entry.min:04X}-0x{entry.max:04X}" for entry in value) if len(value) != 0 else "(empty)"
+        return json.dumps(value, ensure_ascii=False)
+
+    lines = ["Sources :"] + [f"  [{sourceIdx}] {name}" for sourceIdx, name in enumerate(sourceNames)] + [""]
+    for conflict in conflicts:
+        where = f"Facility 0x{conflict.facilityNum:03X}" + (f" error 0x{conflict.errorNum:04X}" if conflict.errorNum != None else "")
+        lines.append(f"{where} {conflict.field} :")
+        for i, (sourceIdx, value) in enumerate(conflict.values):
+            lines.append(f"  {'kept   ' if i == 0 else 'dropped'} [{sourceIdx}] {formatValue(value)}")
+    return "\n".join(lines) + "\n"
+
+#Returns the path of a local merge source, which must be a relative path inside folder, or None if it isn't one.
+#Absolute paths and ".." are rejected outright, and symbolic links may not lead outside of folder either.
+def _getMergeSourcePath(folder : str, source : str) -> str:
+    if source == "" or os.path.isabs(source) or os.path.splitdrive(source)[0] != "" or source.startswith(("/", "\\")) or ".." in source.replace("\\", "/").split("/"):
+        return None
+    folder = os.path.realpath(folder)
+    path = os.path.realpath(os.path.join(folder, source))
+    if os.path.commonpath([folder, path]) != folder or path == folder:
+        return None
+    return path
+
+#Loads the short codes database stored at localPath. This is blocking, so the bot runs it in a worker thread.
+def _loadShortCodesDatabaseSync(localPath : str, remotePath : str, metrics : BotMetrics = None) -> SCDBHolder:
+    start = time.perf_counter()
+    scDb = SCDatabase()
+    if scDb.LoadFromFile(localPath) and metrics != None:
+        metrics.observeDatabaseOperation("short_codes", "parse", start, len(scDb.GetDatabaseAsBytes()))
+        metrics.databaseEntries.set(("short_codes",), len(scDb.codes))
+    return SCDBHolder(localPath, remotePath, scDb, _getGitBlobShaOfFileSync(localPath))
+
+#Returns count error_code inputs for profiling : mostly codes of the database, as users would type them, and some random values
+def _getProfilingInputs(db : errorsDatabase.Database, count : int) -> list:
+    rng = random.Random(0)
+    knownCodes = [errorsDatabase.IS_ERROR_MASK | (facilityNum << 16) | errorNum for facilityNum, facilityObj in db.items() for errorNum in facilityObj.errors.keys()]
+    inputs = list()
+    for i in range(count):
+        code = rng.choice(knownCodes) if (len(knownCodes) != 0 and i % 4 != 3) else rng.getrandbits(32)
+        inputs.append(f"0X{code:08X}")
+    return inputs
+
+#Resolves a batch of error_code inputs, the way the command does (without the cache)
+def _resolveErrorCodesSync(compiledDb : errorsDatabase.CompiledDatabase, scDb : SCDatabase, inputs : list) -> None:
+    for input_str in inputs:
+        codeResolver.getErrorCodeResponse(compiledDb, scDb, input_str)
+
+#Parses a downloaded errors database and merges it into the database of a holder, like merge_err_db does (the result is discarded)
+def _parseAndMergeErrorsDatabaseSync(holder : ErrDBHolder, content : bytes) -> ErrDBHolder:
+    try:
+        appendedDb = errorsDatabase.getDatabaseFromJSONString(content.decode("utf-8"))
+    except UnicodeDecodeError:
+        return None
+    if appendedDb == None:
+        return None
+    merged = _mergeErrorsDatabasesSync(holder, [appendedDb], False)
+    return merged[0] if merged != None else None
+
+#Runs a blocking function in a worker thread, so that the event loop stays responsive
+async def _runInWorkerThread(function, *args):
+    return await asyncio.get_event_loop().run_in_executor(None, function, *args)
+
 async def isWhitelisted(ctx):
     return ctx.author.id in SECRETS.WHITELIST
 
@@ -70,7 +460,7 @@ async def isWhitelisted(ctx):
 #This allows you to use a non-GitHub service for the database
 #Implementation of such methods is left over to the reader
 class APIContractor:
-    __slots__ = ["apiUrl", "apiTarget"]
+    __slots__ = ["apiUrl", "apiTarget", "httpBackend", "listingsCache"]
 
     REMOTE_API_TARGET_INVALID = -1
     REMOTE_API_TARGET_GITHUB = 0
@@ -83,78 +473,130 @@ class APIContractor:
             return "https://api.github.com/repos/" + s[0] + "/"
 
     #Can raise ValueError if the apiTarget is invalid
-    def __init__(self, remoteUrl : str, apiTarget : int = REMOTE_API_TARGET_GITHUB) -> None:
+    def __init__(self, remoteUrl : str, apiTarget : int = REMOTE_API_TARGET_GITHUB, httpTimeout : float = 30.0) -> None:
         self.apiTarget : int = apiTarget
+        self.httpBackend : HTTPBackend = HTTPBackend(httpTimeout)
+        self.listingsCache : dict = dict()  #API URL -> (ETag, decoded JSON) of the last listing received
         if (self.apiTarget == self.REMOTE_API_TARGET_GITHUB):
             self.apiUrl = self.__generateApiUrlForGitHub(remoteUrl)
         else:
             self.apiTarget = self.REMOTE_API_TARGET_INVALID
             raise ValueError("Unknown API target !")
 
-    #May raise a HTTPError or ValueError or FileNotFoundError in case something goes wrong : print exception.args[0] in such cases
-    def getContentOfFileAtPath(self, remotePath : str) -> bytes:
-        if (self.apiTarget == self.REMOTE_API_TARGET_GITHUB):
-            #We need to get content of the folder our database is in
-            #Everything before the last / are folders, everything after is the filename
-            slashIdx = remotePath.rfind("/")
-            if slashIdx == -1: #No / found
-                remoteDbName = remotePath
-                apiRequestURL = self.apiUrl + "contents/"
-            else:
-                remoteDbName = remotePath[slashIdx + 1:] #+1 to skip the /
-                apiRequestURL = self.apiUrl + f"contents/{remotePath[:slashIdx]}"
-
-            req = make_http_request(apiRequestURL, headers={"Accept": "application/vnd.github.v3+json"})
-            if req.status_code != 200:
-                raise HTTPError(f"Failed to fetch API (`{apiRequestURL}` - got HTTP Status {req.status_code}.")
+    #Conditional GET of a JSON API response : if the remote answers 304, the previously decoded response is returned
+    async def __getJSONFromAPI(self, apiRequestURL : str):
+        cached = self.listingsCache.get(apiRequestURL)
+        req = await self.httpBackend.get(apiRequestURL, headers={"Accept": "application/vnd.github.v3+json"},
+            etag=cached[0] if cached != None else None)
+        if req.status == 304 and cached != None:
+            return cached[1]
+        if req.status != 200:
+            raise HTTPError(f"Failed to fetch API (`{apiRequestURL}` - got HTTP Status {req.status}.")
 
-            try:
-                jsonData = req.json()
-            except ValueError:
-                raise ValueError(f"Failed to decode API response as JSON :\n{req.content}")
+        try:
+            jsonData = json.loads(req.content)
+        except ValueError:
+            raise ValueError(f"Failed to decode API response as JSON :\n{req.content}")
 
-            downloadURL = None
+        if req.etag != None:
+            self.listingsCache[apiRequestURL] = (req.etag, jsonData)
+        return jsonData
 
-            for data in jsonData:
-                filename = data.get('name')
-                if filename == None or filename != remoteDbName:
-                    continue
+    #Returns information about the files at the given remote paths - paths which don't exist on the remote are absent from the returned dict.
+    #Each folder is listed only once, no matter how many of the paths it contains.
+    #May raise a HTTPError or ValueError in case something goes wrong : print exception.args[0] in such cases
+    async def getRemoteFilesInfo(self, remotePaths : list) -> dict:
+        if (self.apiTarget == self.REMOTE_API_TARGET_GITHUB):
+            #We need to get content of the folders our databases are in
+            #Everything before the last / are folders, everything after is the filename
+            filesPerFolder = dict()
+            for remotePath in remotePaths:
+                slashIdx = remotePath.rfind("/")
+                if slashIdx == -1: #No / found
+                    filesPerFolder.setdefault("", dict())[remotePath] = remotePath
                 else:
-                    downloadURL = data.get("download_url")
-                    break
-
-            if downloadURL == None:
-                raise FileNotFoundError(f"Failed to find file `{remoteDbName}` on remote repository.")
-        
-            req = make_http_request(downloadURL)
-            if req.status_code != 200:
-                raise HTTPError(f"Failed to download file from remote - got HTTP Status {req.status_code}.")
-            
-            return req.content
+                    filesPerFolder.setdefault(remotePath[:slashIdx], dict())[remotePath[slashIdx + 1:]] = remotePath #+1 to skip the /
+
+            ret = dict()
+            for folder, wantedFiles in filesPerFolder.items():
+                jsonData = await self.__getJSONFromAPI(self.apiUrl + f"contents/{folder}")
+                for data in jsonData:
+                    remotePath = wantedFiles.get(data.get('name'))
+                    if remotePath != None:
+                        ret[remotePath] = RemoteFileInfo(remotePath, data.get("sha"), data.get("size"), data.get("download_url"))
+            return ret
         else: #Not a known target
             raise ValueError("Unknown API target !")
 
+    #May raise a HTTPError or ValueError in case something goes wrong : print exception.args[0] in such cases
+    async def downloadRemoteFile(self, fileInfo : RemoteFileInfo) -> bytes:
+        if fileInfo.downloadURL == None:
+            raise ValueError(f"No download URL for file `{fileInfo.path}` on remote repository.")
+        req = await self.httpBackend.get(fileInfo.downloadURL)
+        if req.status != 200:
+            raise HTTPError(f"Failed to download file from remote - got HTTP Status {req.status}.")
+        return req.content
+
+    #May raise a HTTPError or ValueError or FileNotFoundError in case something goes wrong : print exception.args[0] in such cases
+    async def getContentOfFileAtPath(self, remotePath : str) -> bytes:
+        fileInfo = (await self.getRemoteFilesInfo([remotePath])).get(remotePath)
+        if fileInfo == None:
+            raise FileNotFoundError(f"Failed to find file `{remotePath}` on remote repository.")
+        return await self.downloadRemoteFile(fileInfo)
+
+    #Downloads a file from an arbitrary URL
+    #May raise a HTTPError or ValueError in case something goes wrong : print exception.args[0] in such cases
+    async def getContentOfFileAtURL(self, url : str) -> bytes:
+        req = await self.httpBackend.get(url)
+        if req.status != 200:
+            raise HTTPError(f"Failed to download database - got HTTP Status {req.status}.")
+        return req.content
+
 class RivetCog(APIContractor, commands.Cog):
-    __slots__ = ["bot", "errorsDB", "shortCodesDB", "whitelist"]
+    __slots__ = ["bot", "errorsDB", "shortCodesDB", "whitelist", "responseCache", "updateLock", "autoRefresh", "metrics", "metricsServer", "profiling",
+        "shardedLayout", "lazyLoading", "lookupApiServer", "mergeSourcesPath"]
 
     #Returns True if loading the local databases went fine, False otherwise - may raise ValueError
     def __init__(self, bot, initParams : RivetCogInitParam) -> None:
-        APIContractor.__init__(self, initParams.remoteRepositoryURL, initParams.apiTarget)
+        APIContractor.__init__(self, initParams.remoteRepositoryURL, initParams.apiTarget, initParams.httpTimeout)
         self.bot = bot
-        self.errorsDB : ErrDBHolder = ErrDBHolder(SHA1_ALL_ZEROES, initParams.errorsDB_localPath, initParams.errorsDB_remotePath, None)
-        self.shortCodesDB : SCDBHolder = SCDBHolder(initParams.shortCodesDB_localPath, initParams.shortCodesDB_remotePath, SCDatabase())
+        self.responseCache : LRUCache = LRUCache(initParams.responseCacheSize)
+        self.updateLock : asyncio.Lock = asyncio.Lock() #Held while the databases are being updated from the remote
+        self.profiling : bool = False #Set while a profiling session runs - tracemalloc is global, so there can only be one at a time
+        self.autoRefresh : AutoRefreshState = AutoRefreshState(initParams.autoRefreshInterval, initParams.autoRefreshJitter, initParams.autoRefreshMaxBackoff)
+
+        #Metrics are only collected if they are served - otherwise instrumented code only pays for a None check
+        self.metrics : BotMetrics = None
+        self.metricsServer : MetricsServer = None
+        if initParams.metricsPort:
+            self.metrics = BotMetrics()
+            self.metricsServer = MetricsServer(self.metrics, initParams.metricsHost, initParams.metricsPort)
+            self.httpBackend.requestDuration = self.metrics.httpRequestDuration
+
+        #The API reads the holders on every request, so that it always serves the live databases
+        self.lookupApiServer : LookupApiServer = None
+        if initParams.lookupApiPort:
+            self.lookupApiServer = LookupApiServer(lambda: (self.errorsDB, self.shortCodesDB), initParams.lookupApiHost, initParams.lookupApiPort)
+
+        self.shardedLayout : ShardedLayout = None
+        if initParams.errorsDB_remoteShardsPath != None:
+            self.shardedLayout = ShardedLayout(initParams.errorsDB_remoteShardsPath.strip("/"), initParams.errorsDB_localShardsPath)
 
-        #Load local databases
-        self.errorsDB.databaseObject = errorsDatabase.getDatabaseFromJSONFile(self.errorsDB.localPath)
-        self.errorsDB.sha1 = _getSha1OfFileSync(self.errorsDB.localPath)
+        self.mergeSourcesPath : str = initParams.mergeSourcesPath if initParams.mergeSourcesPath else None
 
-        self.shortCodesDB.databaseObject.LoadFromFile(self.shortCodesDB.localPath)
+        self.lazyLoading : LazyLoading = None
+        if initParams.errorsDB_maxResidentFacilities > 0:
+            self.lazyLoading = LazyLoading(initParams.errorsDB_indexPath, initParams.errorsDB_maxResidentFacilities)
+
+        #Load local databases - the event loop isn't running yet, so there is no need for a worker thread
+        self.errorsDB : ErrDBHolder = _loadLocalErrorsDatabaseSync(initParams.errorsDB_localPath, initParams.errorsDB_remotePath, initParams.errorsDB_snapshotPath,
+            self.lazyLoading, self.shardedLayout, self.metrics)
+        self.shortCodesDB : SCDBHolder = _loadShortCodesDatabaseSync(initParams.shortCodesDB_localPath, initParams.shortCodesDB_remotePath, self.metrics)
 
     #Returns True if the update went fine, False otherwise
-    async def __installLocalDatabase(self, localPath : str, fileContent : bytes) -> bool:
-        try: #Backup current db to {NAME}.old
-            os.remove(localPath + ".old")
-            os.rename(localPath, localPath + ".old")
+    def __installLocalDatabaseSync(self, localPath : str, fileContent : bytes) -> bool:
+        try: #Backup current db to {NAME}.old - it is moved rather than overwritten, since the live database may still be mapped from it
+            os.replace(localPath, localPath + ".old")
         except FileNotFoundError:
             pass
         try:
@@ -166,91 +608,156 @@ class RivetCog(APIContractor, commands.Cog):
             print(f"IOError raised when operating on '{localPath}'.")
             return False
 
-    async def __updateErrorsDatabase(self, ctx) -> None:
-        exceptionRaised = False
-        try:
-            remoteDB = APIContractor.getContentOfFileAtPath(self, self.errorsDB.remotePath)
-        except HTTPError as e:
-            await ctx.send(e.args[0])
-            exceptionRaised = True
-        except ValueError as e:
-            await ctx.send(e.args[0])
-            exceptionRaised = True
-        except FileNotFoundError as e:
-            await ctx.send(e.args[0])
-            exceptionRaised = True
-        finally:
-            if exceptionRaised:
-                await ctx.send("❌ Update of errors database failed !")
-                return
+    async def __installLocalDatabase(self, localPath : str, fileContent : bytes) -> bool:
+        return await _runInWorkerThread(self.__installLocalDatabaseSync, localPath, fileContent)
 
-        sha1Ctx = sha1()
-        sha1Ctx.update(remoteDB)
-        remoteDBSha1 = sha1Ctx.hexdigest().lower() #We always store local SHA-1 in lowercase, so we convert just to be sure.
-        await ctx.send(f"```diff\n- Local database SHA-1 :\n- {self.errorsDB.sha1}\n+ Repository database SHA-1 :\n+ {remoteDBSha1}\n```")
-
-        updateFailed = False
-        if (self.errorsDB.sha1 != remoteDBSha1) or self.errorsDB.databaseObject == None: #Force update if currently loaded DB is invalid
-            if await self.__installLocalDatabase(self.errorsDB.localPath, remoteDB):
-                self.errorsDB.sha1 = remoteDBSha1
-                print(f"New errors database SHA-1 : {self.errorsDB.sha1}")
-                self.errorsDB.databaseObject = errorsDatabase.getDatabaseFromJSONFile(self.errorsDB.localPath)
-                if self.errorsDB.databaseObject == None:
-                    await ctx.send("Failed to load new errors database.")
-                    updateFailed = True
-                else:
-                    await ctx.send("🥰 Database updated and reloaded successfully !")
-            else:
-                await ctx.send("Failed to download new database.")
-                updateFailed = True
-        else:
-            await ctx.send("SHA-1 hashes are identical, update is not needed.")
-            
-        if updateFailed:
-            await ctx.send("❌ Update of errors database failed !")
-    
-    async def __updateShortCodesDatabase(self, ctx) -> None:
-        exceptionRaised = False
+    #Returns True if the remote database file needs to be downloaded, i.e. its Git blob SHA-1 differs from the local one
+    async def __isRemoteDatabaseDifferent(self, ctx, dbName : str, remoteFile : RemoteFileInfo, localGitBlobSha : str) -> bool:
+        await ctx.send(f"```diff\n- Local {dbName} database Git blob SHA-1 :\n- {localGitBlobSha}\n+ Repository {dbName} database Git blob SHA-1 :\n+ {remoteFile.gitBlobSha}\n```")
+        if localGitBlobSha != None and localGitBlobSha == remoteFile.gitBlobSha:
+            await ctx.send(f"Git blob SHA-1 hashes of the {dbName} database are identical, update is not needed.")
+            return False
+        return True
+
+    #Returns None if the download failed
+    async def __downloadRemoteDatabase(self, ctx, remoteFile : RemoteFileInfo) -> bytes:
         try:
-            remoteDB = APIContractor.getContentOfFileAtPath(self, self.shortCodesDB.remotePath)
+            remoteDB = await APIContractor.downloadRemoteFile(self, remoteFile)
         except HTTPError as e:
             await ctx.send(e.args[0])
-            exceptionRaised = True
+            return None
         except ValueError as e:
             await ctx.send(e.args[0])
-            exceptionRaised = True
-        except FileNotFoundError as e:
-            await ctx.send(e.args[0])
-            exceptionRaised = True
-        finally:
-            if exceptionRaised:
-                await ctx.send("❌ Update of short codes database failed !")
-                return
+            return None
 
-        sha1Ctx = sha1()
-        sha1Ctx.update(remoteDB)
-        remoteDBSha1 = sha1Ctx.hexdigest().lower() #We always store local SHA-1 in lowercase, so we convert just to be sure.
-        localSha1 = self.shortCodesDB.databaseObject.GetDBSha1()
-        await ctx.send(f"```diff\n- Local database SHA-1 :\n- {localSha1}\n+ Repository database SHA-1 :\n+ {remoteDBSha1}\n```")
-
-        updateFailed = False
-        if (localSha1 != remoteDBSha1) or self.shortCodesDB.databaseObject == None: #Force update if currently loaded DB is invalid
-            if await self.__installLocalDatabase(self.shortCodesDB.localPath, remoteDB):
-                print(f"New database SHA-1 should be {remoteDBSha1}.")
-                if not self.shortCodesDB.databaseObject.LoadFromFile(self.shortCodesDB.localPath):
-                    await ctx.send("Failed to load new database.")
-                    updateFailed = True
-                else:
-                    await ctx.send("🥰 Database updated and reloaded successfully !")
-                    print(f"New database SHA-1 (from object) is {self.shortCodesDB.databaseObject.GetDBSha1()}.")
-            else:
-                await ctx.send("Failed to download new database.")
-                updateFailed = True
+        if _getGitBlobShaOfDataSync(remoteDB) != remoteFile.gitBlobSha:
+            await ctx.send("Downloaded file doesn't match the repository's Git blob SHA-1.")
+            return None
+        return remoteDB
+
+    #Sends what changed between the databases of two holders - as a file if it doesn't fit in a message
+    async def __sendErrorsDatabaseDiff(self, ctx, oldHolder : ErrDBHolder, newHolder : ErrDBHolder) -> None:
+        diff = await _runInWorkerThread(_getErrorsDatabaseDiffSync, oldHolder, newHolder)
+        if diff == None:
+            return
+        summary, report = diff
+        if oldHolder.rootHash == newHolder.rootHash:
+            await ctx.send(f"Root hash `{newHolder.rootHash}` is unchanged : the content of the errors database is identical.")
+            return
+        message = f"Root hash `{oldHolder.rootHash}` -> `{newHolder.rootHash}`\n{summary}\n```diff\n{report}\n```"
+        if len(message) <= DISCORD_MESSAGE_MAX_LENGTH:
+            await ctx.send(message)
         else:
-            await ctx.send("SHA-1 hashes are identical, update is not needed.")
-            
-        if updateFailed:
-            await ctx.send("❌ Update of short codes database failed !")
+            await ctx.send(f"Root hash `{oldHolder.rootHash}` -> `{newHolder.rootHash}`\n{summary}",
+                file=discord.File(io.BytesIO(report.encode("utf-8")), filename="errors_db_diff.txt"))
+
+    #Reports that the update of a database failed - the reason is appended to failures, so that the caller knows about it
+    async def __reportUpdateFailure(self, ctx, dbName : str, reason : str, failures : list) -> None:
+        await ctx.send(reason)
+        await ctx.send(f"❌ Update of {dbName} database failed !")
+        failures.append(f"Update of {dbName} database failed : {reason}")
+
+    #Returns the holder of the new errors database, or None if the live database shouldn't be replaced. Failures are appended to failures.
+    async def __updateErrorsDatabase(self, ctx, remoteFile : RemoteFileInfo, failures : list) -> ErrDBHolder:
+        if remoteFile == None:
+            remotePath = self.shardedLayout.getRemotePath(shardedDatabase.MANIFEST_FILE_NAME) if self.shardedLayout != None else self.errorsDB.remotePath
+            await self.__reportUpdateFailure(ctx, "errors", f"Failed to find file `{remotePath}` on remote repository.", failures)
+            return None
+        if self.shardedLayout != None:
+            return await self.__updateShardedErrorsDatabase(ctx, remoteFile, failures)
+
+        localGitBlobSha = self.errorsDB.gitBlobSha if self.errorsDB.databaseObject != None else None #Force update if currently loaded DB is invalid
+        if not await self.__isRemoteDatabaseDifferent(ctx, "errors", remoteFile, localGitBlobSha):
+            return None
+
+        remoteDB = await self.__downloadRemoteDatabase(ctx, remoteFile)
+        if remoteDB == None or not await self.__installLocalDatabase(self.errorsDB.localPath, remoteDB):
+            await self.__reportUpdateFailure(ctx, "errors", "Failed to download new errors database.", failures)
+            return None
+        del remoteDB
+
+        newErrorsDB = await _runInWorkerThread(_loadErrorsDatabaseSync, self.errorsDB.localPath, self.errorsDB.remotePath, self.errorsDB.snapshotPath,
+            self.lazyLoading, self.metrics)
+        if newErrorsDB.databaseObject == None: #Keep serving the live database
+            await self.__reportUpdateFailure(ctx, "errors", "Failed to load new errors database.", failures)
+            return None
+        print(f"New errors database root hash : {newErrorsDB.rootHash}")
+        await ctx.send("🥰 Errors database updated and reloaded successfully !")
+        await self.__sendErrorsDatabaseDiff(ctx, self.errorsDB, newErrorsDB)
+        return newErrorsDB
+
+    #Sharded layout : only downloads the shards whose Git blob SHA-1 differs from the live database's, and only rebuilds their facilities
+    #Returns the holder of the new errors database, or None if the live database shouldn't be replaced
+    async def __updateShardedErrorsDatabase(self, ctx, manifestFile : RemoteFileInfo, failures : list) -> ErrDBHolder:
+        localGitBlobSha = self.errorsDB.gitBlobSha if self.errorsDB.databaseObject != None else None #Force update if currently loaded DB is invalid
+        if not await self.__isRemoteDatabaseDifferent(ctx, "errors", manifestFile, localGitBlobSha):
+            return None
+
+        manifestData = await self.__downloadRemoteDatabase(ctx, manifestFile)
+        manifest = shardedDatabase.getManifestFromData(manifestData) if manifestData != None else None
+        if manifest == None:
+            await self.__reportUpdateFailure(ctx, "errors", "Failed to download a valid shards manifest.", failures)
+            return None
+
+        #Everything is downloaded if the live database wasn't loaded from shards, or isn't valid
+        liveManifest = self.errorsDB.shardManifest if self.errorsDB.databaseObject != None and self.errorsDB.shardManifest != None else dict()
+        changedFacilities = shardedDatabase.getChangedShards(liveManifest, manifest)
+        await ctx.send(f"{len(changedFacilities)} of {len(manifest)} shards changed.")
+
+        shardsData = dict()
+        if len(changedFacilities) != 0:
+            remotePaths = {facilityNum : self.shardedLayout.getRemotePath(manifest[facilityNum].fileName) for facilityNum in changedFacilities}
+            try:
+                shardFiles = await APIContractor.getRemoteFilesInfo(self, list(remotePaths.values()))
+            except (HTTPError, ValueError) as e:
+                await self.__reportUpdateFailure(ctx, "errors", e.args[0], failures)
+                return None
+
+            for facilityNum, remotePath in remotePaths.items():
+                shardFile = shardFiles.get(remotePath)
+                if shardFile == None or shardFile.gitBlobSha != manifest[facilityNum].gitBlobSha:
+                    await self.__reportUpdateFailure(ctx, "errors", f"Shard `{remotePath}` is missing from the remote repository, or doesn't match the manifest.", failures)
+                    return None
+
+            downloaded = await asyncio.gather(*(self.__downloadRemoteDatabase(ctx, shardFiles[remotePath]) for remotePath in remotePaths.values()))
+            if None in downloaded:
+                await self.__reportUpdateFailure(ctx, "errors", "Failed to download new errors database shards.", failures)
+                return None
+            shardsData = dict(zip(remotePaths.keys(), downloaded))
+            del downloaded
+
+        newErrorsDB = await _runInWorkerThread(_applyErrorsShardsSync, self.errorsDB, self.shardedLayout.localPath, manifest, manifestData, shardsData, self.metrics)
+        if newErrorsDB == None:
+            await self.__reportUpdateFailure(ctx, "errors", "Failed to load new errors database shards.", failures)
+            return None
+        print(f"New errors database root hash : {newErrorsDB.rootHash}")
+        await ctx.send("🥰 Errors database updated and reloaded successfully !")
+        await self.__sendErrorsDatabaseDiff(ctx, self.errorsDB, newErrorsDB)
+        return newErrorsDB
+
+    #Returns the holder of the new short codes database, or None if the live database shouldn't be replaced. Failures are appended to failures.
+    async def __updateShortCodesDatabase(self, ctx, remoteFile : RemoteFileInfo, failures : list) -> SCDBHolder:
+        if remoteFile == None:
+            await self.__reportUpdateFailure(ctx, "short codes", f"Failed to find file `{self.shortCodesDB.remotePath}` on remote repository.", failures)
+            return None
+
+        localGitBlobSha = self.shortCodesDB.gitBlobSha if self.shortCodesDB.databaseObject.IsValidDatabaseLoaded() else None #Force update if currently loaded DB is invalid
+        if not await self.__isRemoteDatabaseDifferent(ctx, "short codes", remoteFile, localGitBlobSha):
+            return None
+
+        remoteDB = await self.__downloadRemoteDatabase(ctx, remoteFile)
+        if remoteDB == None or not await self.__installLocalDatabase(self.shortCodesDB.localPath, remoteDB):
+            await self.__reportUpdateFailure(ctx, "short codes", "Failed to download new short codes database.", failures)
+            return None
+        del remoteDB
+
+        newShortCodesDB = await _runInWorkerThread(_loadShortCodesDatabaseSync, self.shortCodesDB.localPath, self.shortCodesDB.remotePath, self.metrics)
+        if not newShortCodesDB.databaseObject.IsValidDatabaseLoaded(): #Keep serving the live database
+            await self.__reportUpdateFailure(ctx, "short codes", "Failed to load new short codes database.", failures)
+            return None
+        print(f"New short codes database SHA-1 : {newShortCodesDB.databaseObject.GetDBSha1()}")
+        await ctx.send("🥰 Short codes database updated and reloaded successfully !")
+        return newShortCodesDB
 
     async def refreshStatus(self) -> None:
         if self.errorsDB.databaseObject == None:
@@ -268,26 +775,130 @@ class RivetCog(APIContractor, commands.Cog):
             status = discord.Status.online
         await self.bot.change_presence(activity=game, status=status)
 
+    #Updates the databases which differ from the remote's. Returns (True if any database was replaced, reasons of the failed updates).
+    #May raise a HTTPError or ValueError if the remote couldn't be listed : print exception.args[0] in such cases
+    async def __updateDatabases(self, ctx, quietIfUnchanged : bool = False) -> tuple:
+        async with self.updateLock:
+            #Both databases are usually in the same folder, so this only costs a single (conditional) listing
+            #With the sharded layout, the errors database is tracked through its manifest
+            errorsRemotePath = self.shardedLayout.getRemotePath(shardedDatabase.MANIFEST_FILE_NAME) if self.shardedLayout != None else self.errorsDB.remotePath
+            remoteFiles = await APIContractor.getRemoteFilesInfo(self, [errorsRemotePath, self.shortCodesDB.remotePath])
+            errorsRemoteFile = remoteFiles.get(errorsRemotePath)
+            shortCodesRemoteFile = remoteFiles.get(self.shortCodesDB.remotePath)
+
+            if quietIfUnchanged and (errorsRemoteFile != None) and (shortCodesRemoteFile != None) and \
+                (self.errorsDB.databaseObject != None) and (errorsRemoteFile.gitBlobSha == self.errorsDB.gitBlobSha) and \
+                self.shortCodesDB.databaseObject.IsValidDatabaseLoaded() and (shortCodesRemoteFile.gitBlobSha == self.shortCodesDB.gitBlobSha):
+                return (False, [])
+
+            await ctx.send("Updating databases...")
+            failures = list()
+            newErrorsDB, newShortCodesDB = await asyncio.gather(
+                self.__updateErrorsDatabase(ctx, errorsRemoteFile, failures),
+                self.__updateShortCodesDatabase(ctx, shortCodesRemoteFile, failures))
+
+            #Publish both new databases at once
+            if newErrorsDB != None:
+                self.errorsDB = newErrorsDB
+            if newShortCodesDB != None:
+                self.shortCodesDB = newShortCodesDB
+            return ((newErrorsDB != None) or (newShortCodesDB != None), failures)
+
     @commands.command(name="update_db", aliases=["refresh", "refresh_db"], help="Update the databases of the bot")
     @commands.check(isWhitelisted)
     async def updateDB(self, ctx):
         print(f"User {ctx.message.author.name}#{ctx.message.author.discriminator} (ID : {ctx.message.author.id}) initiated a database update.")
-        await ctx.send("Updating errors database...")
-        await self.__updateErrorsDatabase(ctx)
-        await ctx.send("Updating short codes database...")
-        await self.__updateShortCodesDatabase(ctx)
+        bytesReceivedBefore = self.httpBackend.bytesReceived
+        try:
+            await self.__updateDatabases(ctx)
+        except (HTTPError, ValueError) as e:
+            await ctx.send(e.args[0])
+            await ctx.send("❌ Update of databases failed !")
+            return
+
+        await ctx.send(f"Received {self.httpBackend.bytesReceived - bytesReceivedBefore} bytes from remote.")
         await self.refreshStatus()
-        
+
+    #Returns the delay before the next auto-refresh check, in seconds
+    def __getAutoRefreshDelay(self) -> float:
+        delay = min(self.autoRefresh.interval * (2 ** self.autoRefresh.failuresCount), self.autoRefresh.maxBackoff)
+        return delay + random.uniform(0, delay * self.autoRefresh.jitter)
+
+    async def __autoRefreshLoop(self) -> None:
+        ctx = _ConsoleContext("[auto-refresh]")
+        while True:
+            await asyncio.sleep(self.__getAutoRefreshDelay())
+            try:
+                replaced, failures = await self.__updateDatabases(ctx, quietIfUnchanged=True)
+                if replaced:
+                    await self.refreshStatus()
+            except (HTTPError, ValueError) as e: #Rate limits end up here too, as non-200 answers to the listing request
+                self.autoRefresh.failuresCount += 1
+                self.autoRefresh.lastFailure = e.args[0]
+                print(f"[auto-refresh] Check #{self.autoRefresh.failuresCount} in a row failed : {e.args[0]}")
+            except Exception as e: #Never let the task die silently
+                self.autoRefresh.failuresCount += 1
+                self.autoRefresh.lastFailure = f"Exception {e.__class__.__name__} raised."
+                print(f"[auto-refresh] Exception {e.__class__.__name__} raised during check : {e}")
+            else:
+                if len(failures) != 0: #Failed downloads and loads back off like failed listings
+                    self.autoRefresh.failuresCount += 1
+                    self.autoRefresh.lastFailure = " ; ".join(failures)
+                    print(f"[auto-refresh] Check #{self.autoRefresh.failuresCount} in a row failed : {self.autoRefresh.lastFailure}")
+                else:
+                    self.autoRefresh.failuresCount = 0
+                    self.autoRefresh.lastSuccessTime = time.time()
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        if self.autoRefresh.interval > 0 and self.autoRefresh.task == None:
+            self.autoRefresh.task = self.bot.loop.create_task(self.__autoRefreshLoop())
+        if self.metricsServer != None and self.metricsServer.runner == None: #on_ready is also dispatched after reconnections
+            try:
+                await self.metricsServer.start()
+            except OSError as e:
+                print(f"Failed to start metrics listener on {self.metricsServer.host}:{self.metricsServer.port} : {e}")
+                self.metricsServer = None
+        if self.lookupApiServer != None and self.lookupApiServer.runner == None:
+            try:
+                await self.lookupApiServer.start()
+            except OSError as e:
+                print(f"Failed to start lookup API on {self.lookupApiServer.host}:{self.lookupApiServer.port} : {e}")
+                self.lookupApiServer = None
+
+    @commands.command(name="db_status", help="Displays the state of the databases and of their auto-refresh")
+    async def dbStatus(self, ctx):
+        ret = f"Errors database root hash : {self.errorsDB.rootHash}\n"
+        ret += f"Errors database Git blob SHA-1 : {self.errorsDB.gitBlobSha}\n"
+        ret += f"Short codes database SHA-1 : {self.shortCodesDB.databaseObject.GetDBSha1()}\n"
+        ret += f"Short codes database Git blob SHA-1 : {self.shortCodesDB.gitBlobSha}\n"
+        if self.autoRefresh.task == None:
+            ret += "Auto-refresh : disabled"
+        else:
+            ret += f"Auto-refresh : every {self.autoRefresh.interval:.0f}s\n"
+            if self.autoRefresh.lastSuccessTime == None:
+                ret += "Last successful check : never\n"
+            else:
+                ret += f"Last successful check : {time.time() - self.autoRefresh.lastSuccessTime:.0f}s ago\n"
+            ret += f"Consecutive failed checks : {self.autoRefresh.failuresCount}"
+            if self.autoRefresh.failuresCount != 0:
+                ret += f"\nLast failure : {self.autoRefresh.lastFailure}"
+        await ctx.send(f"```\n{ret}\n```")
+
     @commands.command(name="reload_db", help="Reload the local copies of the databases")
     async def reloadDB(self, ctx):
-        self.errorsDB.databaseObject = errorsDatabase.getDatabaseFromJSONFile(self.errorsDB.localPath)
-        self.errorsDB.sha1 = _getSha1OfFile(self.errorsDB.localPath)
+        async with self.updateLock:
+            #Load both databases concurrently, then publish them at once
+            self.errorsDB, self.shortCodesDB = await asyncio.gather(
+                _runInWorkerThread(_loadLocalErrorsDatabaseSync, self.errorsDB.localPath, self.errorsDB.remotePath, self.errorsDB.snapshotPath,
+                    self.lazyLoading, self.shardedLayout, self.metrics),
+                _runInWorkerThread(_loadShortCodesDatabaseSync, self.shortCodesDB.localPath, self.shortCodesDB.remotePath, self.metrics))
+
         if self.errorsDB.databaseObject == None:
             await ctx.send("Failed to reload errors database.")
         else:
             await ctx.send("Errors database reloaded successfully.")
 
-        self.shortCodesDB.databaseObject.LoadFromFile(self.shortCodesDB.localPath)
         if not self.shortCodesDB.databaseObject.IsValidDatabaseLoaded():
             await ctx.send("Failed to reload short codes database.")
         else:
@@ -297,131 +908,327 @@ class RivetCog(APIContractor, commands.Cog):
     @commands.command(name="save_db", help="Save the live databases as local copy")
     @commands.check(isWhitelisted)
     async def saveDB(self, ctx):
-        errDBData = errorsDatabase.getJSONStringFromDatabase(self.errorsDB.databaseObject).encode("utf-8")
-        if errDBData == None:
-            await ctx.send("Failed to serialize errors database !")
- 
-        if errDBData and await self.__installLocalDatabase(self.errorsDB.localPath, errDBData):
-            await ctx.send("🥰 Saved errors database successfully !")
-        else:
-            await ctx.send("😡 Save of errors database failed !")
-
-        shortCodesDBData = self.shortCodesDB.databaseObject.GetDatabaseAsString()
-        if shortCodesDBData == None:
-            await ctx.send("Failed to serialize short codes database !")
- 
-        if shortCodesDBData and await self.__installLocalDatabase(self.errorsDB.localPath, errDBData):
-            await ctx.send("🥰 Saved short codes database successfully !")
-        else:
-            await ctx.send("😡 Save of short codes database failed !")
+        #Updates, merges and reloads can't replace the live databases while they are saved : the saved files would be tracked by the new holders,
+        #or overwritten with older content
+        async with self.updateLock:
+            errorsDB = self.errorsDB
+            errDBData = await _runInWorkerThread(_getErrorsDatabaseDataSync, errorsDB.databaseObject, self.metrics)
+            if errDBData == None:
+                await ctx.send("Failed to serialize errors database !")
 
-    @commands.command(name="merge_err_db", help="Downloads an errors database and merges it with live database")
-    @commands.check(isWhitelisted)
-    async def mergeDB(self, ctx, databaseURL : str, overwrite : bool = False):
-        print(f"User {ctx.message.author.name}#{ctx.message.author.discriminator} (ID : {ctx.message.author.id}) requested a database merge from {databaseURL}.")
+            if errDBData and await self.__installLocalDatabase(errorsDB.localPath, errDBData):
+                errorsDB = dataclass_replace(errorsDB, gitBlobSha = _getGitBlobShaOfDataSync(errDBData))
+                self.errorsDB = errorsDB
+                await ctx.send("🥰 Saved errors database successfully !")
+            else:
+                await ctx.send("😡 Save of errors database failed !")
 
-        if self.errorsDB.databaseObject == None:
-            await ctx.send("No valid errors database is currently loaded.")
-            return
+            #Local shards take precedence over the local file when reloading, so they must be saved too
+            if errDBData and self.shardedLayout != None:
+                newErrorsDB = await _runInWorkerThread(_saveErrorsShardsSync, errorsDB, self.shardedLayout.localPath)
+                if newErrorsDB != None:
+                    self.errorsDB = newErrorsDB
+                await ctx.send("🥰 Saved errors database shards successfully !" if newErrorsDB != None else "😡 Save of errors database shards failed !")
 
-        try:
-            req = make_http_request(databaseURL)
-        except MissingSchema or InvalidSchema:
-            await ctx.send("Illegal URL provided.")
-            return
+            shortCodesDB = self.shortCodesDB
+            shortCodesDBData = await _runInWorkerThread(shortCodesDB.databaseObject.GetDatabaseAsBytes)
+            if shortCodesDBData == None:
+                await ctx.send("Failed to serialize short codes database !")
 
-        if req.status_code != 200:
-            await ctx.send(f"Failed to download database - got HTTP Status {req.status_code}.")
-            return
+            if shortCodesDBData and await self.__installLocalDatabase(shortCodesDB.localPath, shortCodesDBData):
+                await ctx.send("🥰 Saved short codes database successfully !")
+            else:
+                await ctx.send("😡 Save of short codes database failed !")
+
+    #Downloads an errors database, or reads it from the merge sources folder if source isn't an URL. Returns (Database, None) on success, (None, reason) otherwise.
+    async def __fetchErrorsDatabase(self, source : str) -> tuple:
+        if not source.lower().startswith(("http://", "https://")):
+            if self.mergeSourcesPath == None:
+                return (None, "Not an URL - merging local files is disabled.")
+            path = _getMergeSourcePath(self.mergeSourcesPath, source)
+            if path == None:
+                return (None, "Local files must be given relative to the merge sources folder, without '..'.")
+            appendedDb = await _runInWorkerThread(errorsDatabase.getDatabaseFromJSONFile, path)
+            return (appendedDb, None) if appendedDb != None else (None, "File isn't a readable JSON errors database.")
+
+        #The database is parsed in a worker thread as it is downloaded, instead of once the whole body has been received
+        parser = errorsDatabase.DatabaseStreamParser()
+        utf8Decoder = codecs.getincrementaldecoder("utf-8")()
+        async def feedParser(chunk : bytes) -> bool:
+            return await _runInWorkerThread(parser.feed, utf8Decoder.decode(chunk))
 
         try:
-            jsonStr = str(req.content(), "utf-8")
+            status = await self.httpBackend.getStreamed(source, feedParser)
+            if status != 200:
+                return (None, f"Failed to download database - got HTTP Status {status}.")
+            utf8Decoder.decode(b"", final=True)
+        except UnicodeDecodeError: #Must be caught before ValueError, which it derives from
+            return (None, "URL doesn't point to a valid UTF-8 encoded JSON file.")
         except ValueError:
-            await ctx.send("URL doesn't point to a valid UTF-8 encoded JSON file.")
+            return (None, "Illegal URL provided.")
+        except HTTPError as e:
+            return (None, e.args[0])
+
+        appendedDb = await _runInWorkerThread(parser.close)
+        return (appendedDb, None) if appendedDb != None else (None, "URL doesn't point to a valid JSON errors database.")
+
+    @commands.command(name="merge_err_db", help="Downloads errors databases (URLs, or files of the merge sources folder) and merges them with live database at once. "
+        "Earlier sources take precedence over later ones - end with 'true' to let them overwrite the fields of the live database too")
+    @commands.check(isWhitelisted)
+    async def mergeDB(self, ctx, *sources : str):
+        overwrite = False
+        if len(sources) != 0 and sources[-1].lower() in _BOOLEAN_ARGUMENTS:
+            overwrite = _BOOLEAN_ARGUMENTS[sources[-1].lower()]
+            sources = sources[:-1]
+        if len(sources) == 0:
+            await ctx.send("No database to merge.")
+            return
+        if len(sources) > MAX_MERGE_SOURCES:
+            await ctx.send(f"At most {MAX_MERGE_SOURCES} databases can be merged at once.")
+            return
+        print(f"User {ctx.message.author.name}#{ctx.message.author.discriminator} (ID : {ctx.message.author.id}) requested a database merge from {', '.join(sources)}.")
+
+        if self.errorsDB.databaseObject == None:
+            await ctx.send("No valid errors database is currently loaded.")
             return
 
-        newDb = errorsDatabase.getMergedDbAndJSONString(self.errorsDB.databaseObject, jsonStr, overwrite)
-        if newDb == None:
-            await ctx.send("Merging databases failed ! Current database will be left untouched.")
+        #Sources are fetched concurrently - nothing is merged unless all of them are valid
+        fetched = await asyncio.gather(*[self.__fetchErrorsDatabase(source) for source in sources])
+        failures = [f"`{source}` : {reason}" for source, (_, reason) in zip(sources, fetched) if reason != None]
+        if len(failures) != 0:
+            await ctx.send("\n".join(failures) + "\nCurrent database will be left untouched.")
             return
 
-        self.errorsDB.databaseObject = newDb
-        self.errorsDB.sha1 = SHA1_ALL_ZEROES
+        async with self.updateLock: #Don't let an update replace the database while we merge into it
+            #The live database keeps serving lookups while the merged one is built from it
+            merged = await _runInWorkerThread(_mergeErrorsDatabasesSync, self.errorsDB, [appendedDb for appendedDb, _ in fetched], overwrite, self.metrics)
+            if merged == None:
+                await ctx.send("Merging databases failed ! Current database will be left untouched.")
+                return
+            self.errorsDB, conflicts = merged
 
-        sha1ctx = sha1()
-        sha1ctx.update(errorsDatabase.getJSONStringFromDatabase(self.errorsDB.databaseObject).encode("utf-8"))
-        self.errorsDB.sha1 = sha1ctx.hexdigest().lower() #We always store local SHA-1 in lowercase, so we convert just to be sure.
-        await ctx.send(f"New SHA-1 hash is `{self.errorsDB.sha1}`.")
+        await ctx.send(f"Merged {len(sources)} database(s). New root hash is `{self.errorsDB.rootHash}`.")
+        if len(conflicts) != 0:
+            report = _getMergeConflictsReport(conflicts, ["Live database"] + list(sources))
+            await ctx.send(f"{len(conflicts)} conflicting fields were resolved by precedence :",
+                file=discord.File(io.BytesIO(report.encode("utf-8")), filename="merge_conflicts.txt"))
 
     @commands.command(name="download_err_db", help="Download an errors database and replaces the live database with it")
     @commands.check(isWhitelisted)
     async def downloadDB(self, ctx, databaseURL : str):
         print(f"User {ctx.message.author.name}#{ctx.message.author.discriminator} (ID : {ctx.message.author.id}) requested a database download from {databaseURL}.")
         try:
-            req = make_http_request(databaseURL)
-        except MissingSchema or InvalidSchema:
+            content = await APIContractor.getContentOfFileAtURL(self, databaseURL)
+        except ValueError:
             await ctx.send("Illegal URL provided.")
             return
-
-        if req.status_code != 200:
-            await ctx.send(f"Failed to download database - got HTTP Status {req.status_code}.")
+        except HTTPError as e:
+            await ctx.send(e.args[0])
             return
 
-        sha1ctx = sha1()
-        sha1ctx.update(req.content)
-        remoteSha1 = sha1ctx.hexdigest().lower() #We always store local SHA-1 in lowercase, so we convert just to be sure.
-        await ctx.send(f"```diff\n- Local database SHA-1 :\n- {self.errorsDB.sha1}\n+ Downloaded database SHA-1 :\n+ {remoteSha1}\n```")
-
-        if (self.errorsDB.sha1 != remoteSha1) or self.errorsDB.databaseObject == None:
-            if self.__installLocalDatabase(ctx, self.errorsDB.localPath, req.content):
-                self.errorsDB.databaseObject = errorsDatabase.getDatabaseFromJSONFile(self.errorsDB.localPath)
-                self.errorsDB.sha1 = remoteSha1
-                if self.errorsDB.databaseObject == None:
-                    await ctx.send("Failed to load new database - I am now going to cry 😥")
-                else:
-                    await ctx.send("New database loaded successfully !")
-                    print(f"New database SHA-1 : {self.errorsDB.sha1}")
-            else:
+        #The file is compared first, so that downloading the local file again doesn't reload it - the content of both databases is compared once loaded
+        remoteGitBlobSha = _getGitBlobShaOfDataSync(content)
+        await ctx.send(f"```diff\n- Local database Git blob SHA-1 :\n- {self.errorsDB.gitBlobSha}\n+ Downloaded database Git blob SHA-1 :\n+ {remoteGitBlobSha}\n```")
+
+        if (self.errorsDB.gitBlobSha != remoteGitBlobSha) or self.errorsDB.databaseObject == None:
+            async with self.updateLock:
+                previousErrorsDB = self.errorsDB
+                installed = await self.__installLocalDatabase(self.errorsDB.localPath, content)
+                if installed:
+                    self.errorsDB = await _runInWorkerThread(_loadErrorsDatabaseSync, self.errorsDB.localPath, self.errorsDB.remotePath, self.errorsDB.snapshotPath,
+                        self.lazyLoading, self.metrics)
+                    #Local shards take precedence over the local file when reloading, so they must be replaced too
+                    if self.shardedLayout != None and self.errorsDB.databaseObject != None:
+                        newErrorsDB = await _runInWorkerThread(_saveErrorsShardsSync, self.errorsDB, self.shardedLayout.localPath)
+                        if newErrorsDB != None:
+                            self.errorsDB = newErrorsDB
+                        else:
+                            await ctx.send("Failed to store new database as shards - reloading will bring the previous one back.")
+
+            if not installed:
                 await ctx.send("Failed to download new database - current database left untouched.")
+            elif self.errorsDB.databaseObject == None:
+                await ctx.send("Failed to load new database - I am now going to cry 😥")
+            else:
+                await ctx.send("New database loaded successfully !")
+                print(f"New database root hash : {self.errorsDB.rootHash}")
+                await self.__sendErrorsDatabaseDiff(ctx, previousErrorsDB, self.errorsDB)
         else:
-            await ctx.send("SHA-1 hashes are identical - current database will be left untouched.")
+            await ctx.send("Git blob SHA-1 hashes are identical - current database will be left untouched.")
         await self.refreshStatus()
 
     @commands.command(name="error_code", aliases=["sce_error", "error", "ec"], help="Displays the name of a given error code (in hexadecimal or short code)")
-    async def resolveErrorCode(self, ctx, input_str : str):
-        isShortCode = False
-        printStr = "```\n"
-        try:
-            errcode = int(input_str, 16)
-        except ValueError: #Not an integer - try as short code (string)
-            if (self.shortCodesDB.databaseObject == None) or not self.shortCodesDB.databaseObject.IsValidDatabaseLoaded():
-                await ctx.send("No valid short error codes database is currently loaded : cannot try to resolve.")
-                return
+    async def resolveErrorCode(self, ctx, *, input_str : str):
+        #Both hex codes and short codes are case-insensitive - the whole message is taken, so that short codes may contain spaces (C1 2345 6)
+        input_str = input_str.strip().upper()
+        errorsDB, scDb = self.errorsDB, self.shortCodesDB.databaseObject
+
+        #Responses only depend on the input and the loaded databases, so they can be cached as long as both databases stay the same.
+        #The outcome recorded in metrics is cached along with the response, so that cache hits don't classify the code again.
+        cacheable = (errorsDB.databaseObject != None) and scDb.IsValidDatabaseLoaded()
+        cached = None
+        if cacheable:
+            self.responseCache.SetVersion((errorsDB.rootHash, scDb.GetDBSha1()))
+            cached = self.responseCache.Get(input_str)
+        if cached != None:
+            response, outcome = cached
+        else:
+            response = codeResolver.getErrorCodeResponse(errorsDB.compiledObject, scDb, input_str)
+            outcome = codeResolver.getErrorCodeOutcome(errorsDB.databaseObject, scDb, input_str) if self.metrics != None else None
+            if cacheable:
+                self.responseCache.Put(input_str, (response, outcome))
 
-            short_code = input_str.upper() #Our DB stores short codes in uppercase - we need to make input uppercase for matching to work
-            errcode = self.shortCodesDB.databaseObject.ResolveShortCode(short_code)
-            if errcode == 0:
-                await ctx.send(f"`{input_str}` is an unknown short code or an invalid input.")
+        if self.metrics != None:
+            self.metrics.lookups.inc(outcome)
+        await ctx.send(response)
+
+    @commands.command(name="error_codes", aliases=["ecs"], help="Resolves every error code and short code found in the message and its text attachments (i.e. crash logs)")
+    async def resolveErrorCodes(self, ctx, *, text : str = ""):
+        scanner = codeResolver.CodeScanner()
+        scanner.feed(text + "\n")
+
+        #Attachments are scanned as they are downloaded, so that big logs are never held in memory
+        for attachment in ctx.message.attachments:
+            utf8Decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            async def feedScanner(chunk : bytes) -> bool:
+                return scanner.feed(utf8Decoder.decode(chunk))
+            try:
+                status = await self.httpBackend.getStreamed(attachment.url, feedScanner)
+            except (ValueError, HTTPError) as e:
+                await ctx.send(f"Failed to download attachment `{attachment.filename}` : {e.args[0]}")
                 return
-            else: #Found a match - print which hex code this short code maps to, and process hex code
-                printStr += f"Short code {short_code} -> 0x{errcode:08X}\n"
-                isShortCode = True
-                
-        if not isShortCode and input_str[0] == '-': #Negative error codes get sign-extended to 64-bit - clamp to 32-bit
-            signExtendedError = errcode
-            errcode &= 0xFFFFFFFF
-            printStr += "-0x" + f"{signExtendedError:08X}"[1:] + f" -> 0x{errcode:08X}\n" 
-
-        if ((errcode & 0xFFFFFFFF) != errcode):
-            await ctx.send("Input too long - error codes are only 4 bytes wide.")
+            if status != 200:
+                await ctx.send(f"Failed to download attachment `{attachment.filename}` - got HTTP Status {status}.")
+                return
+            scanner.feed(utf8Decoder.decode(b"", final=True) + "\n") #Attachments and message text must not be joined together
+        scanner.close()
+
+        if len(scanner.candidates) == 0:
+            await ctx.send("No error codes or short codes found.")
             return
 
+        response = codeResolver.getBatchResponse(self.errorsDB.compiledObject, self.shortCodesDB.databaseObject, scanner)
+        if len(response) + len("```\n\n```") <= DISCORD_MESSAGE_MAX_LENGTH:
+            await ctx.send(f"```\n{response}\n```")
+        else:
+            await ctx.send(f"Resolved {len(scanner.candidates)} codes :", file=discord.File(io.BytesIO(response.encode("utf-8")), filename="error_codes.txt"))
 
+    #Returns the holder of the errors database, with its name and full-text indexes.
+    #Those of lazily loaded databases and of snapshots are only built once they are needed : building them decodes every facility.
+    async def __getIndexedErrorsDB(self) -> ErrDBHolder:
+        errorsDB = self.errorsDB
+        if errorsDB.databaseObject == None or errorsDB.nameIndex != None:
+            return errorsDB
 
-        if (self.errorsDB.databaseObject == None):
-            await ctx.send("No valid errors database is currently loaded.")
+        db = errorsDB.databaseObject
+        nameIndex, searchIndex = await _runInWorkerThread(lambda: (NameIndex(db), SearchIndex(db)))
+        indexedErrorsDB = dataclass_replace(errorsDB, nameIndex = nameIndex, searchIndex = searchIndex)
+        if self.errorsDB is errorsDB: #Don't overwrite a database published in the meantime
+            self.errorsDB = indexedErrorsDB
+        return indexedErrorsDB
+
+    @commands.command(name="name", aliases=["find"], help="Displays the code of an error or facility given its name, or the names starting with the input")
+    async def resolveName(self, ctx, name : str):
+        errorsDB = await self.__getIndexedErrorsDB()
+        await ctx.send(codeResolver.getNameResponse(errorsDB.databaseObject, errorsDB.nameIndex, name.strip()))
+
+    @commands.command(name="search", help="Searches the descriptions of errors and facilities (i.e. \"memory card\")")
+    async def searchDescriptions(self, ctx, *, query : str):
+        errorsDB = await self.__getIndexedErrorsDB()
+        await ctx.send(codeResolver.getSearchResponse(errorsDB.databaseObject, errorsDB.searchIndex, query))
+
+    @commands.command(name="cache_stats", help="Displays statistics about the error_code responses cache")
+    @commands.check(isWhitelisted)
+    async def cacheStats(self, ctx):
+        await ctx.send(f"```\n{self.responseCache.GetStatsAsString()}\n```")
+        db = self.errorsDB.databaseObject
+        if isinstance(db, errorsDatabase.OverlayDatabase): #Merged into
+            db = db.base
+        if isinstance(db, (lazyDatabase.LazyDatabase, binaryDatabase.MappedDatabase)) and db.resident != None:
+            await ctx.send(f"Resident facilities of the errors database :\n```\n{db.resident.getStatsAsString()}\n```")
+
+    @commands.command(name="http_stats", help="Displays statistics about the HTTP requests made by the bot")
+    @commands.check(isWhitelisted)
+    async def httpStats(self, ctx):
+        await ctx.send(f"```\n{self.httpBackend.getStatsAsString()}\n```")
+
+    #Returns the title and profile of a profiling session, or None if it couldn't run - allocations are traced by the caller
+    async def __runProfilingSession(self, ctx, target : str, argument : str, tracer : AllocationTracer) -> tuple:
+        if target.isdigit(): #Sample every thread for a while
+            duration = min(int(target), MAX_PROFILING_DURATION)
+            await ctx.send(f"Profiling for {duration}s...")
+            sampler = SamplingProfiler()
+            tracer.start()
+            sampler.start()
+            try:
+                await asyncio.sleep(duration)
+            finally:
+                sampler.stop()
+            return (f"all threads for {duration}s", sampler.getReport())
+
+        #Operations are profiled in the worker thread running them, and their results are discarded
+        if target == "reload_db":
+            errorsDB, shortCodesDB = self.errorsDB, self.shortCodesDB
+            operation = lambda: (_loadLocalErrorsDatabaseSync(errorsDB.localPath, errorsDB.remotePath, errorsDB.snapshotPath, self.lazyLoading, self.shardedLayout),
+                _loadShortCodesDatabaseSync(shortCodesDB.localPath, shortCodesDB.remotePath))
+            title = "reload_db (local databases loaded, but not published)"
+        elif target == "merge_err_db":
+            if argument == None:
+                await ctx.send("Usage : `profile merge_err_db <URL>`")
+                return None
+            if self.errorsDB.databaseObject == None:
+                await ctx.send("No valid errors database is currently loaded.")
+                return None
+            try:
+                content = await APIContractor.getContentOfFileAtURL(self, argument)
+            except ValueError:
+                await ctx.send("Illegal URL provided.")
+                return None
+            except HTTPError as e:
+                await ctx.send(e.args[0])
+                return None
+            errorsDB = self.errorsDB
+            operation = lambda: _parseAndMergeErrorsDatabaseSync(errorsDB, content)
+            title = f"merge_err_db {argument} (parse and merge of {len(content)} bytes, not published)"
+        elif target == "error_code":
+            count = min(int(argument), MAX_PROFILING_LOOKUPS) if argument != None and argument.isdigit() else 10000
+            if self.errorsDB.databaseObject == None:
+                await ctx.send("No valid errors database is currently loaded.")
+                return None
+            errorsDB, scDb = self.errorsDB, self.shortCodesDB.databaseObject
+            inputs = await _runInWorkerThread(_getProfilingInputs, errorsDB.databaseObject, count)
+            operation = lambda: _resolveErrorCodesSync(errorsDB.compiledObject, scDb, inputs)
+            title = f"error_code x{count} (uncached)"
         else:
-            await ctx.send(printStr + errorsDatabase.getDecoratedErrorCodeInfo(self.errorsDB.databaseObject, errcode) + "\n```")
+            await ctx.send("Usage : `profile [seconds]` or `profile reload_db` or `profile merge_err_db <URL>` or `profile error_code [count]`")
+            return None
+
+        await ctx.send(f"Profiling {target}...")
+        tracer.start()
+        return (title, (await _runInWorkerThread(profileCall, operation))[1])
+
+    @commands.command(name="profile", help="Profiles the bot for N seconds (default : 10), or one operation : reload_db, merge_err_db <URL>, error_code [count]")
+    @commands.check(isWhitelisted)
+    async def profile(self, ctx, target : str = "10", argument : str = None):
+        print(f"User {ctx.message.author.name}#{ctx.message.author.discriminator} (ID : {ctx.message.author.id}) started a profiling session ({target}).")
+        if self.profiling:
+            await ctx.send("A profiling session is already running.")
+            return
+
+        self.profiling = True
+        tracer = AllocationTracer()
+        try:
+            session = await self.__runProfilingSession(ctx, target.lower(), argument, tracer)
+        finally:
+            if tracer.running:
+                await _runInWorkerThread(tracer.stop) #Snapshots can be big : they are never taken on the event loop
+            self.profiling = False
+        if session == None:
+            return
+
+        allocationsReport = await _runInWorkerThread(tracer.getReport)
+        report = f"Profiling report - {session[0]}\n{time.strftime('%Y-%m-%d %H:%M:%S')}\n\n{session[1]}\n{allocationsReport}"
+        await ctx.send("Profiling done.", file=discord.File(io.BytesIO(report.encode("utf-8")), filename="profile.txt"))
 
     @commands.command(name="exit", help="Stops the bot")
     @commands.check(isWhitelisted)
@@ -432,6 +1239,26 @@ class RivetCog(APIContractor, commands.Cog):
         await self.bot.change_presence(activity=discord.Game("Busy"), status=discord.Status.dnd)
         os._exit(0)
     
+    def cog_unload(self):
+        if self.autoRefresh.task != None:
+            self.autoRefresh.task.cancel()
+        if self.metricsServer != None:
+            self.bot.loop.create_task(self.metricsServer.close())
+        if self.lookupApiServer != None:
+            self.bot.loop.create_task(self.lookupApiServer.close())
+        self.bot.loop.create_task(self.httpBackend.close())
+
+    #Commands are timed between these hooks - the after hook runs even if the command raised
+    async def cog_before_invoke(self, ctx):
+        if self.metrics != None:
+            ctx.metricsStartTime = time.perf_counter()
+
+    async def cog_after_invoke(self, ctx):
+        if self.metrics != None:
+            self.metrics.commandDuration.observe((ctx.command.qualified_name,), time.perf_counter() - ctx.metricsStartTime)
+
     async def cog_command_error(self, ctx, error):
+        if self.metrics != None and ctx.command != None:
+            self.metrics.commandErrors.inc((ctx.command.qualified_name,))
         print(f"In cog_command_error : \n{error}")
         await ctx.send(f"Error while running command :\n```\n{error}\n```")
\ No newline at end of file
@@ -0,0 +1,147 @@
+import re
+from array import array
+from heapq import nlargest
+from math import log
+
+import errorsDatabase
+from errorsDatabase import Database, StringPool
+
+#Full-text index of the descriptions of an errors database.
+#
+# - documents are the distinct description texts : databases reuse the same descriptions for many errors, which are only indexed once.
+#   Every document maps to the codes of the errors (and the numbers of the facilities) described by it.
+# - the postings of a token are a flat array of (document, position) pairs, sorted by document then position.
+#   Positions allow phrase queries ("memory card") to rank above documents merely containing all the words.
+# - documents are ranked with BM25 : queries only visit the postings of their own tokens, not the whole database.
+#
+#Like the databases, indexes are immutable once built.
+
+TOKEN_REGEX = re.compile(r"[0-9a-z]+")
+SNIPPET_TOKEN_REGEX = re.compile(r"[0-9a-z]+", re.IGNORECASE) #Finds tokens in the original text, so that their offsets are preserved
+
+#BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+PHRASE_BOOST = 2.0 #Score multiplier for documents containing the query as a phrase
+
+def tokenize(text : str) -> list:
+    return TOKEN_REGEX.findall(text.lower())
+
+class SearchIndex:
+    __slots__ = ["texts", "docLengths", "averageDocLength", "postings", "targetOffsets", "targets"]
+
+    def __init__(self, db : Database) -> None:
+        #Gather the distinct descriptions, and what they describe
+        docIds = dict() #Maps a text to its document number
+        docTargets = list() #(document, target) pairs - targets are error codes, or facility numbers (which never have the error bit set)
+        def addDocument(text : str, target : int) -> None:
+            docId = docIds.get(text)
+            if docId == None:
+                docId = len(docIds)
+                docIds[text] = docId
+            docTargets.append((docId, target))
+
+        for facilityNum, facilityObj in db.items():
+            if facilityObj.description:
+                addDocument(facilityObj.description, facilityNum)
+            facilityBase = errorsDatabase.IS_ERROR_MASK | (facilityNum << 16)
+            for errorNum, errorObj in facilityObj.errors.items():
+                if errorObj.description:
+                    addDocument(errorObj.description, facilityBase | errorNum)
+
+        #Build the postings
+        self.texts : StringPool = StringPool() #Texts of the documents, by document number
+        self.postings : dict = dict() #Maps a token to its (document, position) array
+        self.docLengths : array = array("I") #Number of tokens of each document
+        for docId, text in enumerate(docIds.keys()):
+            self.texts.Add(text)
+            tokens = tokenize(text)
+            self.docLengths.append(len(tokens))
+            for position, token in enumerate(tokens):
+                tokenPostings = self.postings.get(token)
+                if tokenPostings == None:
+                    tokenPostings = self.postings[token] = array("I")
+                tokenPostings.append(docId)
+                tokenPostings.append(position)
+        self.texts.Seal()
+        del docIds
+        self.averageDocLength : float = (sum(self.docLengths) / len(self.docLengths)) if len(self.docLengths) != 0 else 0.0
+
+        #Targets of document i are targets[targetOffsets[i]:targetOffsets[i + 1]]
+        docTargets.sort()
+        self.targets : array = array("I", [target for docId, target in docTargets])
+        self.targetOffsets : array = array("I", [0] * (len(self.docLengths) + 1))
+        for docId, target in docTargets:
+            self.targetOffsets[docId + 1] += 1
+        for i in range(len(self.docLengths)):
+            self.targetOffsets[i + 1] += self.targetOffsets[i]
+
+    #Returns True if the tokens appear consecutively in a document, given the positions of each token in it
+    @staticmethod
+    def __containsPhrase(positionsPerToken : list) -> bool:
+        candidates = set(positionsPerToken[0])
+        for offset, positions in enumerate(positionsPerToken[1:], 1):
+            candidates &= {position - offset for position in positions}
+            if len(candidates) == 0:
+                return False
+        return True
+
+    #Returns the (score, document) pairs of the limit best documents for a query
+    def searchDocuments(self, query : str, limit : int) -> list:
+        tokens = list(dict.fromkeys(tokenize(query))) #Deduplicated, in order
+        if len(tokens) == 0 or len(self.docLengths) == 0:
+            return []
+
+        scores = dict() #Maps a document to its score
+        positions = dict() #Maps a document to the positions of each token in it (only used for phrase queries)
+        for tokenIdx, token in enumerate(tokens):
+            tokenPostings = self.postings.get(token)
+            if tokenPostings == None:
+                continue
+
+            #Term frequency of the token in each document
+            frequencies = dict()
+            for i in range(0, len(tokenPostings), 2):
+                docId = tokenPostings[i]
+                frequencies[docId] = frequencies.get(docId, 0) + 1
+                if len(tokens) > 1: #A phrase can only be in documents containing its first token
+                    if tokenIdx == 0:
+                        positions.setdefault(docId, [[] for _ in tokens])[0].append(tokenPostings[i + 1])
+                    elif docId in positions:
+                        positions[docId][tokenIdx].append(tokenPostings[i + 1])
+
+            idf = log(1.0 + (len(self.docLengths) - len(frequencies) + 0.5) / (len(frequencies) + 0.5))
+            for docId, frequency in frequencies.items():
+                lengthNorm = 1.0 - BM25_B + BM25_B * self.docLengths[docId] / self.averageDocLength
+                scores[docId] = scores.get(docId, 0.0) + idf * frequency * (BM25_K1 + 1.0) / (frequency + BM25_K1 * lengthNorm)
+
+        if len(tokens) > 1:
+            for docId, positionsPerToken in positions.items():
+                if all(len(tokenPositions) != 0 for tokenPositions in positionsPerToken) and SearchIndex.__containsPhrase(positionsPerToken):
+                    scores[docId] *= PHRASE_BOOST
+
+        return nlargest(limit, ((score, docId) for docId, score in scores.items()), key = lambda entry: (entry[0], -entry[1]))
+
+    #Returns up to limit (target, text) pairs, best match first - targets are error codes, or facility numbers
+    def search(self, query : str, limit : int = 10) -> list:
+        ret = list()
+        for score, docId in self.searchDocuments(query, limit):
+            for idx in range(self.targetOffsets[docId], self.targetOffsets[docId + 1]):
+                ret.append((self.targets[idx], self.texts.Get(docId)))
+                if len(ret) == limit:
+                    return ret
+        return ret
+
+    #Returns an excerpt of text of at most length characters, around the first token of the query it contains
+    @staticmethod
+    def getSnippet(text : str, query : str, length : int = 80) -> str:
+        if len(text) <= length:
+            return text
+        tokens = set(tokenize(query))
+        start = 0
+        for match in SNIPPET_TOKEN_REGEX.finditer(text):
+            if match.group(0).lower() in tokens:
+                start = match.start()
+                break
+        begin = min(max(0, start - length // 4), len(text) - length)
+        return ("..." if begin > 0 else "") + text[begin:begin + length] + ("..." if begin + length < len(text) else "")
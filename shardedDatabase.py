@@ -0,0 +1,189 @@
+import os
+import sys
+import json
+import argparse
+from hashlib import sha1
+from dataclasses import dataclass
+from typing import Dict
+
+import errorsDatabase
+from errorsDatabase import Database, Facility
+
+#Sharded layout of the errors database : a directory holding one file per facility, plus a manifest.
+# - every shard is an errors database of its own, in the usual JSON format, holding a single facility
+# - the manifest maps every facility to its shard file, and to the Git blob SHA-1 of that file (the hash the GitHub contents API
+#   lists files with, so shards can be checked against both the manifest and the listing) :
+#   {"version" : 1, "shards" : {"0x002" : {"file" : "0x002.json", "sha" : "..."}, ...}}
+#A bot following a sharded remote only has to download the manifest to know what changed, then only the shards which did.
+#Only the facilities of those shards are rebuilt : the others are shared with the previous Database, like after a merge.
+#
+#Run this file to split a monolithic database into shards :
+#   python shardedDatabase.py rivetdb.json shards/
+
+MANIFEST_FILE_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+@dataclass(frozen=True)
+class ShardInfo:
+    __slots__ = ["fileName", "gitBlobSha"]
+    fileName : str
+    gitBlobSha : str
+
+#Maps a facility number to the ShardInfo of the shard holding it
+Manifest = Dict[int, ShardInfo]
+
+def getGitBlobShaOfData(data : bytes) -> str:
+    sha1Ctx = sha1()
+    sha1Ctx.update(b"blob %d\0" % len(data))
+    sha1Ctx.update(data)
+    return sha1Ctx.hexdigest().lower()
+
+def getShardFileName(facilityNum : int) -> str:
+    return "0x%03X.json" % facilityNum
+
+#Shard files are written to a local directory, so a manifest must not be able to name files outside of it
+def _isValidShardFileName(fileName) -> bool:
+    return isinstance(fileName, str) and fileName not in ("", ".", "..", MANIFEST_FILE_NAME) and \
+        os.path.basename(fileName) == fileName and "/" not in fileName and "\\" not in fileName
+
+#Returns the content of the shard of a facility, or None if it couldn't be serialized
+def getShardData(facilityNum : int, facilityObj : Facility) -> bytes:
+    shardJSON = errorsDatabase.getJSONStringFromDatabase(Database({facilityNum : facilityObj}))
+    return shardJSON.encode("utf-8") if shardJSON != None else None
+
+def getManifestData(manifest : Manifest) -> bytes:
+    shards = {"0x%03X" % facilityNum : {"file" : info.fileName, "sha" : info.gitBlobSha} for facilityNum, info in sorted(manifest.items())}
+    return json.dumps({"version" : MANIFEST_VERSION, "shards" : shards}, indent=4).encode("utf-8")
+
+#Returns the Manifest of a manifest file, or None if it is invalid
+def getManifestFromData(data : bytes) -> Manifest:
+    try:
+        manifestJSON = json.loads(data.decode("utf-8"))
+        if manifestJSON.get("version") != MANIFEST_VERSION:
+            print(f"Unsupported shards manifest version {manifestJSON.get('version')}.")
+            return None
+        manifest = dict()
+        for facilityStr, shardObj in manifestJSON["shards"].items():
+            if not _isValidShardFileName(shardObj["file"]) or not isinstance(shardObj["sha"], str):
+                print(f"Invalid shard entry for facility {facilityStr} in manifest.")
+                return None
+            manifest[int(facilityStr, 16)] = ShardInfo(fileName = shardObj["file"], gitBlobSha = shardObj["sha"].lower())
+    except (ValueError, KeyError, TypeError, AttributeError) as e: #UnicodeDecodeError and JSONDecodeError are ValueErrors
+        print(f"Exception {e.__class__.__name__} raised while decoding shards manifest.")
+        return None
+    if len({info.fileName for info in manifest.values()}) != len(manifest):
+        print("Several facilities share a shard file in manifest.")
+        return None
+    return dict(sorted(manifest.items()))
+
+#Returns the facility held by a shard, or None if the shard is invalid
+def getFacilityFromShardData(facilityNum : int, data : bytes) -> Facility:
+    try:
+        shardDb = errorsDatabase.getDatabaseFromJSONString(data.decode("utf-8"))
+    except UnicodeDecodeError:
+        print(f"Shard of facility 0x{facilityNum:03X} isn't valid UTF-8.")
+        return None
+    if shardDb == None or list(shardDb.keys()) != [facilityNum]:
+        print(f"Shard of facility 0x{facilityNum:03X} doesn't hold that facility (only).")
+        return None
+    return shardDb[facilityNum]
+
+#Splits a database into shards. Returns (manifest, content of each shard file by file name), or None if a facility couldn't be serialized.
+def splitDatabase(db : Database) -> tuple:
+    manifest = dict()
+    shardsData = dict()
+    for facilityNum, facilityObj in sorted(db.items()):
+        data = getShardData(facilityNum, facilityObj)
+        if data == None:
+            return None
+        fileName = getShardFileName(facilityNum)
+        manifest[facilityNum] = ShardInfo(fileName = fileName, gitBlobSha = getGitBlobShaOfData(data))
+        shardsData[fileName] = data
+    return (manifest, shardsData)
+
+#Returns the numbers of the facilities whose shard is new or different in newManifest
+def getChangedShards(oldManifest : Manifest, newManifest : Manifest) -> list:
+    return [facilityNum for facilityNum, info in newManifest.items() if oldManifest.get(facilityNum) != info]
+
+#Returns the database described by newManifest : facilities in newFacilities (the ones of changed shards) are taken from it,
+#the others are shared with db. Facilities which aren't in newManifest anymore are dropped.
+def getUpdatedDatabase(db : Database, newManifest : Manifest, newFacilities : Dict[int, Facility]) -> Database:
+    ret = dict()
+    for facilityNum in newManifest.keys():
+        facilityObj = newFacilities.get(facilityNum)
+        ret[facilityNum] = facilityObj if facilityObj != None else db[facilityNum]
+    return Database(ret)
+
+def _readFile(path : str) -> bytes:
+    try:
+        with open(path, "rb") as fh:
+            return fh.read()
+    except IOError:
+        print(f"Failed to open '{path}' for reading.")
+        return None
+
+#Loads the manifest stored in directory. Returns (Manifest, content of the manifest file), or None on failure.
+def loadManifest(directory : str) -> tuple:
+    manifestData = _readFile(os.path.join(directory, MANIFEST_FILE_NAME))
+    if manifestData == None:
+        return None
+    manifest = getManifestFromData(manifestData)
+    return (manifest, manifestData) if manifest != None else None
+
+#Loads the shards stored in directory. Returns (Database, Manifest, content of the manifest file), or None on failure.
+def loadShardedDatabase(directory : str) -> tuple:
+    loaded = loadManifest(directory)
+    if loaded == None:
+        return None
+    manifest, manifestData = loaded
+
+    db = dict()
+    for facilityNum, info in manifest.items():
+        data = _readFile(os.path.join(directory, info.fileName))
+        if data == None:
+            return None
+        if getGitBlobShaOfData(data) != info.gitBlobSha:
+            print(f"Shard '{info.fileName}' doesn't match the manifest's Git blob SHA-1.")
+            return None
+        facilityObj = getFacilityFromShardData(facilityNum, data)
+        if facilityObj == None:
+            return None
+        db[facilityNum] = facilityObj
+    return (Database(db), manifest, manifestData)
+
+#Writes shards to directory, then the manifest (last, so that an interrupted write leaves the previous manifest in place),
+#then removes the files of the shards in staleFileNames. Returns True on success, False otherwise.
+def writeShards(directory : str, shardsData : Dict[str, bytes], manifestData : bytes, staleFileNames : list = ()) -> bool:
+    try:
+        os.makedirs(directory, exist_ok=True)
+        for fileName, data in list(shardsData.items()) + [(MANIFEST_FILE_NAME, manifestData)]:
+            tempPath = os.path.join(directory, fileName + ".tmp")
+            with open(tempPath, "wb") as fh:
+                fh.write(data)
+            os.replace(tempPath, os.path.join(directory, fileName))
+        for fileName in staleFileNames:
+            if fileName not in shardsData:
+                try:
+                    os.remove(os.path.join(directory, fileName))
+                except FileNotFoundError:
+                    pass
+    except IOError as e:
+        print(f"IOError raised when writing shards to '{directory}' ({e}).")
+        return False
+    return True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Splits a monolithic errors database into one shard per facility, plus a manifest")
+    parser.add_argument("databasePath", help="Errors database to split (i.e. rivetdb.json)")
+    parser.add_argument("outputDirectory", help="Directory the shards and manifest are written to")
+    args = parser.parse_args()
+
+    db = errorsDatabase.getDatabaseFromJSONFile(args.databasePath)
+    if db == None:
+        print(f"Failed to load '{args.databasePath}'.")
+        sys.exit(1)
+    split = splitDatabase(db)
+    if split == None or not writeShards(args.outputDirectory, split[1], getManifestData(split[0])):
+        sys.exit(1)
+    print(f"Wrote {len(split[1])} shards and {MANIFEST_FILE_NAME} to '{args.outputDirectory}'.")
+    sys.exit(0)
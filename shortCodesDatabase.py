@@ -1,8 +1,21 @@
+import re
 import json
 from hashlib import sha1
 
+#Characters which aren't part of the normalized form of a short code (i.e. separators)
+NON_SHORT_CODE_CHARS_REGEX = re.compile(r"[^0-9A-Z]")
+
+#Returns the form short codes are matched in : uppercase, without separators - "c1-2345-6", "C123456" and "C1 2345 6" are all "C123456".
+#This is unambiguous, because short codes always start with a 2 characters prefix and end with a single check digit.
+def normalizeShortCode(shortCode : str) -> str:
+    return NON_SHORT_CODE_CHARS_REGEX.sub("", shortCode.upper())
+
+#The database file maps short codes to hexadecimal error codes. It is compiled when loaded, into :
+# - a normalized short code -> error code (int) map
+# - a reverse error code -> short codes index
+#The database is immutable once loaded, so its serialized form is simply the content of the file it was loaded from.
 class SCDatabase:
-    __slots__ = ["hashMap", "sha1"]
+    __slots__ = ["hashMap", "sha1", "codes", "shortCodes", "serialized"]
 
     def __getSha1OfData(self, data : bytes) -> str:
         sha1Ctx = sha1()
@@ -13,6 +26,9 @@ class SCDatabase:
     def __init__(self) -> None:
         self.hashMap : dict = None
         self.sha1 : str = None
+        self.codes : dict = None #Maps a normalized short code to its error code
+        self.shortCodes : dict = None #Maps an error code to the tuple of its short codes, as written in the database
+        self.serialized : bytes = None
 
     #Returns True on success, False on failure
     def LoadFromFile(self, filePath : str) -> bool:
@@ -36,8 +52,27 @@ class SCDatabase:
             print(f"Failed to decode '{filePath}' as UTF-8.")
             self.hashMap = None
             return False
+        if not isinstance(self.hashMap, dict):
+            print(f"'{filePath}' isn't a short codes database.")
+            self.hashMap = None
+            return False
+
+        self.__compile()
+        self.serialized = fdata
         return True
 
+    def __compile(self) -> None:
+        self.codes = dict()
+        self.shortCodes = dict()
+        for shortCode, codeStr in self.hashMap.items():
+            try:
+                code = int(codeStr, 16)
+            except (ValueError, TypeError):
+                print(f"Ignoring short code {shortCode} : '{codeStr}' isn't a valid error code.")
+                continue
+            self.codes[normalizeShortCode(shortCode)] = code
+            self.shortCodes[code] = self.shortCodes.get(code, ()) + (shortCode,)
+
     def IsValidDatabaseLoaded(self) -> bool:
         if self.hashMap == None:
             return False
@@ -57,12 +92,12 @@ class SCDatabase:
             return False
         
         try:
-            fh = open(filePath, "w")
+            fh = open(filePath, "wb")
         except IOError:
             print(f"Failed to open '{filePath}' for writing.")
             return False
 
-        fh.write(json.dumps(self.hashMap))
+        fh.write(self.serialized)
         fh.close()
         return True
 
@@ -71,11 +106,34 @@ class SCDatabase:
         if self.hashMap == None:
             return None
         else:
-            return json.dumps(self.hashMap)
+            return self.serialized.decode("utf-8")
+
+    #Returns None if no valid database is currently loaded
+    def GetDatabaseAsBytes(self) -> bytes:
+        if self.hashMap == None:
+            return None
+        else:
+            return self.serialized
 
     #Returns a valid error code on success, 0 if the short code is invalid/unknown or no valid database is currently loaded.
+    #The short code is normalized first (see normalizeShortCode()).
     def ResolveShortCode(self, shortCode : str) -> int:
         if self.hashMap == None:
             return 0
         else:
-            return int(self.hashMap.get(shortCode, "0"), 16)
\ No newline at end of file
+            return self.codes.get(normalizeShortCode(shortCode), 0)
+
+    #Returns a short code as it is written in the database (i.e. "C1-2345-6" for "c123456"), or None if it is unknown
+    def GetCanonicalShortCode(self, shortCode : str) -> str:
+        normalizedShortCode = normalizeShortCode(shortCode)
+        for candidate in self.GetShortCodesOfErrorCode(self.ResolveShortCode(shortCode)):
+            if normalizeShortCode(candidate) == normalizedShortCode:
+                return candidate
+        return None
+
+    #Returns the short codes which map to an error code (empty if there is none, or no valid database is currently loaded)
+    def GetShortCodesOfErrorCode(self, code : int) -> tuple:
+        if self.hashMap == None:
+            return ()
+        else:
+            return self.shortCodes.get(code, ())
\ No newline at end of file
@@ -0,0 +1,33 @@
+import os
+import sys
+import unittest
+
+#The tests import the bot's modules from the parent directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import errorsDatabase
+from errorsDatabase import BlacklistEntry
+
+#Reference implementation : the linear scan blacklists were searched with before they were normalized
+def isInBlacklistLinear(blacklist : list, errorNum : int) -> bool:
+    return any(entry.min <= errorNum <= entry.max for entry in blacklist)
+
+class BlacklistTest(unittest.TestCase):
+    def test_rangeEndingPastErrorNumMask(self):
+        blacklist = errorsDatabase.getNormalizedBlacklist([BlacklistEntry(min = 0x10, max = 0x1FFFF)])
+        for errorNum in (0xF, 0x10, 0x11, 0xFFFF):
+            with self.subTest(errorNum = errorNum):
+                self.assertEqual(errorsDatabase.isInBlacklist(blacklist, errorNum), isInBlacklistLinear(blacklist, errorNum))
+        self.assertTrue(errorsDatabase.isInBlacklist(blacklist, 0x10))
+
+    def test_matchesLinearScan(self):
+        blacklist = errorsDatabase.getNormalizedBlacklist([BlacklistEntry(min = 0x0, max = 0x0), BlacklistEntry(min = 0x10, max = 0x20),
+            BlacklistEntry(min = 0x18, max = 0x30), BlacklistEntry(min = 0x32, max = 0x40), BlacklistEntry(min = 0xFFF0, max = 0x12345)])
+        for errorNum in range(0x10000):
+            self.assertEqual(errorsDatabase.isInBlacklist(blacklist, errorNum), isInBlacklistLinear(blacklist, errorNum), hex(errorNum))
+
+    def test_emptyBlacklist(self):
+        self.assertFalse(errorsDatabase.isInBlacklist([], 0))
+
+if __name__ == "__main__":
+    unittest.main()
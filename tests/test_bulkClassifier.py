@@ -0,0 +1,56 @@
+import os
+import sys
+import json
+import random
+import unittest
+
+#The tests import the bot's modules from the parent directory, and the database generator from the benchmarks
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, "benchmarks"))
+
+import errorsDatabase
+from databaseGenerator import generateErrorsDatabase, generateLookupCodes
+try: #Only needed by the bulk classifier
+    import numpy as np
+    from bulkClassifier import BulkClassifier
+except ImportError:
+    np = None
+
+#Facility numbers and blacklist ranges the parser accepts, but which don't fit in the bits of a code
+OUT_OF_RANGE_DATABASE = {
+    "0x041" : {"name" : "SCE_IN_RANGE", "errors" : {"0x0001" : {"name" : "IN_RANGE_1"}, "0x0100" : {"name" : "IN_RANGE_100"}},
+        "blacklist" : [{"min" : "-0x5", "max" : "0x3"}, {"min" : "0xFFF0", "max" : "0x1FFFF"}, {"min" : "0x20000", "max" : "0x30000"}]},
+    "0x042" : {"name" : "SCE_NEGATIVE_BLACKLIST", "errors" : {"0x0001" : {"name" : "NEGATIVE_1"}}, "blacklist" : [{"min" : "-0x10", "max" : "-0x1"}]},
+    "0xFFF" : {"name" : "SCE_LAST", "errors" : {"0x0002" : {"name" : "LAST_2"}}},
+    "0x1000" : {"name" : "SCE_TOO_LARGE", "errors" : {"0x0001" : {"name" : "TOO_LARGE_1"}}, "blacklist" : [{"min" : "0x0", "max" : "0xFFFF"}]},
+    "0x10000" : {"name" : "SCE_FAR_TOO_LARGE", "errors" : {"0x0002" : {"name" : "FAR_TOO_LARGE_2"}}},
+    "-0x1" : {"name" : "SCE_NEGATIVE", "errors" : {"0x0003" : {"name" : "NEGATIVE_3"}}, "blacklist" : [{"min" : "0x0", "max" : "0x10"}]},
+}
+
+@unittest.skipIf(np == None, "numpy isn't installed")
+class BulkClassifierTest(unittest.TestCase):
+    def assertMatchesScalarClassification(self, db : errorsDatabase.Database, codes : list) -> None:
+        classifier = BulkClassifier(db)
+        classes, indices = classifier.classify(codes)
+        for code, codeClass, idx in zip(codes, classes.tolist(), indices.tolist()):
+            self.assertEqual(codeClass, errorsDatabase.classifyErrorCode(db, code), f"0x{code:08X}")
+            if codeClass == errorsDatabase.CODE_CLASS_RESOLVED:
+                self.assertEqual(classifier.names[idx], errorsDatabase.getErrorNameFromErrorCode(db, code), f"0x{code:08X}")
+
+    def test_generatedDatabase(self):
+        jsonDb = generateErrorsDatabase(5000, 0)
+        db = errorsDatabase.getDatabaseFromJSONString(json.dumps(jsonDb))
+        self.assertMatchesScalarClassification(db, generateLookupCodes(jsonDb, 20000, 0))
+
+    def test_outOfRangeFacilitiesAndBlacklists(self):
+        db = errorsDatabase.getDatabaseFromJSONString(json.dumps(OUT_OF_RANGE_DATABASE))
+        self.assertIsNotNone(db)
+        codes = [0x80000000 | (facilityNum << 16) | errorNum for facilityNum in (0x000, 0x041, 0x042, 0xFFF)
+            for errorNum in (0x0, 0x1, 0x2, 0x3, 0x4, 0x100, 0xFFEF, 0xFFF0, 0xFFFF)]
+        rng = random.Random(0)
+        codes += [rng.getrandbits(32) for _ in range(10000)]
+        self.assertMatchesScalarClassification(db, codes)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import os
+import sys
+import json
+import random
+import unittest
+
+#The tests import the bot's modules from the parent directory, and the database generator from the benchmarks
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, "benchmarks"))
+
+import errorsDatabase
+from databaseGenerator import generateErrorsDatabase
+
+#Feeds a document to a DatabaseStreamParser in chunks ending at random positions
+def parseInRandomChunks(document : str, rng : random.Random, maxChunkLength : int) -> errorsDatabase.Database:
+    parser = errorsDatabase.DatabaseStreamParser()
+    pos = 0
+    while pos < len(document):
+        end = min(len(document), pos + rng.randint(1, maxChunkLength))
+        parser.feed(document[pos:end])
+        pos = end
+    return parser.close()
+
+class DatabaseStreamParserTest(unittest.TestCase):
+    def assertSameDatabase(self, db : errorsDatabase.Database, expectedDb : errorsDatabase.Database) -> None:
+        self.assertIsNotNone(db)
+        self.assertEqual(errorsDatabase.getJSONReadyDictFromDatabase(db), errorsDatabase.getJSONReadyDictFromDatabase(expectedDb))
+
+    def test_randomChunksMatchOneShotParse(self):
+        rng = random.Random(0)
+        for seed in range(4):
+            document = json.dumps(generateErrorsDatabase(2000, seed), indent = 4)
+            expectedDb = errorsDatabase.getDatabaseFromJSONString(document)
+            self.assertIsNotNone(expectedDb)
+            for maxChunkLength in (1, 7, 64, 4096, len(document)):
+                with self.subTest(seed = seed, maxChunkLength = maxChunkLength):
+                    self.assertSameDatabase(parseInRandomChunks(document, rng, maxChunkLength), expectedDb)
+
+    def test_emptyDatabase(self):
+        rng = random.Random(2)
+        self.assertEqual(len(parseInRandomChunks(" { } ", rng, 2)), 0)
+
+    def test_invalidDocumentsFailInAnyChunks(self):
+        document = json.dumps(generateErrorsDatabase(200, 0))
+        rng = random.Random(3)
+        #Syntax errors, then a facility which is valid JSON but not a valid facility (its code isn't hexadecimal)
+        for invalidDocument in (document[:-1], document[:len(document) // 2], document + "{}", "[" + document + "]", document.replace(":", ";", 1),
+            document.replace('"0x', '"zz', 1)):
+            self.assertIsNone(errorsDatabase.getDatabaseFromJSONString(invalidDocument))
+            for maxChunkLength in (1, 16, 1024):
+                with self.subTest(maxChunkLength = maxChunkLength):
+                    self.assertIsNone(parseInRandomChunks(invalidDocument, rng, maxChunkLength))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+import os
+import sys
+import json
+import unittest
+from collections.abc import Mapping
+
+#The tests import the bot's modules from the parent directory, and the database generator from the benchmarks
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, "benchmarks"))
+
+import errorsDatabase
+import merkleTree
+from databaseGenerator import generateErrorsDatabase, generateAppendedDatabase
+
+#Returns the conflicts getMultiMergedDatabases() should report, by (facility number, error number, field), from a naive walk over all the sources.
+#sources are (source index, Database) pairs in order of precedence.
+def getExpectedConflicts(sources : list, overwrite : bool) -> dict:
+    conflicts = dict()
+    def addField(facilityNum : int, errorNum : int, field : str, values : list) -> None:
+        values = [(sourceIdx, value) for sourceIdx, value in values if value != None]
+        if any(value != values[0][1] for _, value in values):
+            conflicts[(facilityNum, errorNum, field)] = tuple(values)
+
+    for facilityNum in sorted(set().union(*(db.keys() for _, db in sources))):
+        facilities = [(sourceIdx, db[facilityNum]) for sourceIdx, db in sources if facilityNum in db]
+        if len(facilities) == 1:
+            continue
+        addField(facilityNum, None, errorsDatabase.NAME_KEY, [(sourceIdx, facility.name) for sourceIdx, facility in facilities])
+        addField(facilityNum, None, errorsDatabase.DESCRIPTION_KEY, [(sourceIdx, facility.description) for sourceIdx, facility in facilities])
+        if overwrite:
+            addField(facilityNum, None, errorsDatabase.BLACKLIST_KEY,
+                [(sourceIdx, errorsDatabase.getNormalizedBlacklist(facility.blacklist)) for sourceIdx, facility in facilities])
+        for errorNum in sorted(set().union(*(facility.errors.keys() for _, facility in facilities))):
+            errors = [(sourceIdx, facility.errors[errorNum]) for sourceIdx, facility in facilities if errorNum in facility.errors]
+            if len(errors) == 1:
+                continue
+            addField(facilityNum, errorNum, errorsDatabase.NAME_KEY, [(sourceIdx, error.name) for sourceIdx, error in errors])
+            addField(facilityNum, errorNum, errorsDatabase.DESCRIPTION_KEY, [(sourceIdx, error.description) for sourceIdx, error in errors])
+    return conflicts
+
+#Returns the value of the field of a conflict in db
+def getConflictField(db : errorsDatabase.Database, facilityNum : int, errorNum : int, field : str):
+    obj = db[facilityNum] if errorNum == None else db[facilityNum].errors[errorNum]
+    if field == errorsDatabase.BLACKLIST_KEY:
+        return errorsDatabase.getNormalizedBlacklist(obj.blacklist)
+    return obj.name if field == errorsDatabase.NAME_KEY else obj.description
+
+#Read-only database recording the facilities which were looked up, like lazily loaded databases decode them
+class RecordingDatabase(Mapping):
+    def __init__(self, db : errorsDatabase.Database) -> None:
+        self.db = db
+        self.accessed = set()
+
+    def __getitem__(self, facilityNum : int):
+        facility = self.db[facilityNum]
+        self.accessed.add(facilityNum)
+        return facility
+
+    def __iter__(self):
+        return iter(self.db)
+
+    def __len__(self) -> int:
+        return len(self.db)
+
+class MultiMergedDatabasesTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        base = generateErrorsDatabase(3000, 1)
+        cls.destDb = errorsDatabase.getDatabaseFromJSONString(json.dumps(base))
+        #Updates of the destination database, plus an unrelated database whose facility names and blacklists disagree with it
+        appended = [generateAppendedDatabase(base, 500, seed) for seed in range(2, 5)] + [generateErrorsDatabase(3000, 9)]
+        cls.appendedDbs = [errorsDatabase.getDatabaseFromJSONString(json.dumps(db)) for db in appended]
+
+    def getSequentiallyMergedDatabase(self, overwrite : bool) -> errorsDatabase.Database:
+        db = self.destDb
+        for appendedDb in (reversed(self.appendedDbs) if overwrite else self.appendedDbs):
+            db = errorsDatabase.getMergedDatabases(db, appendedDb, overwrite)
+        return db
+
+    def test_matchesSequentialMerges(self):
+        for overwrite in (False, True):
+            with self.subTest(overwrite = overwrite):
+                merged, _ = errorsDatabase.getMultiMergedDatabases(self.destDb, self.appendedDbs, overwrite)
+                self.assertEqual(errorsDatabase.getJSONReadyDictFromDatabase(merged),
+                    errorsDatabase.getJSONReadyDictFromDatabase(self.getSequentiallyMergedDatabase(overwrite)))
+
+    def test_conflictsFollowPrecedence(self):
+        for overwrite in (False, True):
+            with self.subTest(overwrite = overwrite):
+                _, conflicts = errorsDatabase.getMultiMergedDatabases(self.destDb, self.appendedDbs, overwrite)
+                sources = list(enumerate([self.destDb] + self.appendedDbs))
+                if overwrite:
+                    sources = sources[1:] + sources[:1]
+                expected = getExpectedConflicts(sources, overwrite)
+                self.assertNotEqual(len(expected), 0)
+                self.assertEqual({(conflict.facilityNum, conflict.errorNum, conflict.field) : conflict.values for conflict in conflicts}, expected)
+
+                #The value reported as kept is the one merging the sources one after the other ends up with
+                sequential = self.getSequentiallyMergedDatabase(overwrite)
+                for conflict in conflicts:
+                    self.assertEqual(conflict.values[0][1], getConflictField(sequential, conflict.facilityNum, conflict.errorNum, conflict.field))
+
+    def test_mergeIntoLazyDatabaseOnlyLooksUpMergedFacilities(self):
+        for overwrite in (False, True):
+            with self.subTest(overwrite = overwrite):
+                lazyDb = RecordingDatabase(self.destDb)
+                merged, conflicts = errorsDatabase.getMultiMergedDatabases(lazyDb, self.appendedDbs, overwrite)
+                expected, expectedConflicts = errorsDatabase.getMultiMergedDatabases(self.destDb, self.appendedDbs, overwrite)
+                self.assertIsInstance(merged, errorsDatabase.OverlayDatabase)
+                self.assertEqual(lazyDb.accessed, set().union(*(appendedDb.keys() for appendedDb in self.appendedDbs)) & self.destDb.keys())
+                self.assertEqual(errorsDatabase.getJSONReadyDictFromDatabase(merged), errorsDatabase.getJSONReadyDictFromDatabase(expected))
+                self.assertEqual(conflicts, expectedConflicts)
+                self.assertEqual(merged.getErrorsCount(), sum(len(facility.errors) for facility in expected.values()))
+
+                #The tree of the overlay is only hashed again for the facilities the merge changed
+                tree = merkleTree.updateMerkleTree(merkleTree.buildMerkleTree(self.destDb), merged.facilities)
+                self.assertEqual(tree.rootHash, merkleTree.buildMerkleTree(expected).rootHash)
+
+    def test_overlaysAreFlattened(self):
+        merged, _ = errorsDatabase.getMultiMergedDatabases(RecordingDatabase(self.destDb), self.appendedDbs[:2])
+        mergedTwice, _ = errorsDatabase.getMultiMergedDatabases(merged, self.appendedDbs[2:])
+        expected, _ = errorsDatabase.getMultiMergedDatabases(self.destDb, self.appendedDbs)
+        self.assertIs(mergedTwice.base, merged.base)
+        self.assertEqual(errorsDatabase.getJSONReadyDictFromDatabase(mergedTwice), errorsDatabase.getJSONReadyDictFromDatabase(expected))
+
+    def test_unmodifiedFacilitiesAreShared(self):
+        merged, conflicts = errorsDatabase.getMultiMergedDatabases(self.destDb, [self.destDb], False)
+        self.assertEqual(len(conflicts), 0)
+        self.assertTrue(all(merged[facilityNum] is facility for facilityNum, facility in self.destDb.items()))
+
+if __name__ == "__main__":
+    unittest.main()